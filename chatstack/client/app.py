@@ -2,25 +2,75 @@ import streamlit as st
 import requests
 import os
 import json
+import time
+import uuid
+from websocket import create_connection
 
 
 st.set_page_config(page_title="ChatStack Client", page_icon="🤖")
 API_URL = os.getenv("API_URL", "https://81kcbb3987.execute-api.us-east-1.amazonaws.com")  # Update after deploying stack
+STREAM_URL = os.getenv("STREAM_URL", "")  # StreamUrl output of the stack, wss://<id>.execute-api.<region>.amazonaws.com/prod
+
+
+def stream_chat(stream_url, message, session_id, stats):
+    """Yield the reply text as the Lambda pushes it over the WebSocket API.
+
+    Fills `stats` with the client-side time to first token and the server's done message.
+    """
+    start = time.perf_counter()
+    ws = create_connection(stream_url, timeout=60)
+    try:
+        ws.send(json.dumps({"action": "chat", "message": message, "session_id": session_id}))
+        while True:
+            event = json.loads(ws.recv())
+            if event.get("type") == "delta":
+                if "ttft_ms" not in stats:
+                    stats["ttft_ms"] = round((time.perf_counter() - start) * 1000)
+                yield event.get("text", "")
+            elif event.get("type") == "done":
+                stats["done"] = event
+                return
+            elif event.get("type") == "error":
+                raise RuntimeError(event.get("message"))
+    finally:
+        stats["total_ms"] = round((time.perf_counter() - start) * 1000)
+        ws.close()
 
 st.title("🤖 ChatStack Client")
 st.markdown("A simple chat interface to interact with the Bedrock model via API Gateway and Lambda.")
 st.caption("Enter your message below and click 'Send'.")
 
+# The Lambda keeps the conversation per session id; a new id starts a new conversation
+if "session_id" not in st.session_state:
+    st.session_state.session_id = str(uuid.uuid4())
+if st.button("New conversation"):
+    st.session_state.session_id = str(uuid.uuid4())
+
 api_url = st.text_input("API URL", value=API_URL)
+stream = st.checkbox("Stream response", value=bool(STREAM_URL))
+stream_url = st.text_input("Stream URL", value=STREAM_URL) if stream else ""
 prompt = st.text_area("Your prompt", height=150)
 
 if st.button("Send"):
-    if not api_url or not prompt:
+    if stream:
+        if not stream_url or not prompt:
+            st.error("Please provide both Stream URL and a prompt.")
+        else:
+            stats = {}
+            try:
+                st.write_stream(stream_chat(stream_url, prompt, st.session_state.session_id, stats))
+                done = stats.get("done", {})
+                st.caption(f"Time to first token: {stats.get('ttft_ms')} ms "
+                           f"(model: {done.get('metrics', {}).get('ttft_ms')} ms), "
+                           f"total: {stats.get('total_ms')} ms, stop reason: {done.get('stopReason')}")
+            except Exception as e:
+                st.error(f"An error occurred: {str(e)}")
+    elif not api_url or not prompt:
         st.error("Please provide both API URL and a prompt.")
     else:
         with st.spinner("Sending request..."):
             try:
-                response = requests.post(api_url + "/chat", json={"message": prompt})
+                response = requests.post(api_url + "/chat", json={"message": prompt, "session_id": st.session_state.session_id})
                 if response.status_code == 200:
                     data = response.json()
                     st.success("Response received:")
@@ -13,6 +13,8 @@ guardrails = GuardrailsStack(app, "ChatGuardrailStack",)
 InfrastructureStack(app, 
                     "InfrastructureStack",
                     guardrail_id=guardrails.guardrail_id, 
-                    guardrail_version=guardrails.guardrail_version)
+                    guardrail_version=guardrails.guardrail_version,
+                    denied_topics=guardrails.denied_topics,
+                    blocked_input_messaging=guardrails.blocked_input_messaging)
 
 app.synth()
@@ -15,12 +15,34 @@ class GuardrailsStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        topics_config = [
+            guardrails.CfnGuardrail.TopicConfigProperty(
+                name="InvestmentTopics",
+                definition="Investment advice",
+                examples=["What is the best stock to buy?", "Should I invest in real estate?","How can I save for retirement?"],
+                type="DENY"
+            ),
+            guardrails.CfnGuardrail.TopicConfigProperty(
+                name="MedicalTopics",
+                definition="Medical advice",
+                examples=["What are the symptoms of diabetes?", "How can I treat a headache?","What is the best diet for weight loss?"],
+                type="DENY"
+            ),
+            guardrails.CfnGuardrail.TopicConfigProperty(
+                name="LegalTopics",
+                definition="Legal advice",
+                examples=["What are my rights if I'm arrested?", "How can I file for divorce?","What is the process for creating a will?"],
+                type="DENY"
+            ),
+        ]
+        blocked_input_messaging = "Input blocked due to topic policy or detected PII or toxic content."
+
         # Create a Bedrock Guardrail
         guardrail = guardrails.CfnGuardrail(
             self, "DefaultGuardrails",
             name="ChatstackGuardrail",
             description="Bedrock Guardrails for Chatstack application. Block PII and Toxic content.",
-            blocked_input_messaging="Input blocked due to topic policy or detected PII or toxic content.",
+            blocked_input_messaging=blocked_input_messaging,
             blocked_outputs_messaging="Output response blocked due to topic policy or detected PII or toxic content.",
             content_policy_config=guardrails.CfnGuardrail.ContentPolicyConfigProperty(
                 filters_config=[
@@ -37,26 +59,7 @@ class GuardrailsStack(Stack):
                 ]
             ),
             topic_policy_config=guardrails.CfnGuardrail.TopicPolicyConfigProperty(
-                topics_config=[
-                    guardrails.CfnGuardrail.TopicConfigProperty(
-                        name="InvestmentTopics",
-                        definition="Investment advice",
-                        examples=["What is the best stock to buy?", "Should I invest in real estate?","How can I save for retirement?"],
-                        type="DENY"
-                    ),
-                    guardrails.CfnGuardrail.TopicConfigProperty(
-                        name="MedicalTopics",
-                        definition="Medical advice",
-                        examples=["What are the symptoms of diabetes?", "How can I treat a headache?","What is the best diet for weight loss?"],
-                        type="DENY"
-                    ),
-                    guardrails.CfnGuardrail.TopicConfigProperty(
-                        name="LegalTopics",
-                        definition="Legal advice",
-                        examples=["What are my rights if I'm arrested?", "How can I file for divorce?","What is the process for creating a will?"],
-                        type="DENY"
-                    ),
-                ]
+                topics_config=topics_config
             ),
             sensitive_information_policy_config = guardrails.CfnGuardrail.SensitiveInformationPolicyConfigProperty(
                 pii_entities_config=[
@@ -78,6 +81,9 @@ class GuardrailsStack(Stack):
 
         self.guardrail_id = gr_id
         self.guardrail_version = gr_ver.attr_version
+        # For the chat Lambda's local pre-filter, which blocks obvious violations before calling Bedrock
+        self.denied_topics = {t.name: list(t.examples) for t in topics_config}
+        self.blocked_input_messaging = blocked_input_messaging
 
         Tags.of(guardrail).add("example", "chatstack")
         CfnOutput(self, "GuardrailIdOutput", value=self.guardrail_id)
@@ -1,19 +1,30 @@
+import json
+from pathlib import Path
+
 from aws_cdk import (
     Stack,
+    BundlingOptions,
+    BundlingOutput,
     aws_lambda as _lambda,
     aws_iam as iam,
     Duration,
     Tags,
     CfnOutput,
     aws_s3 as s3,
+    aws_dynamodb as dynamodb,
+    RemovalPolicy,
 )
 from constructs import Construct
-from aws_cdk.aws_apigatewayv2 import HttpApi, HttpMethod, CorsHttpMethod
-from aws_cdk.aws_apigatewayv2_integrations import HttpLambdaIntegration
+from aws_cdk.aws_apigatewayv2 import HttpApi, HttpMethod, CorsHttpMethod, WebSocketApi, WebSocketStage
+from aws_cdk.aws_apigatewayv2_integrations import HttpLambdaIntegration, WebSocketLambdaIntegration
+
+# rag_common (runtime.py and metrics.py) lives once, in the RAG example's deps layer source
+SHARED_SRC = Path(__file__).resolve().parents[3] / "rag" / "src" / "lambda" / "deps_layer"
 
 class InfrastructureStack(Stack):
 
-    def __init__(self, scope: Construct, construct_id: str, guardrail_id: str, guardrail_version: str, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, guardrail_id: str, guardrail_version: str,
+                 denied_topics: dict = None, blocked_input_messaging: str = None, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
         guardrail_arn = f"arn:aws:bedrock:*:*:guardrail/{guardrail_id}"
@@ -29,6 +40,7 @@ class InfrastructureStack(Stack):
                         iam.PolicyStatement(
                             actions=[
                                 "bedrock:InvokeModel",
+                                "bedrock:InvokeModelWithResponseStream",
                             ],
                             resources=["arn:aws:bedrock:*:*:foundation-model/*"]
                         ),
@@ -44,21 +56,67 @@ class InfrastructureStack(Stack):
             }
         )
 
+        # Conversation memory: one item per chat session, expired by DynamoDB TTL after MEMORY_TTL_SECONDS idle
+        memory_table = dynamodb.Table(self, "ChatMemoryTable",
+            partition_key=dynamodb.Attribute(name="session_id", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+        Tags.of(memory_table).add("example", "chatstack")
+
+        # Layer with the shared rag_common modules the handler uses (pooled clients, EMF metrics),
+        # bundled from the RAG example's source rather than copied. boto3 comes with the runtime.
+        shared_layer = _lambda.LayerVersion(self, "SharedRuntimeLayer",
+            code=_lambda.Code.from_asset(
+                str(SHARED_SRC),
+                bundling=BundlingOptions(
+                    image=_lambda.Runtime.PYTHON_3_13.bundling_image,
+                    command=[
+                        "bash",
+                        "-lc",
+                        "mkdir -p /asset-output/python/rag_common && "
+                        "cp rag_common/__init__.py rag_common/runtime.py rag_common/metrics.py /asset-output/python/rag_common/",
+                    ],
+                    output_type=BundlingOutput.NOT_ARCHIVED,
+                ),
+            ),
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_13],
+        )
+
         # Lambda function
         lambda_function = _lambda.Function(self, "ChatFunction",
             runtime=_lambda.Runtime.PYTHON_3_13,
             handler="handler.lambda_handler",
             role=lambda_role,
             code=_lambda.Code.from_asset("../src/lambda"),
+            layers=[shared_layer],
             memory_size=128,
             timeout=Duration.seconds(30),
             environment={
                 "MODEL_ID": "amazon.nova-micro-v1:0",
                 "REGION": self.region,
                 "GUARDRAIL_ID": guardrail_id,
-                "GUARDRAIL_VERSION": guardrail_version
+                "GUARDRAIL_VERSION": guardrail_version,
+                "STREAM_FLUSH_CHARS": "64",
+                "STREAM_FLUSH_MS": "50",
+                "GUARDRAIL_STREAM_MODE": "sync",
+                "METRICS_SINK": "stdout",
+                "METRICS_SAMPLE_RATE": "1.0",
+                "MEMORY_BACKEND": "dynamodb",
+                "MEMORY_TABLE": memory_table.table_name,
+                "MEMORY_TTL_SECONDS": "86400",
+                "MEMORY_WINDOW_TOKENS": "1500",
+                "MEMORY_SUMMARY_TOKENS": "300",
+                "MEMORY_SUMMARIZER": "extractive",
+                "PREFILTER": "lexical",
+                "PREFILTER_TOPICS": json.dumps(denied_topics or {}),
+                "PREFILTER_TOPIC_THRESHOLD": "0.8",
+                "PREFILTER_CACHE_SIZE": "4096",
+                "BLOCKED_INPUT_MESSAGE": blocked_input_messaging or "Input blocked due to topic policy or detected PII or toxic content.",
             }, 
         )
+        memory_table.grant_read_write_data(lambda_function)
 
         Tags.of(lambda_function).add("example", "chatstack")
         CfnOutput(self, "LambdaFunctionName", value=lambda_function.function_name)
@@ -79,4 +137,21 @@ class InfrastructureStack(Stack):
             integration=lambda_integration,
         )
         Tags.of(api).add("example", "chatstack")
-        CfnOutput(self, "ApiEndpoint", value=api.api_endpoint)
\ No newline at end of file
+        CfnOutput(self, "ApiEndpoint", value=api.api_endpoint)
+
+        # WebSocket API for streaming replies. Clients send {"action": "chat", "message": ...}
+        # and the Lambda pushes the answer back over the connection as it is generated.
+        stream_api = WebSocketApi(self, "ChatStreamAPI",
+            api_name="ChatStreamAPI",
+        )
+        stream_api.add_route("chat",
+            integration=WebSocketLambdaIntegration("StreamLambdaIntegration", lambda_function),
+        )
+        stream_stage = WebSocketStage(self, "ChatStreamStage",
+            web_socket_api=stream_api,
+            stage_name="prod",
+            auto_deploy=True,
+        )
+        stream_api.grant_manage_connections(lambda_function)
+        Tags.of(stream_api).add("example", "chatstack")
+        CfnOutput(self, "StreamUrl", value=stream_stage.url)
\ No newline at end of file
@@ -1,90 +1,241 @@
-import boto3
-import json
 import os
+import json
 import logging
-import base64
+from rag_common import metrics, runtime
+from memory import ConversationMemory, extractive_summary, open_memory_store
+from prefilter import open_prefilter
+from streaming import ConnectionWriter, stream_converse
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 logger.addHandler(logging.StreamHandler())
 
-client = boto3.client('bedrock-runtime')
 model_id = os.environ.get('MODEL_ID', 'amazon.nova-micro-v1:0')
 region = os.environ.get('REGION', 'us-east-1')
+# Kept for the life of the instance (rag_common/runtime.py), so warm invocations reuse its connections
+client = runtime.client('bedrock-runtime')
+
+# Streaming over the WebSocket API: deltas are batched up to STREAM_FLUSH_CHARS characters
+# or STREAM_FLUSH_MS milliseconds. GUARDRAIL_STREAM_MODE is "sync" (each chunk is checked
+# before it is sent) or "async" (chunks go out at once and are checked in the background).
+STREAM_FLUSH_CHARS = int(os.environ.get('STREAM_FLUSH_CHARS', '64'))
+STREAM_FLUSH_MS = float(os.environ.get('STREAM_FLUSH_MS', '50'))
+GUARDRAIL_STREAM_MODE = os.environ.get('GUARDRAIL_STREAM_MODE', 'sync')
+
+# Per-request stage timings and Nova token usage, written as CloudWatch EMF records (rag_common/metrics.py).
+# METRICS_SINK is "stdout" (CloudWatch Logs), "file" (METRICS_PATH) or "none"; METRICS_SAMPLE_RATE in [0, 1].
+recorder = metrics.open_recorder(os.environ.get('METRICS_NAMESPACE', 'GenAIExamples/Chat'), 'chat')
+
+# Multi-turn memory (memory.py) for requests that carry a "session_id" (WebSocket messages
+# default to their connection). MEMORY_BACKEND is "dynamodb" (MEMORY_TABLE), "local" (a SQLite
+# file at MEMORY_PATH) or "none". Recent turns are replayed within MEMORY_WINDOW_TOKENS; older
+# ones are folded into a summary of at most MEMORY_SUMMARY_TOKENS, made of the turns' first
+# sentences (MEMORY_SUMMARIZER "extractive") or written by the model ("model"). The model call
+# only runs on the WebSocket route, after the reply is sent; /chat always uses the extractive summary.
+MEMORY_BACKEND = os.environ.get('MEMORY_BACKEND', 'none')
+MEMORY_WINDOW_TOKENS = int(os.environ.get('MEMORY_WINDOW_TOKENS', '1500'))
+MEMORY_SUMMARY_TOKENS = int(os.environ.get('MEMORY_SUMMARY_TOKENS', '300'))
+MEMORY_SUMMARIZER = os.environ.get('MEMORY_SUMMARIZER', 'extractive')
+
+def _summarize(summary, turns, max_tokens):
+    transcript = "\n".join(f"{t['role']}: {t['text']}" for t in turns)
+    prompt = (f"Summary of the conversation so far:\n{summary or '(none)'}\n\n"
+              f"Later turns:\n{transcript}\n\n"
+              f"Rewrite the summary to include the later turns. Keep names, facts, preferences and open "
+              f"questions; drop pleasantries. Answer with the summary only, in at most {max_tokens * 3 // 4} words.")
+    with metrics.span('summarize'):
+        response = client.converse(modelId=model_id, messages=[{'role': 'user', 'content': [{'text': prompt}]}],
+                                   inferenceConfig={'maxTokens': max_tokens, 'temperature': 0},
+                                   guardrailConfig={'guardrailIdentifier': os.environ["GUARDRAIL_ID"],
+                                                    'guardrailVersion': os.environ["GUARDRAIL_VERSION"]})
+    usage = response.get('usage') or {}
+    metrics.add('summary_input_tokens', usage.get('inputTokens', 0))
+    metrics.add('summary_output_tokens', usage.get('outputTokens', 0))
+    if response.get('stopReason') == 'guardrail_intervened':
+        # The blocked-output message is not a summary; ConversationMemory falls back to the extractive one
+        raise ValueError("Guardrail intervened in the summary")
+    return response['output']['message']['content'][0]['text'].strip()
+
+def _open_memory():
+    table = None
+    if MEMORY_BACKEND == 'dynamodb':
+        table = runtime.resource('dynamodb').Table(os.environ['MEMORY_TABLE'])
+    store = open_memory_store(MEMORY_BACKEND, os.environ.get('MEMORY_PATH', '/tmp/chat_memory.sqlite'), table,
+                              int(os.environ.get('MEMORY_TTL_SECONDS', str(24 * 3600))))
+    if store is None:
+        return None
+    return ConversationMemory(store, MEMORY_WINDOW_TOKENS, MEMORY_SUMMARY_TOKENS,
+                              _summarize if MEMORY_SUMMARIZER == 'model' else None)
+
+memory = _open_memory()
+
+def _load_session(session_id):
+    if memory is None or not session_id:
+        return None
+    with metrics.span('memory_load'):
+        return memory.load(str(session_id))
+
+def _remember(session_id, state, message, reply, stop_reason, summarize=None):
+    # A reply the guardrail blocked stays out of the history, so it is not replayed to the model
+    if state is None or not reply or stop_reason == 'guardrail_intervened':
+        return
+    try:
+        with metrics.span('memory_save'):
+            stats = memory.record(str(session_id), state, message, reply, summarize)
+    except Exception:
+        # The reply is already made; losing this turn from the history must not fail the request
+        logger.error("Error saving conversation memory: ", exc_info=True)
+        return
+    for name, value in stats.items():
+        metrics.add(f'memory_{name}', value)
+
+# Pre-filter (prefilter.py): prompts that the guardrail would obviously block (an SSN, or a near
+# copy of an example of one of PREFILTER_TOPICS) get BLOCKED_INPUT_MESSAGE without a model call.
+# PREFILTER is "lexical" (topics matched by word overlap, at least PREFILTER_TOPIC_THRESHOLD cosine
+# similarity), "titan" (by Titan embeddings: one extra Bedrock call before each uncached turn),
+# "pii" (SSNs only) or "none".
+PREFILTER = os.environ.get('PREFILTER', 'none')
+BLOCKED_INPUT_MESSAGE = os.environ.get('BLOCKED_INPUT_MESSAGE',
+                                       "Input blocked due to topic policy or detected PII or toxic content.")
+prefilter = open_prefilter(PREFILTER, json.loads(os.environ.get('PREFILTER_TOPICS', '{}')), client,
+                           float(os.environ.get('PREFILTER_TOPIC_THRESHOLD', '0.8')),
+                           int(os.environ.get('PREFILTER_CACHE_SIZE', '4096')))
+
+def _prefiltered(message):
+    """True when the pre-filter blocks the message; anything it lets through goes to the guardrail."""
+    if prefilter is None:
+        return False
+    with metrics.span('prefilter'):
+        verdict = prefilter.check(message)
+    metrics.add('prefilter_blocked', int(verdict.blocked))
+    metrics.add('prefilter_cached', int(verdict.cached))
+    if verdict.blocked:
+        metrics.set_property('prefilter', verdict.reason)
+        metrics.set_property('stopReason', 'guardrail_intervened')
+    return verdict.blocked
 
-# Standard response structure for API Gateway
-def _response(status: int, message=None):
-    return {
-        'statusCode': status,
-        'body': json.dumps({'message': message}),
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'POST,OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type'
+def _converse_kwargs(message, state=None):
+    # Defaults
+    max_tokens = 1024
+    temperature = 0.3
+    top_p = 0.9
+
+    summary, history = memory.prompt(state) if state else (None, [])
+    kwargs = {
+        'modelId':model_id,
+        'messages':history + [
+            {
+                'role': 'user',
+                'content': [{'text': message}]
+            }
+        ],
+        'inferenceConfig':{
+            'maxTokens': max_tokens,
+            'temperature': temperature,
+            'topP': top_p
+        },
+        'guardrailConfig':{
+            "guardrailIdentifier": os.environ["GUARDRAIL_ID"],
+            "guardrailVersion": os.environ["GUARDRAIL_VERSION"]
         }
     }
-def _parse_event(event):
-    body = event.get('body')
-    if body:
-        try:
-            if event.get('isBase64Encoded'):
-                body = base64.b64decode(body).decode('utf-8')
-            return json.loads(body)
-        except json.JSONDecodeError:
-            logger.error("Invalid JSON in request body")
-            return None
-    return None
+    if summary:
+        kwargs['system'] = [{'text': f"Summary of the earlier conversation with this user:\n{summary}"}]
+    return kwargs
 
-def lambda_handler(event, context):
+def _connection_client(request_context):
+    endpoint = f"https://{request_context['domainName']}/{request_context['stage']}"
+    return runtime.client('apigatewaymanagementapi', endpoint_url=endpoint)
+
+# WebSocket route "chat": {"action": "chat", "message": "...", "session_id": optional}. The reply
+# is pushed to the connection as {"type": "delta", "text"} messages, then one {"type": "done"}
+# with the stop reason, token usage and timings (or {"type": "error"}).
+def _stream_handler(event):
+    request_context = event['requestContext']
+    if request_context.get('eventType') != 'MESSAGE':
+        # $connect / $disconnect
+        return {'statusCode': 200}
+
+    writer = ConnectionWriter(_connection_client(request_context), request_context['connectionId'],
+                              STREAM_FLUSH_CHARS, STREAM_FLUSH_MS)
+    with metrics.span('parse'):
+        body = runtime.parse_event(event) or {}
+    message = body.get('message')
+    if not message:
+        writer.send({'type': 'error', 'message': "Missing 'message' in request body"})
+        return {'statusCode': 400}
+    metrics.set_property('message', message)
+    if _prefiltered(message):
+        # The same messages the guardrail would send for a blocked input
+        writer.send({'type': 'delta', 'text': BLOCKED_INPUT_MESSAGE})
+        writer.send({'type': 'done', 'stopReason': 'guardrail_intervened', 'usage': None, 'metrics': {'posts': 2}})
+        return {'statusCode': 200}
+
+    session_id = body.get('session_id') or request_context['connectionId']
+    state = _load_session(session_id)
+    kwargs = _converse_kwargs(message, state)
+    kwargs['guardrailConfig']['streamProcessingMode'] = GUARDRAIL_STREAM_MODE
     try:
-        #event_raw = event['body']
-        logger.info("Received event: ")
-        logger.info(event)
+        with metrics.span('converse'):
+            result = stream_converse(client, kwargs, writer.write)
+        writer.flush()
+        timings = {'ttft_ms': result['ttft_ms'], 'total_ms': result['total_ms'], 'posts': writer.posts + 1}
+        writer.send({'type': 'done', 'stopReason': result['stopReason'], 'usage': result['usage'], 'metrics': timings})
+    except Exception as e:
+        logger.error("Error streaming response: ", exc_info=True)
+        writer.send({'type': 'error', 'message': str(e)})
+        metrics.set_property('error', type(e).__name__)
+        return {'statusCode': 500}
+    if result['ttft_ms'] is not None:
+        metrics.add('ttft_ms', result['ttft_ms'])
+    metrics.add('posts', writer.posts)
+    metrics.usage(result['usage'])
+    metrics.set_property('stopReason', result['stopReason'])
+    # After "done" is sent, so saving (and any compaction) adds nothing to the time the user waits
+    _remember(session_id, state, message, result['text'], result['stopReason'])
+    return {'statusCode': 200}
+
+def lambda_handler(event, context):
+    stream = bool(event.get('requestContext', {}).get('connectionId'))
+    with recorder.trace(route='stream' if stream else 'http', request_id=getattr(context, 'aws_request_id', None)) as trace:
+        response = _stream_handler(event) if stream else _http_handler(event)
+        trace.set('status', response.get('statusCode'))
+        return response
 
-        body = _parse_event(event)
+def _http_handler(event):
+    try:
+        with metrics.span('parse'):
+            body = runtime.parse_event(event)
 
         message = body.get('message')
         if not message:
-            return _response(400, "Missing 'message' in request body")
+            return runtime.response(400, "Missing 'message' in request body")
+        metrics.set_property('message', message)  # Redacted to a hash and length (METRICS_REDACT)
+        if _prefiltered(message):
+            return runtime.response(200, BLOCKED_INPUT_MESSAGE)
         
-        # Defaults
-        max_tokens = 1024
-        temperature = 0.3
-        top_p = 0.9
-
-        kwargs = {
-            'modelId':model_id,
-            'messages':[
-                {
-                    'role': 'user',
-                    'content': [{'text': message}]
-                }
-            ],
-            'inferenceConfig':{
-                'maxTokens': max_tokens,
-                'temperature': temperature,
-                'topP': top_p
-            },
-            'guardrailConfig':{
-                "guardrailIdentifier": os.environ["GUARDRAIL_ID"],
-                "guardrailVersion": os.environ["GUARDRAIL_VERSION"]
-            }
-        }
+        session_id = body.get('session_id')
+        state = _load_session(session_id)
+        kwargs = _converse_kwargs(message, state)
 
 # Converse API provides a simple interface to interact with the model
 # InvokeModel API provides more control over the request and response structure
 # Here we are using Converse API for simplicity 
-        response = client.converse(**kwargs)
-        logger.info("Response from model: ")
-        logger.info(response)
+        with metrics.span('converse'):
+            response = client.converse(**kwargs)
+        metrics.usage(response.get('usage'))
+        metrics.set_property('stopReason', response.get('stopReason'))
 
 # Expect a truncated message as we have set max tokens to 1024
 
-        return _response(200, response['output']['message']['content'][0]['text'])
+        reply = response['output']['message']['content'][0]['text']
+        # The response waits for the save, so compaction here never makes a model call
+        _remember(session_id, state, message, reply, response.get('stopReason'), extractive_summary)
+        return runtime.response(200, reply)
     
     except Exception as e:
         logger.error("Error processing request: ", exc_info=True)
+        metrics.set_property('error', type(e).__name__)
         return {
             'statusCode': 500,
             'body': str(e)
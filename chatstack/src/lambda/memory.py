@@ -0,0 +1,173 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional
+
+from botocore.exceptions import ClientError
+
+# Conversation memory for multi-turn chat. A session keeps its recent turns word for word
+# in a window of at most `window_tokens` (estimated) tokens, and a running summary of
+# everything older, held to `summary_tokens`. When the window overflows, its oldest turns
+# are folded into the summary until the window is down to half its budget, so the summary
+# is updated every few turns rather than on every one. A turn's prompt is the summary, the
+# window and the new message, however long the conversation gets.
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    # About 4 characters per token, the same estimate as the RAG example's rag_common/text.py
+    return (len(text or "") + 3) // 4
+
+
+def clip_tokens(text: str, max_tokens: int) -> str:
+    """Keep the end of `text` within `max_tokens`, dropping whole lines first."""
+    lines = (text or "").splitlines()
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    text = "\n".join(lines)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[-max_tokens * 4:] if max_tokens > 0 else ""
+
+
+def extractive_summary(summary: str, turns: List[dict], max_tokens: int) -> str:
+    """Fold turns into the summary without a model call: the first sentence of each, newest kept."""
+    lines = [summary] if summary else []
+    for turn in turns:
+        first = _SENTENCE_END.split(turn["text"].strip(), 1)[0][:300]
+        lines.append(f"{turn['role']}: {first}")
+    return clip_tokens("\n".join(lines), max_tokens)
+
+
+def new_state() -> dict:
+    return {"summary": "", "turns": [], "compacted": 0}
+
+
+class SQLiteMemoryStore:
+    """Sessions in a local SQLite file (local runs and tests)."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, "
+                           "updated REAL NOT NULL)")
+        self._conn.commit()
+
+    def load(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id: str, state: dict):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO sessions (id, state, updated) VALUES (?, ?, ?)",
+                               (session_id, json.dumps(state, separators=(",", ":")), time.time()))
+            self._conn.commit()
+
+
+class DynamoMemoryStore:
+    """Sessions in a DynamoDB table: `{session_id, state (JSON), expires_at}`, expired by the table's TTL."""
+
+    def __init__(self, table, ttl_seconds: int = 24 * 3600):
+        self.table = table
+        self.ttl = ttl_seconds
+
+    def load(self, session_id: str) -> Optional[dict]:
+        item = self.table.get_item(Key={"session_id": session_id}).get("Item")
+        if not item or int(item.get("expires_at", 0)) < time.time():
+            return None
+        return json.loads(item["state"])
+
+    def save(self, session_id: str, state: dict):
+        self.table.put_item(Item={"session_id": session_id, "state": json.dumps(state, separators=(",", ":")),
+                                  "expires_at": int(time.time() + self.ttl)})
+
+
+def open_memory_store(backend: str, path: str = "/tmp/chat_memory.sqlite", table=None, ttl_seconds: int = 24 * 3600):
+    """Build the session store for the configured backend ("dynamodb", "local" or "none")."""
+    if backend == "dynamodb":
+        if table is None:
+            raise ValueError("The dynamodb memory store needs a table")
+        return DynamoMemoryStore(table, ttl_seconds)
+    if backend == "local":
+        return SQLiteMemoryStore(path)
+    return None
+
+
+class ConversationMemory:
+    """Token-bounded session history: a window of recent turns plus a summary of older ones.
+
+    `summarize(summary, turns, max_tokens)` returns the summary updated with `turns`. It may
+    call a model; if it fails, the turns are folded in with extractive_summary instead.
+    """
+
+    def __init__(self, store, window_tokens: int = 1500, summary_tokens: int = 300,
+                 summarize: Optional[Callable[[str, List[dict], int], str]] = None):
+        self.store = store
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize or extractive_summary
+
+    def load(self, session_id: str) -> dict:
+        try:
+            return self.store.load(session_id) or new_state()
+        except ClientError as e:
+            # Memory makes the reply better, not possible; answer the message on its own
+            print("Conversation memory read failed:", e.response["Error"]["Code"])
+            return new_state()
+
+    def prompt(self, state: dict):
+        """The summary (None when there is none) and the window as Converse messages."""
+        messages = [{"role": t["role"], "content": [{"text": t["text"]}]} for t in state["turns"]]
+        return state["summary"] or None, messages
+
+    def _fit_newest(self, turns: List[dict]):
+        """Clip the newest pair when it alone is over the window: the question to at most half, the reply to the rest."""
+        if sum(t["tokens"] for t in turns) <= self.window_tokens:
+            return
+        budget = self.window_tokens
+        for turn in turns:
+            limit = min(turn["tokens"], budget // 2) if turn["role"] == "user" else budget
+            turn["text"] = clip_tokens(turn["text"], limit)
+            turn["tokens"] = estimate_tokens(turn["text"])
+            budget -= turn["tokens"]
+
+    def record(self, session_id: str, state: dict, user_text: str, assistant_text: str,
+               summarize: Optional[Callable[[str, List[dict], int], str]] = None) -> dict:
+        """Add a user/assistant turn, compact the window if it overflowed, and save the session.
+
+        `summarize` overrides the memory's summarizer for this turn.
+        """
+        summarize = summarize or self.summarize
+        turns = state["turns"]
+        turns.append({"role": "user", "text": user_text, "tokens": estimate_tokens(user_text)})
+        turns.append({"role": "assistant", "text": assistant_text, "tokens": estimate_tokens(assistant_text)})
+        compacted = []
+        if sum(t["tokens"] for t in turns) > self.window_tokens:
+            # Evict whole user/assistant pairs, so the window still starts with a user turn. The
+            # newest pair always stays, so the next prompt has the exchange it follows from.
+            while len(turns) > 2 and sum(t["tokens"] for t in turns) > self.window_tokens // 2:
+                compacted.extend(turns[:2])
+                del turns[:2]
+            self._fit_newest(turns)
+        if compacted:
+            try:
+                summary = summarize(state["summary"], compacted, self.summary_tokens)
+            except Exception as e:
+                print("Summarizing conversation turns failed, folding them in extractively:", e)
+                summary = extractive_summary(state["summary"], compacted, self.summary_tokens)
+            state["summary"] = clip_tokens(summary, self.summary_tokens)
+            state["compacted"] += len(compacted)
+        try:
+            self.store.save(session_id, state)
+        except ClientError as e:
+            print("Conversation memory write failed:", e.response["Error"]["Code"])
+        return {"window_tokens": sum(t["tokens"] for t in turns), "summary_tokens": estimate_tokens(state["summary"]),
+                "compacted_turns": len(compacted)}
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import math
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+# Local pre-filter for the Bedrock guardrail (infrastructure/guardrails.py). A prompt the
+# guardrail would obviously block, such as a US social security number or a near copy of a
+# denied topic's example, gets the guardrail's blocked-input message without a model call.
+# Everything else, borderline prompts included, still goes to Bedrock, where the guardrail
+# has the final say: the pre-filter can only block, never allow. Verdicts are cached by
+# message hash for the life of the instance.
+
+# SSNs written with separators (123-45-6789, 123 45 6789), leaving out numbers never issued
+# (area 000, 666 or 9xx, group 00, serial 0000). Nine bare digits are left to the guardrail.
+SSN = re.compile(r"\b(?!000|666|9\d\d)\d{3}([- ])(?!00)\d{2}\1(?!0000)\d{4}\b")
+
+_WORD = re.compile(r"\w+")
+
+# Words that say nothing about the topic of a question
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i i'm if in is it me my of on or should so that the "
+    "to what what's when where which who why will with you your".split()
+)
+
+
+def normalize_message(text: str) -> str:
+    """Case-fold and collapse whitespace so trivially different messages share a verdict."""
+    return " ".join((text or "").split()).casefold()
+
+
+def message_key(text: str) -> str:
+    return hashlib.sha256(normalize_message(text).encode("utf-8")).hexdigest()
+
+
+def lexical_embed(texts: List[str]) -> List[Dict[str, float]]:
+    """Sparse unit vectors of a text's content words and word pairs; no model call."""
+    vectors = []
+    for text in texts:
+        words = [w for w in _WORD.findall(normalize_message(text)) if w not in STOPWORDS]
+        counts: Dict[str, float] = {}
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            counts[feature] = counts.get(feature, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+        vectors.append({k: v / norm for k, v in counts.items()})
+    return vectors
+
+
+def titan_embedder(client, model_id: str = "amazon.titan-embed-text-v2:0", dims: int = 256,
+                   max_workers: int = 8) -> Callable[[List[str]], List[List[float]]]:
+    """Embed texts with Titan v2 (one invoke_model call per text, run concurrently)."""
+    def embed_one(text: str) -> List[float]:
+        resp = client.invoke_model(
+            modelId=model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=json.dumps({"inputText": text, "dimensions": dims, "normalize": True}),
+        )
+        return json.loads(resp["body"].read())["embedding"]
+
+    def embed(texts: List[str]) -> List[List[float]]:
+        if len(texts) == 1:
+            return [embed_one(texts[0])]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(texts))) as pool:
+            return list(pool.map(embed_one, texts))
+    return embed
+
+
+def cosine(a, b) -> float:
+    if isinstance(a, dict):
+        return sum(v * b.get(k, 0.0) for k, v in a.items())
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class TopicMatcher:
+    """The denied topic whose example is closest to a message, by embedding cosine similarity."""
+
+    def __init__(self, topics: Dict[str, List[str]], embed: Callable[[List[str]], list]):
+        self.topics = topics
+        self.embed = embed
+        self._examples = None  # (topic, vector) pairs, embedded on the first check
+        self._lock = threading.Lock()
+
+    def _example_vectors(self):
+        with self._lock:
+            if self._examples is None:
+                pairs = [(topic, example) for topic, examples in self.topics.items() for example in examples]
+                vectors = self.embed([example for _, example in pairs]) if pairs else []
+                self._examples = [(topic, v) for (topic, _), v in zip(pairs, vectors)]
+        return self._examples
+
+    def best(self, text: str):
+        examples = self._example_vectors()
+        if not examples:
+            return None, 0.0
+        vector = self.embed([text])[0]
+        topic, score = max(((t, cosine(vector, v)) for t, v in examples), key=lambda x: x[1])
+        return topic, score
+
+
+class PreFilter:
+    """Block obvious guardrail violations in-process; `check` returns the verdict for a message.
+
+    A verdict has `blocked`, `reason` ("pii", "topic" or None), the closest `topic` and its
+    `score`, and `cached`. A failed embedding call is not a verdict: the message goes to Bedrock
+    and is checked again next time.
+    """
+
+    def __init__(self, topics: Optional[Dict[str, List[str]]] = None, embed=None, threshold: float = 0.8,
+                 cache_size: int = 4096):
+        self.matcher = TopicMatcher(topics, embed) if topics and embed else None
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._verdicts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, message: str) -> SimpleNamespace:
+        key = message_key(message)
+        with self._lock:
+            verdict = self._verdicts.get(key)
+            if verdict is not None:
+                self._verdicts.move_to_end(key)
+                self.hits += 1
+                return SimpleNamespace(**verdict, cached=True)
+            self.misses += 1
+
+        verdict = {"blocked": False, "reason": None, "topic": None, "score": 0.0}
+        if SSN.search(message):
+            verdict.update(blocked=True, reason="pii")
+        elif self.matcher is not None:
+            try:
+                topic, score = self.matcher.best(message)
+            except Exception as e:
+                print("Pre-filter topic check failed, leaving the message to the guardrail:", e)
+                return SimpleNamespace(**verdict, cached=False)
+            verdict.update(topic=topic, score=round(score, 4))
+            if score >= self.threshold:
+                verdict.update(blocked=True, reason="topic")
+
+        if self.cache_size > 0:
+            with self._lock:
+                self._verdicts[key] = verdict
+                while len(self._verdicts) > self.cache_size:
+                    self._verdicts.popitem(last=False)
+        return SimpleNamespace(**verdict, cached=False)
+
+
+def open_prefilter(mode: str, topics: Optional[Dict[str, List[str]]] = None, client=None, threshold: float = 0.8,
+                   cache_size: int = 4096):
+    """Build the pre-filter for the configured mode.
+
+    "titan" matches denied topics with Titan embeddings, "lexical" with word overlap (no
+    model call), "pii" only checks for SSNs and "none" turns the pre-filter off.
+    """
+    if mode == "titan":
+        if client is None:
+            raise ValueError("The titan pre-filter needs a bedrock-runtime client")
+        return PreFilter(topics, titan_embedder(client), threshold, cache_size)
+    if mode == "lexical":
+        return PreFilter(topics, lexical_embed, threshold, cache_size)
+    if mode == "pii":
+        return PreFilter(None, None, threshold, cache_size)
+    return None
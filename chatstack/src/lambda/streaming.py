@@ -0,0 +1,65 @@
+import json
+import time
+
+# Streaming replies over the WebSocket API. converse_stream yields the answer as text
+# deltas; they are pushed to the caller's connection as they arrive, batched a little
+# so a long answer does not cost one post_to_connection call per token. The first
+# delta is always sent right away so time to first token stays as low as possible.
+
+
+class ConnectionWriter:
+    """Buffers text deltas and posts them to one WebSocket connection."""
+
+    def __init__(self, api_client, connection_id: str, flush_chars: int = 64, flush_ms: float = 50.0):
+        self.api = api_client
+        self.connection_id = connection_id
+        self.flush_chars = flush_chars
+        self.flush_seconds = flush_ms / 1000.0
+        self.posts = 0
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = 0.0
+
+    def send(self, payload: dict):
+        self.api.post_to_connection(ConnectionId=self.connection_id, Data=json.dumps(payload).encode("utf-8"))
+        self.posts += 1
+
+    def write(self, text: str):
+        self._buffer.append(text)
+        self._buffered += len(text)
+        now = time.monotonic()
+        if self.posts == 0 or self._buffered >= self.flush_chars or now - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        self.send({"type": "delta", "text": "".join(self._buffer)})
+        self._buffer, self._buffered = [], 0
+        self._last_flush = time.monotonic()
+
+
+def stream_converse(client, kwargs: dict, on_text) -> dict:
+    """Call converse_stream, hand each text delta to `on_text` and return the outcome.
+
+    The result has the full text, stop reason, token usage, and timings in ms:
+    `ttft_ms` (request to first text delta) and `total_ms`.
+    """
+    start = time.perf_counter()
+    response = client.converse_stream(**kwargs)
+    parts, result = [], {"stopReason": None, "usage": {}, "ttft_ms": None}
+    for event in response["stream"]:
+        if "contentBlockDelta" in event:
+            text = event["contentBlockDelta"].get("delta", {}).get("text")
+            if text:
+                if result["ttft_ms"] is None:
+                    result["ttft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                parts.append(text)
+                on_text(text)
+        elif "messageStop" in event:
+            result["stopReason"] = event["messageStop"].get("stopReason")
+        elif "metadata" in event:
+            result["usage"] = event["metadata"].get("usage", {})
+    result["text"] = "".join(parts)
+    result["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "lambda"))
+
+from memory import ConversationMemory, SQLiteMemoryStore, estimate_tokens, extractive_summary  # noqa: E402
+
+
+def _memory(tmp_path, window_tokens=100, summary_tokens=40):
+    return ConversationMemory(SQLiteMemoryStore(str(tmp_path / "memory.sqlite")), window_tokens, summary_tokens)
+
+
+def test_long_reply_keeps_the_newest_pair(tmp_path):
+    memory = _memory(tmp_path)
+    state = memory.load("s")
+    memory.record("s", state, "First question?", "A short answer.")
+    long_reply = "Sentence about the movie. " * 30  # Well over window_tokens // 2
+    stats = memory.record("s", memory.load("s"), "Second question?", long_reply)
+
+    state = memory.load("s")
+    assert [t["role"] for t in state["turns"]] == ["user", "assistant"]
+    assert state["turns"][0]["text"] == "Second question?"
+    assert stats["compacted_turns"] == 2
+    assert 0 < stats["window_tokens"] <= memory.window_tokens
+    assert "First question" in state["summary"]
+
+    summary, messages = memory.prompt(state)
+    assert messages[-1]["role"] == "assistant" and messages[-1]["content"][0]["text"]
+
+
+def test_pair_over_the_window_is_clipped_to_fit(tmp_path):
+    memory = _memory(tmp_path)
+    stats = memory.record("s", memory.load("s"), "Why? " * 200, "Because. " * 200)
+
+    turns = memory.load("s")["turns"]
+    assert len(turns) == 2 and all(t["text"] for t in turns)
+    assert turns[0]["tokens"] <= memory.window_tokens // 2
+    assert stats["window_tokens"] == sum(estimate_tokens(t["text"]) for t in turns) <= memory.window_tokens
+
+
+def test_prompt_stays_bounded(tmp_path):
+    memory = _memory(tmp_path)
+    for i in range(50):
+        stats = memory.record("s", memory.load("s"), f"Question {i}? " * 3, f"Answer {i}. " * 10)
+        assert stats["window_tokens"] <= memory.window_tokens
+        assert stats["summary_tokens"] <= memory.summary_tokens
+
+
+def test_summarizer_override_and_fallback(tmp_path):
+    calls = []
+
+    def model(summary, turns, max_tokens):
+        calls.append(len(turns))
+        raise ValueError("Guardrail intervened in the summary")
+
+    memory = ConversationMemory(SQLiteMemoryStore(str(tmp_path / "memory.sqlite")), 60, 40, model)
+    for n in range(3):
+        memory.record("s", memory.load("s"), f"Question {n}?", "An answer about the movie. " * 6, extractive_summary)
+    assert calls == [] and "Question 0" in memory.load("s")["summary"]  # The override never calls the model
+    memory.record("s", memory.load("s"), "Question 3?", "An answer about the movie. " * 6)
+    assert calls and "Question 2" in memory.load("s")["summary"]  # The failed model call fell back to extractive
@@ -0,0 +1,52 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "lambda"))
+
+from prefilter import PreFilter, lexical_embed, open_prefilter  # noqa: E402
+
+TOPICS = {"FinancialAdvice": ["Which stocks should I buy to get rich quickly?", "Is now a good time to invest in crypto?"]}
+
+
+def test_ssn_with_separators_is_blocked():
+    prefilter = open_prefilter("pii")
+    assert prefilter.check("My SSN is 123-45-6789, can you remember it?").reason == "pii"
+    assert prefilter.check("It is 123 45 6789").blocked
+    # Mixed separators, numbers never issued and bare digits are left to the guardrail
+    for message in ("123-45 6789", "666-45-6789", "900-45-6789", "123-00-6789", "123-45-0000", "123456789"):
+        assert not prefilter.check(message).blocked, message
+
+
+def test_near_copy_of_a_denied_topic_is_blocked():
+    prefilter = PreFilter(TOPICS, lexical_embed, threshold=0.8)
+    verdict = prefilter.check("which stocks should I buy to get rich quickly")
+    assert (verdict.blocked, verdict.reason, verdict.topic) == (True, "topic", "FinancialAdvice")
+    allowed = prefilter.check("Which movies should I watch this weekend?")
+    assert not allowed.blocked and allowed.reason is None and allowed.score < 0.8
+
+
+def test_verdicts_are_cached_by_normalized_message():
+    calls = []
+
+    def embed(texts):
+        calls.append(texts)
+        return lexical_embed(texts)
+
+    prefilter = PreFilter(TOPICS, embed, cache_size=1)
+    first = prefilter.check("Is now a good time to invest in crypto?")
+    again = prefilter.check("  is NOW a good time to invest in crypto?")
+    assert first.blocked and not first.cached and again.cached
+    assert len(calls) == 2  # The examples once, then the message
+    prefilter.check("Something else")
+    assert not prefilter.check("Is now a good time to invest in crypto?").cached  # Evicted at cache_size
+
+
+def test_failed_embedding_is_left_to_the_guardrail_and_not_cached():
+    def embed(texts):
+        raise ConnectionError("throttled")
+
+    prefilter = PreFilter(TOPICS, embed)
+    for _ in range(2):
+        verdict = prefilter.check("Which stocks should I buy?")
+        assert not verdict.blocked and not verdict.cached
+    assert prefilter.check("SSN 123-45-6789").blocked  # The SSN check needs no embedding
@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+# Import-time profile of search_client/handler.py. Imports the handler in a fresh
+# interpreter with `-X importtime` and sends it one request against the in-process
+# stand-ins in fakes.py. Reports the slowest imports and the handler's own cold start
+# profile (import time plus each lazy initialization).
+#
+#   python benchmarks/cold_start_profile.py --top 15
+#   python benchmarks/cold_start_profile.py --secret-latency-ms 80 --embed-latency-ms 60
+
+ROOT = Path(__file__).resolve().parents[1]
+BENCH_DIR = Path(__file__).resolve().parent
+
+CHILD = """
+import json, sys, time
+sys.path[:0] = {paths!r}
+from fakes import FakeBedrockRuntime, FakeBoto3, FakePinecone, FakePineconeIndex, FakeS3, FakeSecretsManager
+import boto3, pinecone
+bedrock = FakeBedrockRuntime(embed_latency_ms={embed_latency_ms}, converse_latency_ms=0)
+boto3.client = FakeBoto3(**{{"bedrock-runtime": bedrock, "s3": FakeS3(),
+                            "secretsmanager": FakeSecretsManager(latency_ms={secret_latency_ms})}}).client
+pinecone.Pinecone = FakePinecone(FakePineconeIndex(query_latency_ms={query_latency_ms}))
+start = time.perf_counter()
+import handler
+imported = time.perf_counter()
+handler.lambda_handler({{"body": json.dumps({{"message": "The Matrix"}})}}, None)
+done = time.perf_counter()
+print("PROFILE " + json.dumps({{"import_ms": round((imported - start) * 1000, 1),
+                                "first_request_ms": round((done - imported) * 1000, 1),
+                                "handler": handler.COLD_START, "embed_calls": bedrock.embed_calls}}))
+"""
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start profile of the search Lambda")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--secret-latency-ms", type=float, default=50.0)
+    parser.add_argument("--query-latency-ms", type=float, default=30.0)
+    args = parser.parse_args()
+
+    code = CHILD.format(paths=[str(BENCH_DIR), str(ROOT / "src/lambda/search_client"), str(ROOT / "src/lambda/deps_layer")],
+                        embed_latency_ms=args.embed_latency_ms, secret_latency_ms=args.secret_latency_ms,
+                        query_latency_ms=args.query_latency_ms)
+    # Anything the child writes (metrics records, temporary files) goes to a directory removed afterwards
+    with tempfile.TemporaryDirectory(prefix="cold-start-") as tmp:
+        env = dict(os.environ, PINECONE_SECRET_NAME="benchmark", DOC_STORE_BACKEND="none", PINECONE_ASYNC="0",
+                   METRICS_PATH=os.path.join(tmp, "metrics.jsonl"), TMPDIR=tmp)
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                              env=env, cwd=tmp)
+    if proc.returncode != 0:
+        print(proc.stderr, file=sys.stderr)
+        sys.exit(proc.returncode)
+
+    # -X importtime prints children before their parent, indented two spaces per level
+    imports, handler_imports, pending = [], [], []
+    for line in proc.stderr.splitlines():
+        m = IMPORT_LINE.match(line)
+        if not m:
+            continue
+        depth, entry = (len(m.group(3)) - 1) // 2, (int(m.group(2)), m.group(4))
+        if depth == 1:
+            pending.append(entry)
+        elif depth == 0:
+            imports.append(entry)
+            if entry[1] == "handler":
+                handler_imports = pending
+            pending = []
+    imports.sort(reverse=True)
+    handler_imports.sort(reverse=True)
+    profile = json.loads(next(l for l in proc.stdout.splitlines() if l.startswith("PROFILE "))[len("PROFILE "):])
+
+    print(f"import handler: {profile['import_ms']} ms, first request: {profile['first_request_ms']} ms, "
+          f"Titan calls: {profile['embed_calls']}")
+    print("handler cold start (ms):", json.dumps(profile["handler"]))
+    print("\nslowest imports made by the handler (cumulative ms, modules not already loaded):")
+    for us, name in handler_imports[:args.top]:
+        print(f"  {us / 1000:9.1f}  {name}")
+    print("\nslowest top-level imports (cumulative ms):")
+    for us, name in imports[:args.top]:
+        print(f"  {us / 1000:9.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
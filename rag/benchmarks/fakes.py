@@ -0,0 +1,383 @@
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+# In-process stand-ins for Bedrock, S3 and Pinecone used by the benchmarks.
+# They mimic the parts of each API the Lambdas call, including latency, throttling
+# and request limits, so ingest and search can be measured without AWS or Pinecone.
+
+
+def _client_error(code: str, message: str, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+
+class TokenBucket:
+    """Allows `rate` calls per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class FakeBedrockRuntime:
+    """Titan embeddings and Nova converse / converse_stream with configurable latency and throttling.
+
+    Embeddings are deterministic per text: each text maps to one of a fixed pool
+    of random unit vectors, so generating them costs next to nothing.
+    """
+
+    def __init__(self, dims: int = 1024, embed_latency_ms: float = 20.0, max_rps: float = 0.0,
+                 converse_latency_ms: float = 400.0, output_tokens: int = 120, seed: int = 7, pool_size: int = 256,
+                 first_token_ms: float = None):
+        self.dims = dims
+        self.embed_latency = embed_latency_ms / 1000.0
+        self.converse_latency = converse_latency_ms / 1000.0
+        # converse_stream: the first delta after first_token_ms, the rest spread over the remaining converse latency
+        self.first_token = (converse_latency_ms / 4 if first_token_ms is None else first_token_ms) / 1000.0
+        self.output_tokens = output_tokens
+        self.bucket = TokenBucket(max_rps) if max_rps else None
+        rng = random.Random(seed)
+        self._pool = []
+        for _ in range(pool_size):
+            v = [rng.gauss(0, 1) for _ in range(dims)]
+            norm = math.sqrt(sum(x * x for x in v)) or 1.0
+            self._pool.append([x / norm for x in v])
+        # Serialized once so the fake's own JSON work does not show up in the measurements
+        self._pool_json = [json.dumps(v) for v in self._pool]
+        self._lock = threading.Lock()
+        self.embed_calls = 0
+        self.converse_calls = 0
+        self.throttled = 0
+
+    def _slot(self, text: str) -> int:
+        h = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+        return h % len(self._pool)
+
+    def vector_for(self, text: str, dims: int = None):
+        return self._pool[self._slot(text)][: dims or self.dims]
+
+    def _admit(self, operation: str):
+        if self.bucket and not self.bucket.take():
+            with self._lock:
+                self.throttled += 1
+            raise _client_error("ThrottlingException", "Too many requests, please wait before trying again.", operation)
+
+    def invoke_model(self, modelId, body, contentType=None, accept=None):
+        self._admit("InvokeModel")
+        request = json.loads(body)
+        if self.embed_latency:
+            time.sleep(self.embed_latency)
+        with self._lock:
+            self.embed_calls += 1
+        dims = request.get("dimensions") or self.dims
+        if dims == self.dims:
+            embedding = self._pool_json[self._slot(request["inputText"])]
+        else:
+            embedding = json.dumps(self.vector_for(request["inputText"], dims))
+        data = f'{{"embedding": {embedding}, "inputTextTokenCount": {len(request["inputText"]) // 4}}}'.encode("utf-8")
+        return {"body": StreamingBody(io.BytesIO(data), len(data))}
+
+    def converse(self, modelId, messages, system=None, inferenceConfig=None, **kwargs):
+        self._admit("Converse")
+        if self.converse_latency:
+            time.sleep(self.converse_latency)
+        with self._lock:
+            self.converse_calls += 1
+        prompt = " ".join(c.get("text", "") for m in messages for c in m["content"])
+        prompt += " ".join(s.get("text", "") for s in (system or []))
+        text = " ".join(["token"] * self.output_tokens)
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": text}]}},
+            "stopReason": "end_turn",
+            "usage": self._usage(prompt),
+            "metrics": {"latencyMs": int(self.converse_latency * 1000)},
+        }
+
+    def _usage(self, prompt: str) -> dict:
+        return {"inputTokens": len(prompt) // 4, "outputTokens": self.output_tokens,
+                "totalTokens": len(prompt) // 4 + self.output_tokens}
+
+    def converse_stream(self, modelId, messages, system=None, inferenceConfig=None, **kwargs):
+        self._admit("ConverseStream")
+        with self._lock:
+            self.converse_calls += 1
+        prompt = " ".join(c.get("text", "") for m in messages for c in m["content"])
+        prompt += " ".join(s.get("text", "") for s in (system or []))
+        return {"stream": self._stream_events(prompt)}
+
+    def _stream_events(self, prompt: str):
+        yield {"messageStart": {"role": "assistant"}}
+        time.sleep(self.first_token)
+        interval = max(0.0, self.converse_latency - self.first_token) / max(1, self.output_tokens - 1)
+        for i in range(self.output_tokens):
+            if i and interval:
+                time.sleep(interval)
+            yield {"contentBlockDelta": {"delta": {"text": "token " if i < self.output_tokens - 1 else "token"},
+                                         "contentBlockIndex": 0}}
+        yield {"contentBlockStop": {"contentBlockIndex": 0}}
+        yield {"messageStop": {"stopReason": "end_turn"}}
+        yield {"metadata": {"usage": self._usage(prompt), "metrics": {"latencyMs": int(self.converse_latency * 1000)}}}
+
+
+class FakeS3:
+    """S3 objects held in memory or backed by local files, with Range and IfMatch support, listing and batch delete."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def add_file(self, bucket: str, key: str, path: str):
+        with self._lock:
+            self._objects[(bucket, key)] = ("file", path)
+
+    def _data(self, bucket: str, key: str, operation: str):
+        with self._lock:
+            obj = self._objects.get((bucket, key))
+        if obj is None:
+            raise _client_error("NoSuchKey", "The specified key does not exist.", operation)
+        return obj
+
+    def _size(self, obj):
+        return os.path.getsize(obj[1]) if obj[0] == "file" else len(obj[1])
+
+    def _etag(self, obj):
+        if obj[0] == "file":
+            st = os.stat(obj[1])
+            return hashlib.md5(f"{obj[1]}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()
+        return hashlib.md5(obj[1]).hexdigest()
+
+    def head_object(self, Bucket, Key):
+        obj = self._data(Bucket, Key, "HeadObject")
+        return {"ContentLength": self._size(obj), "ETag": f'"{self._etag(obj)}"'}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        if self.latency:
+            time.sleep(self.latency)
+        obj = self._data(Bucket, Key, "GetObject")
+        if IfMatch and IfMatch.strip('"') != self._etag(obj):
+            raise _client_error("PreconditionFailed", "At least one of the preconditions you specified did not hold.", "GetObject")
+        size = self._size(obj)
+        start, end = 0, size - 1
+        if Range:
+            first, _, last = Range[len("bytes="):].partition("-")
+            start = int(first)
+            end = int(last) if last else size - 1
+        length = max(0, end - start + 1)
+        if obj[0] == "file":
+            f = open(obj[1], "rb")
+            f.seek(start)
+            return {"Body": StreamingBody(_Limited(f, length), length), "ContentLength": length}
+        return {"Body": StreamingBody(io.BytesIO(obj[1][start:end + 1]), length), "ContentLength": length}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        data = Body if isinstance(Body, bytes) else Body.read()
+        with self._lock:
+            self._objects[(Bucket, Key)] = ("bytes", data)
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def download_file(self, Bucket, Key, Filename):
+        obj = self._data(Bucket, Key, "HeadObject")
+        with open(Filename, "wb") as out:
+            if obj[0] == "file":
+                with open(obj[1], "rb") as f:
+                    out.write(f.read())
+            else:
+                out.write(obj[1])
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, "rb") as f:
+            self.put_object(Bucket=Bucket, Key=Key, Body=f.read())
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [o["Key"] for o in Delete["Objects"]]
+        if len(keys) > 1000:
+            raise _client_error("MalformedXML", "The XML you provided was not well-formed.", "DeleteObjects")
+        with self._lock:
+            for key in keys:
+                self._objects.pop((Bucket, key), None)
+        return {}
+
+    def get_paginator(self, operation):
+        assert operation == "list_objects_v2", operation
+        return self
+
+    def paginate(self, Bucket, Prefix="", PageSize=1000):
+        with self._lock:
+            keys = sorted(k for b, k in self._objects if b == Bucket and k.startswith(Prefix))
+        for i in range(0, max(len(keys), 1), PageSize):
+            yield {"Contents": [{"Key": k} for k in keys[i:i + PageSize]]}
+
+
+class _Limited(io.RawIOBase):
+    """Reads at most `length` bytes from a file object (the body of a Range GET)."""
+
+    def __init__(self, f, length):
+        self._f = f
+        self._left = length
+
+    def readable(self):
+        return True
+
+    def read(self, n=-1):
+        if self._left <= 0:
+            return b""
+        n = self._left if n is None or n < 0 else min(n, self._left)
+        data = self._f.read(n)
+        self._left -= len(data)
+        return data
+
+    def close(self):
+        self._f.close()
+        super().close()
+
+
+class FakePineconeIndex:
+    """A Pinecone index in memory that enforces the serverless upsert and delete request limits."""
+
+    MAX_VECTORS_PER_REQUEST = 1000
+    MAX_REQUEST_BYTES = 2 * 1024 * 1024
+
+    def __init__(self, upsert_latency_ms: float = 50.0, query_latency_ms: float = 30.0, store_values: bool = True):
+        # Ingest benchmarks turn store_values off so held vectors do not count against peak RSS
+        self.store_values = store_values
+        self.upsert_latency = upsert_latency_ms / 1000.0
+        self.query_latency = query_latency_ms / 1000.0
+        self.namespaces = {}
+        self._lock = threading.Lock()
+        self.upsert_calls = 0
+        self.rejected = 0
+
+    def upsert(self, vectors, namespace=None, **kwargs):
+        size = len(json.dumps({"vectors": vectors, "namespace": namespace}, separators=(",", ":")))
+        if len(vectors) > self.MAX_VECTORS_PER_REQUEST or size > self.MAX_REQUEST_BYTES:
+            with self._lock:
+                self.rejected += 1
+            raise ValueError(f"Upsert of {len(vectors)} vectors / {size} bytes is over the request limits")
+        if self.upsert_latency:
+            time.sleep(self.upsert_latency)
+        with self._lock:
+            self.upsert_calls += 1
+            ns = self.namespaces.setdefault(namespace or "", {})
+            for v in vectors:
+                ns[v["id"]] = (v["values"] if self.store_values else None, v.get("metadata") or {})
+        return SimpleNamespace(upserted_count=len(vectors))
+
+    def query(self, vector, top_k, namespace=None, include_metadata=False, include_values=False, **kwargs):
+        if self.query_latency:
+            time.sleep(self.query_latency)
+        with self._lock:
+            items = list(self.namespaces.get(namespace or "", {}).items())
+        scored = sorted(((sum(a * b for a, b in zip(vector, values)), vid, md) for vid, (values, md) in items),
+                        key=lambda t: t[0], reverse=True)[:top_k]
+        matches = [SimpleNamespace(id=vid, score=score, metadata=md if include_metadata else None, values=[])
+                   for score, vid, md in scored]
+        return SimpleNamespace(matches=matches, namespace=namespace or "")
+
+    def fetch(self, ids, namespace=None, **kwargs):
+        if self.query_latency:
+            time.sleep(self.query_latency)
+        with self._lock:
+            ns = self.namespaces.get(namespace or "", {})
+            found = {i: SimpleNamespace(id=i, values=ns[i][0], metadata=ns[i][1]) for i in ids if i in ns}
+        return SimpleNamespace(vectors=found, namespace=namespace or "")
+
+    def delete(self, ids, namespace=None, **kwargs):
+        if len(ids) > 1000:
+            raise ValueError(f"Delete of {len(ids)} ids is over the request limit")
+        with self._lock:
+            ns = self.namespaces.get(namespace or "", {})
+            for i in ids:
+                ns.pop(i, None)
+        return {}
+
+    def vector_count(self) -> int:
+        with self._lock:
+            return sum(len(ns) for ns in self.namespaces.values())
+
+
+class FakePinecone:
+    """Drop-in for `pinecone.Pinecone` that hands out a shared FakePineconeIndex."""
+
+    def __init__(self, index: FakePineconeIndex):
+        self._index = index
+        self._created = set()
+
+    def __call__(self, api_key=None, **kwargs):
+        return self
+
+    def has_index(self, name):
+        return name in self._created
+
+    def create_index(self, name, **kwargs):
+        self._created.add(name)
+
+    def Index(self, name=None, **kwargs):
+        return self._index
+
+
+class FakeSecretsManager:
+    """Returns the same secret string for any secret id after `latency_ms`."""
+
+    def __init__(self, secret: str = "benchmark-api-key", latency_ms: float = 0.0):
+        self.secret = secret
+        self.latency = latency_ms / 1000.0
+        self.calls = 0
+
+    def get_secret_value(self, SecretId):
+        if self.latency:
+            time.sleep(self.latency)
+        self.calls += 1
+        return {"Name": SecretId, "SecretString": self.secret}
+
+
+class FakeApiGatewayManagement:
+    """The WebSocket management API: post_to_connection after `latency_ms`, counting posts and bytes."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.posts = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def post_to_connection(self, ConnectionId, Data):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.posts += 1
+            self.bytes += len(Data)
+        return {}
+
+
+class FakeBoto3:
+    """Stands in for the `boto3` module: client() returns the matching fake."""
+
+    def __init__(self, **clients):
+        self._clients = clients
+
+    def client(self, service_name, *args, **kwargs):
+        if service_name not in self._clients:
+            raise ValueError(f"No fake for {service_name}")
+        return self._clients[service_name]
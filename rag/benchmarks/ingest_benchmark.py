@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Offline benchmark for pinecone_ingest/handler.py. Runs the real handler end to end
+# against the in-process stand-ins in fakes.py on synthetic corpora and reports
+# docs/sec, peak RSS and per-stage time. Each corpus size runs in a fresh process so
+# peak RSS is measured per size.
+#
+#   python benchmarks/ingest_benchmark.py --sizes 10,1000,100000 --embed-latency-ms 5
+#   python benchmarks/ingest_benchmark.py --sizes 1000 --out baseline.json
+#   python benchmarks/ingest_benchmark.py --sizes 1000 --baseline baseline.json   # exits 1 on regression
+
+ROOT = Path(__file__).resolve().parents[1]
+BENCH_DIR = Path(__file__).resolve().parent
+BUCKET = "benchmark-data"
+
+WORDS = ("the a hero villain city ship storm night family secret war love plan escape journey friend "
+         "betrayal island detective murder crew captain king queen robot planet desert river train "
+         "letter revenge dream ghost child father mother brother sister soldier doctor").split()
+
+
+def make_corpus(path: Path, count: int, repo: str, seed: int, sentences: int):
+    """Write `count` synthetic movie-like records to a JSONL file."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            text = " ".join(
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+                for _ in range(rng.randint(max(1, sentences // 2), sentences * 2))
+            )
+            title = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}"
+            f.write(json.dumps({"repo": repo, "id": f"{repo}-{i}", "title": title, "text": text}) + "\n")
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+class StageTimer:
+    """Accumulates busy time per stage across all threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = {}
+        self.calls = {}
+
+    def add(self, stage: str, elapsed: float):
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def wrap(self, stage: str, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def wrap_generator(self, stage: str, fn):
+        # Times each step of the generator, which includes pulling from upstream
+        def timed(*args, **kwargs):
+            it = iter(fn(*args, **kwargs))
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    self.add(stage, time.perf_counter() - start)
+                    return
+                self.add(stage, time.perf_counter() - start)
+                yield item
+        return timed
+
+    def summary(self) -> dict:
+        return {k: round(v, 3) for k, v in sorted(self.seconds.items())}
+
+
+def run_one(args) -> dict:
+    """Run one ingest in this process and return its measurements."""
+    # The corpus, caches and stores live in a temporary directory removed after the run
+    with tempfile.TemporaryDirectory(prefix="ingest-bench-") as tmp:
+        return _ingest(args, Path(tmp))
+
+
+def _ingest(args, work: Path) -> dict:
+    sys.path[:0] = [str(BENCH_DIR), str(ROOT / "src/lambda/pinecone_ingest"), str(ROOT / "src/lambda/deps_layer")]
+    import pinecone
+    from fakes import FakeBedrockRuntime, FakeBoto3, FakePinecone, FakePineconeIndex, FakeS3, FakeSecretsManager
+
+    movies = int(args.size * args.movies_share)
+    make_corpus(work / "movies.jsonl", movies, "movies", args.seed, args.sentences)
+    make_corpus(work / "reviews.jsonl", args.size - movies, "reviews", args.seed + 1, max(1, args.sentences // 4))
+
+    # The handler reads its configuration at import time
+    os.environ.update({
+        "PINECONE_SECRET_NAME": "benchmark",
+        "DATA_BUCKET_NAME": BUCKET,
+        "MOVIES_DATA_FILE": "movies.jsonl",
+        "REVIEWS_DATA_FILE": "reviews.jsonl",
+        "EMBED_DIM": str(args.dims),
+        "EMBED_CACHE_BACKEND": args.cache,
+        "EMBED_CACHE_PATH": str(work / "embed_cache.sqlite"),
+        "DOC_STORE_BACKEND": args.doc_store,
+        "DOC_STORE_PATH": str(work / "docstore.sqlite"),
+        "INGEST_MANIFEST_PATH": str(work / "manifest.sqlite"),
+        "PARTITION_BYTES": str(args.partition_bytes),
+        "VECTOR_STORE_BACKEND": "local" if args.vector_store == "local" else "pinecone",
+        "VECTOR_STORE_PATH": str(work / "vectors"),
+        "VECTOR_STORE_SEARCH": args.local_search,
+    })
+    for name in ("EMBED_CONCURRENCY", "UPSERT_CONCURRENCY", "INGEST_BATCH", "PIPELINE_DEPTH"):
+        value = getattr(args, name.lower())
+        if value:
+            os.environ[name] = str(value)
+    import handler
+
+    bedrock = FakeBedrockRuntime(dims=args.dims, embed_latency_ms=args.embed_latency_ms, max_rps=args.max_rps)
+    s3 = FakeS3(latency_ms=args.s3_latency_ms)
+    s3.add_file(BUCKET, "movies.jsonl", str(work / "movies.jsonl"))
+    s3.add_file(BUCKET, "reviews.jsonl", str(work / "reviews.jsonl"))
+    index = FakePineconeIndex(upsert_latency_ms=args.upsert_latency_ms, store_values=False)
+    handler.bedrock = bedrock
+    handler.embedder = handler.TitanEmbedder(bedrock, handler.TITAN_V2_MODEL_ID, dims=args.dims, normalize=True,
+                                             max_in_flight=handler.EMBED_CONCURRENCY, base_delay=0.05)
+    handler.runtime.boto3 = FakeBoto3(s3=s3, secretsmanager=FakeSecretsManager())
+    pinecone.Pinecone = FakePinecone(index)
+
+    timer = StageTimer()
+    handler.parse_records = timer.wrap_generator("read_parse", handler.parse_records)
+    handler.chunk_records = timer.wrap("chunk", handler.chunk_records)
+    handler.titan_v2_embed = timer.wrap("embed", handler.titan_v2_embed)
+    handler._store_documents = timer.wrap("docstore", handler._store_documents)
+    index.upsert = timer.wrap("upsert", index.upsert)
+    if args.vector_store == "local":
+        from rag_common import vectorstore
+        vectorstore.LocalVectorStore.upsert = timer.wrap("upsert", vectorstore.LocalVectorStore.upsert)
+
+    start = time.perf_counter()
+    result = handler.lambda_handler({"mode": args.mode}, None)
+    elapsed = time.perf_counter() - start
+    body = json.loads(result["body"])
+    vectors = index.vector_count()
+    if args.vector_store == "local":
+        from rag_common.vectorstore import LocalVectorStore
+        store = LocalVectorStore(str(work / "vectors"), dims=args.dims, read_only=True)
+        vectors = store.describe_index_stats()["total_vector_count"]
+        store.close()
+    return {
+        "size": args.size,
+        "mode": args.mode,
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(args.size / elapsed, 1) if elapsed else 0.0,
+        "vectors": vectors,
+        "peak_rss_mb": peak_rss_mb(),
+        "stage_seconds": timer.summary(),
+        "embedding": body["embedding"],
+        "embed_calls": bedrock.embed_calls,
+        "throttled": bedrock.throttled,
+        "upsert_calls": index.upsert_calls,
+        "rejected_upserts": index.rejected,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return regressions against a stored baseline (slower docs/sec or higher peak RSS)."""
+    problems = []
+    for r in results:
+        base = baseline.get(str(r["size"]))
+        if not base:
+            continue
+        if r["docs_per_sec"] < base["docs_per_sec"] * (1 - tolerance):
+            problems.append(f"size {r['size']}: {r['docs_per_sec']} docs/sec vs baseline {base['docs_per_sec']}")
+        if r["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            problems.append(f"size {r['size']}: peak RSS {r['peak_rss_mb']} MB vs baseline {base['peak_rss_mb']} MB")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingest benchmark with local Bedrock, S3 and Pinecone stand-ins")
+    parser.add_argument("--sizes", default="10,1000,10000", help="Comma separated corpus sizes (10 to 1000000)")
+    parser.add_argument("--mode", choices=("single", "partitioned"), default="single")
+    parser.add_argument("--dims", type=int, default=1024)
+    parser.add_argument("--sentences", type=int, default=12, help="Average sentences per movie record")
+    parser.add_argument("--movies-share", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0)
+    parser.add_argument("--max-rps", type=float, default=0.0, help="Titan calls/sec before throttling (0 = unlimited)")
+    parser.add_argument("--upsert-latency-ms", type=float, default=50.0)
+    parser.add_argument("--s3-latency-ms", type=float, default=0.0)
+    parser.add_argument("--cache", choices=("none", "sqlite"), default="none")
+    parser.add_argument("--doc-store", choices=("none", "local"), default="local")
+    parser.add_argument("--vector-store", choices=("pinecone", "local"), default="pinecone",
+                        help="pinecone = in-process Pinecone stand-in, local = rag_common LocalVectorStore")
+    parser.add_argument("--local-search", choices=("exact", "ivf"), default="exact")
+    parser.add_argument("--partition-bytes", type=int, default=1024 * 1024)
+    parser.add_argument("--embed-concurrency", type=int)
+    parser.add_argument("--upsert-concurrency", type=int)
+    parser.add_argument("--ingest-batch", type=int)
+    parser.add_argument("--pipeline-depth", type=int)
+    parser.add_argument("--out", help="Write results to this JSON file (usable as a baseline)")
+    parser.add_argument("--baseline", help="Fail if results regress against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression ratio")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size is not None:
+        print(json.dumps(run_one(args)))
+        return
+
+    # Forward every option except the ones that only apply to this parent process
+    skip = {"--out", "--baseline", "--sizes"}
+    passthrough, argv = [], sys.argv[1:]
+    i = 0
+    while i < len(argv):
+        if argv[i] in skip:
+            i += 2
+            continue
+        if argv[i].split("=", 1)[0] in skip:
+            i += 1
+            continue
+        passthrough.append(argv[i])
+        i += 1
+
+    results = []
+    print(f"{'size':>9} {'seconds':>9} {'docs/s':>10} {'vectors':>9} {'rss MB':>8}  stage seconds (busy time, all threads)")
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        proc = subprocess.run([sys.executable, __file__, "--size", str(size), *passthrough],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr, file=sys.stderr)
+            sys.exit(proc.returncode)
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append(r)
+        print(f"{r['size']:>9} {r['seconds']:>9} {r['docs_per_sec']:>10} {r['vectors']:>9} {r['peak_rss_mb']:>8}  {r['stage_seconds']}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({str(r["size"]): r for r in results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for p in problems:
+            print("REGRESSION:", p)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
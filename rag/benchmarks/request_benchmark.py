@@ -0,0 +1,343 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+# Request latency and load benchmark for the /rag and /chat paths. In-process runs drive
+# search_client/handler.py or chatstack's handler against the stand-ins in fakes.py with
+# configurable latencies. Each of the --instances processes plays one Lambda instance: it
+# imports the handler (the cold start) and then serves its share of the requests one at a
+# time, as Lambda does. Latency is measured around lambda_handler, and the per-stage
+# breakdown comes from the handlers' own EMF metrics records. --url sends the same load
+# to a deployed API instead, like the Streamlit clients do.
+#
+#   python benchmarks/request_benchmark.py --target rag --requests 200 --instances 4
+#   python benchmarks/request_benchmark.py --target chat --stream --converse-latency-ms 800
+#   python benchmarks/request_benchmark.py --target rag --out rag-baseline.json
+#   python benchmarks/request_benchmark.py --target rag --baseline rag-baseline.json   # exits 1 on regression
+#   python benchmarks/request_benchmark.py --target rag --url https://<api-id>.execute-api.us-east-1.amazonaws.com
+
+ROOT = Path(__file__).resolve().parents[1]
+BENCH_DIR = Path(__file__).resolve().parent
+CHAT_DIR = ROOT.parent / "chatstack" / "src" / "lambda"
+
+WORDS = ("hero villain city ship storm night family secret war love plan escape journey friend betrayal island "
+         "detective murder crew captain king queen robot planet desert river train letter revenge dream ghost").split()
+
+
+def make_queries(count: int, seed: int):
+    """`count` distinct lower-case queries (the search Lambda embeds case-folded text)."""
+    rng = random.Random(seed)
+    return [f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}" for i in range(count)]
+
+
+def percentile(values, p: float):
+    """Nearest-rank percentile, or None for no values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))], 1)
+
+
+def latency_summary(values) -> dict:
+    return {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95),
+            "p99": percentile(values, 99), "max": round(max(values), 1) if values else None}
+
+
+def label(args) -> str:
+    return f"{args.target}-stream" if args.stream else args.target
+
+
+def _event(args, query: str, n: int) -> dict:
+    body = json.dumps({"message": query})
+    if args.stream:
+        return {"requestContext": {"eventType": "MESSAGE", "connectionId": f"bench-{n}", "domainName": "bench.local",
+                                   "stage": "prod", "routeKey": "chat"},
+                "body": json.dumps({"action": "chat", "message": query})}
+    return {"rawPath": f"/{args.target}", "requestContext": {"http": {"method": "POST"}}, "body": body}
+
+
+def run_instance(args) -> dict:
+    """Play one Lambda instance in this process: import the handler, then serve requests in turn."""
+    # Metrics records and any files the handler writes go to a temporary directory removed afterwards
+    with tempfile.TemporaryDirectory(prefix="request-bench-") as tmp:
+        return _serve(args, Path(tmp))
+
+
+def _serve(args, work: Path) -> dict:
+    from fakes import FakeApiGatewayManagement, FakeBedrockRuntime, FakeBoto3, FakePinecone, FakePineconeIndex, FakeS3, \
+        FakeSecretsManager
+
+    metrics_path = work / "metrics.jsonl"
+    # The handlers read their configuration at import time
+    os.environ.update({
+        "METRICS_SINK": "file",
+        "METRICS_PATH": str(metrics_path),
+        "METRICS_SAMPLE_RATE": "1.0",
+        "PINECONE_SECRET_NAME": "benchmark",
+        "PINECONE_ASYNC": "0",
+        "DOC_STORE_BACKEND": "none",
+        "TITLE_INDEX_BACKEND": "none",
+        "TITLE_INDEX_FILE": str(work / "no-title-index"),
+        "ROUTER_ARTIFACT_DIR": str(work),
+        "GUARDRAIL_ID": "benchmark",
+        "GUARDRAIL_VERSION": "1",
+    })
+    if args.pipeline:
+        os.environ["SEARCH_PIPELINE"] = args.pipeline
+
+    queries = make_queries(args.unique_queries, args.seed)
+    bedrock = FakeBedrockRuntime(embed_latency_ms=args.embed_latency_ms, converse_latency_ms=args.converse_latency_ms,
+                                 first_token_ms=args.first_token_ms, output_tokens=args.output_tokens)
+    fakes = {"bedrock-runtime": bedrock, "secretsmanager": FakeSecretsManager(latency_ms=args.secret_latency_ms),
+             "s3": FakeS3(), "apigatewaymanagementapi": FakeApiGatewayManagement(args.post_latency_ms)}
+
+    import boto3
+    boto3.client = FakeBoto3(**fakes).client
+    if args.target == "rag":
+        import pinecone
+        index = FakePineconeIndex(upsert_latency_ms=0, query_latency_ms=args.query_latency_ms)
+        # Every query has a document in both namespaces, so it finds one wherever it is routed
+        rng = random.Random(args.seed)
+        for namespace in ("movies", "reviews"):
+            index.upsert([{"id": f"{namespace}-{n}", "values": bedrock.vector_for(q),
+                           "metadata": {"title": q.title(), "text": " ".join(
+                               " ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + "."
+                               for _ in range(args.sentences))}}
+                          for n, q in enumerate(queries)], namespace=namespace)
+        pinecone.Pinecone = FakePinecone(index)
+        sys.path[:0] = [str(ROOT / "src/lambda/search_client"), str(ROOT / "src/lambda/deps_layer")]
+    else:
+        sys.path[:0] = [str(CHAT_DIR), str(ROOT / "src/lambda/deps_layer")]
+
+    rng = random.Random(args.seed * 1000 + args.instance)
+    requests = []
+    # Handler output (logs, prints) stays out of the result on stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        # boto3 and pinecone are already imported to install the fakes, so this is the handler's own import time
+        start = time.perf_counter()
+        import handler
+        import_ms = (time.perf_counter() - start) * 1000
+        warm_start = None
+        for n in range(args.instance_requests):
+            query = rng.choice(queries)
+            context = SimpleNamespace(aws_request_id=f"bench-{args.instance}-{n}")
+            start = time.perf_counter()
+            try:
+                status = handler.lambda_handler(_event(args, query, n), context).get("statusCode")
+            except Exception as e:
+                status = type(e).__name__
+            requests.append({"ms": round((time.perf_counter() - start) * 1000, 2), "status": status})
+            if warm_start is None:
+                warm_start = time.time()
+        warm_end = time.time()
+
+    records = []
+    if metrics_path.exists():
+        with open(metrics_path) as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    # One record per request, in order: the instance serves one request at a time
+    for r, record in zip(requests, records):
+        r["stages"] = {k: v for k, v in record.items() if k.endswith("_ms") and k != "total_ms"}
+    return {"instance": args.instance, "import_ms": round(import_ms, 1), "requests": requests,
+            "warm_start": warm_start, "warm_end": warm_end, "converse_calls": bedrock.converse_calls,
+            "embed_calls": bedrock.embed_calls}
+
+
+def run_in_process(args, passthrough) -> dict:
+    """Start --instances instance processes at once and merge their measurements."""
+    per_instance = [args.requests // args.instances + (1 if i < args.requests % args.instances else 0)
+                    for i in range(args.instances)]
+    procs = [subprocess.Popen([sys.executable, __file__, *passthrough, "--instance", str(i),
+                               "--instance-requests", str(count)], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              text=True)
+             for i, count in enumerate(per_instance) if count]
+    instances = []
+    for proc in procs:
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            print(err, file=sys.stderr)
+            sys.exit(proc.returncode)
+        instances.append(json.loads(out.strip().splitlines()[-1]))
+
+    cold = [i["requests"][0] for i in instances]
+    warm = [r for i in instances for r in i["requests"][1:]]
+    starts = [i["warm_start"] for i in instances if len(i["requests"]) > 1]
+    ends = [i["warm_end"] for i in instances if len(i["requests"]) > 1]
+    elapsed = max(ends) - min(starts) if starts else 0.0
+    stages = sorted({k for r in warm + cold for k in r.get("stages", {})})
+    return {
+        "target": label(args),
+        "mode": "in-process",
+        "instances": len(instances),
+        "requests": sum(len(i["requests"]) for i in instances),
+        "errors": sum(1 for i in instances for r in i["requests"] if r["status"] != 200),
+        "throughput_rps": round(len(warm) / elapsed, 1) if elapsed else None,
+        "import_ms": latency_summary([i["import_ms"] for i in instances]),
+        "cold_ms": latency_summary([r["ms"] for r in cold]),
+        "warm_ms": latency_summary([r["ms"] for r in warm]),
+        "cold_stages_p50": {s: percentile([r["stages"][s] for r in cold if s in r.get("stages", {})], 50)
+                            for s in stages},
+        "warm_stages": {s: {"p50": percentile(v, 50), "p95": percentile(v, 95)}
+                        for s in stages for v in [[r["stages"][s] for r in warm if s in r.get("stages", {})]] if v},
+        "model_calls": {"converse": sum(i["converse_calls"] for i in instances),
+                        "embed": sum(i["embed_calls"] for i in instances)},
+    }
+
+
+def run_remote(args) -> dict:
+    """Send the load to a deployed API: --instances concurrent clients, one request at a time each."""
+    queries = make_queries(args.unique_queries, args.seed)
+    url = args.url.rstrip("/") + f"/{args.target}"
+    rng = random.Random(args.seed)
+    plan = [rng.choice(queries) for _ in range(args.requests)]
+
+    def send(query):
+        request = urllib.request.Request(url, data=json.dumps({"message": query}).encode("utf-8"),
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=args.timeout) as resp:
+                resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception as e:
+            status = type(e).__name__
+        return {"ms": round((time.perf_counter() - start) * 1000, 2), "status": status}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.instances) as pool:
+        results = list(pool.map(send, plan))
+    elapsed = time.perf_counter() - start
+    return {
+        "target": label(args),
+        "mode": "remote",
+        "instances": args.instances,
+        "requests": len(results),
+        "errors": sum(1 for r in results if r["status"] != 200),
+        "throughput_rps": round(len(results) / elapsed, 1) if elapsed else None,
+        # Whether API Gateway hit a cold instance is not visible to the client
+        "warm_ms": latency_summary([r["ms"] for r in results]),
+    }
+
+
+def compare(result, baseline, tolerance, slack_ms):
+    """Return regressions against a stored baseline: slower percentiles, lower throughput, more errors."""
+    base = baseline.get(result["target"])
+    if not base:
+        return []
+    problems = []
+    for group in ("warm_ms", "cold_ms"):
+        for p in ("p50", "p95", "p99"):
+            now, then = (result.get(group) or {}).get(p), (base.get(group) or {}).get(p)
+            if now is not None and then is not None and now > then * (1 + tolerance) + slack_ms:
+                problems.append(f"{result['target']}: {group} {p} {now} ms vs baseline {then} ms")
+    now, then = result.get("throughput_rps"), base.get("throughput_rps")
+    if now is not None and then and now < then * (1 - tolerance):
+        problems.append(f"{result['target']}: {now} req/s vs baseline {then} req/s")
+    if result["errors"] > base.get("errors", 0):
+        problems.append(f"{result['target']}: {result['errors']} errors vs baseline {base.get('errors', 0)}")
+    return problems
+
+
+def print_result(r):
+    print(f"{r['target']} ({r['mode']}): {r['requests']} requests on {r['instances']} instances, "
+          f"{r['errors']} errors, {r['throughput_rps']} req/s warm")
+    print(f"{'':>8} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for name in ("import_ms", "cold_ms", "warm_ms"):
+        if name in r:
+            s = r[name]
+            print(f"{name[:-3]:>8} {s['count']:>7} {s['p50']!s:>9} {s['p95']!s:>9} {s['p99']!s:>9} {s['max']!s:>9}")
+    if r.get("warm_stages"):
+        print("stages (ms): warm p50/p95, cold p50")
+        for stage, s in r["warm_stages"].items():
+            print(f"  {stage:<22} {s['p50']!s:>8} / {s['p95']!s:<8} {r['cold_stages_p50'].get(stage)!s:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and load benchmark for the /rag and /chat request paths")
+    parser.add_argument("--target", choices=("rag", "chat"), default="rag")
+    parser.add_argument("--stream", action="store_true", help="chat: use the WebSocket streaming path")
+    parser.add_argument("--pipeline", choices=("async", "sync"), help="rag: SEARCH_PIPELINE (default: the handler's)")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--instances", type=int, default=4, help="Lambda instances (or concurrent clients with --url)")
+    parser.add_argument("--unique-queries", type=int, default=50, help="Distinct queries the requests draw from")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--sentences", type=int, default=20, help="rag: sentences per document")
+    parser.add_argument("--embed-latency-ms", type=float, default=40.0)
+    parser.add_argument("--query-latency-ms", type=float, default=30.0)
+    parser.add_argument("--secret-latency-ms", type=float, default=50.0)
+    parser.add_argument("--converse-latency-ms", type=float, default=400.0)
+    parser.add_argument("--first-token-ms", type=float, help="converse_stream time to first token (default 1/4 of converse)")
+    parser.add_argument("--output-tokens", type=int, default=120)
+    parser.add_argument("--post-latency-ms", type=float, default=5.0, help="WebSocket post_to_connection latency")
+    parser.add_argument("--url", help="Benchmark a deployed API (HTTP routes) instead of the in-process handler")
+    parser.add_argument("--timeout", type=float, default=30.0, help="--url request timeout in seconds")
+    parser.add_argument("--out", help="Write the result to this JSON file (usable as a baseline)")
+    parser.add_argument("--baseline", help="Fail if the result regresses against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression ratio")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="Latency difference always allowed (timer noise)")
+    parser.add_argument("--instance", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--instance-requests", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.stream and args.target != "chat":
+        parser.error("--stream applies to --target chat")
+    if args.stream and args.url:
+        parser.error("--url only drives the HTTP routes")
+
+    if args.instance is not None:
+        sys.path.insert(0, str(BENCH_DIR))
+        print(json.dumps(run_instance(args)))
+        return
+
+    if args.url:
+        result = run_remote(args)
+    else:
+        # Forward every option except the ones that only apply to this parent process
+        skip = {"--out", "--baseline", "--requests", "--instances", "--tolerance", "--slack-ms"}
+        passthrough, argv = [], sys.argv[1:]
+        i = 0
+        while i < len(argv):
+            if argv[i] in skip:
+                i += 2
+                continue
+            if argv[i].split("=", 1)[0] in skip:
+                i += 1
+                continue
+            passthrough.append(argv[i])
+            i += 1
+        result = run_in_process(args, passthrough)
+    print_result(result)
+
+    if args.out:
+        stored = {}
+        if os.path.exists(args.out):
+            with open(args.out) as f:
+                stored = json.load(f)
+        stored[result["target"]] = result
+        with open(args.out, "w") as f:
+            json.dump(stored, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(result, json.load(f), args.tolerance, args.slack_ms)
+        for p in problems:
+            print("REGRESSION:", p)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,6 @@ if not pinecone_api_key:
     raise ValueError("Missing PINECONE_API_KEY in .env")
 
 pineconestack = PineconeIndexStack(app, "PineconeIndexStack", pinecone_api_key=pinecone_api_key)
-ClientStack(app, "ClientStack", pinecone_secret_val = pineconestack.pinecone_secret, lambda_layer = pineconestack.layer)
+ClientStack(app, "ClientStack", pinecone_secret_val = pineconestack.pinecone_secret, lambda_layer = pineconestack.layer, doc_store_bucket = pineconestack.data_bucket)
 
 app.synth()
\ No newline at end of file
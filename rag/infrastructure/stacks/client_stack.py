@@ -7,13 +7,15 @@ from aws_cdk import (
     Tags,
     CfnOutput,
     aws_s3 as s3,
+    aws_dynamodb as dynamodb,
+    RemovalPolicy,
 )
 from constructs import Construct
 from aws_cdk.aws_apigatewayv2 import HttpApi, HttpMethod, CorsHttpMethod
 from aws_cdk.aws_apigatewayv2_integrations import HttpLambdaIntegration
 
 class ClientStack(Stack):
-    def __init__(self, scope: Construct, construct_id: str, pinecone_secret_val: secretsmanager.ISecret, lambda_layer: _lambda.ILayerVersion, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, pinecone_secret_val: secretsmanager.ISecret, lambda_layer: _lambda.ILayerVersion, doc_store_bucket: s3.IBucket, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
         
         lambda_role = iam.Role(self, "StreamlitClientLambdaExecutionRole",
@@ -46,6 +48,52 @@ class ClientStack(Stack):
         )
         Tags.of(lambda_role).add("example", "rag")
 
+        # Query embeddings shared by all warm instances of the search Lambda; DynamoDB TTL expires old entries
+        query_cache_table = dynamodb.Table(self, "QueryEmbeddingCacheTable",
+            partition_key=dynamodb.Attribute(name="key", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+        Tags.of(query_cache_table).add("example", "rag")
+
+        environment = {
+            "MODEL_ID": "amazon.nova-micro-v1:0",
+            "REGION": self.region,
+            "PINECONE_SECRET_NAME": pinecone_secret_val.secret_name,
+            "PINECONE_SECRET_ARN": pinecone_secret_val.secret_arn,
+            "EMBED_DIM": "1024",
+            "TOP_K" : "5",
+            "DOC_STORE_BACKEND": "s3",
+            "DOC_STORE_BUCKET": doc_store_bucket.bucket_name,
+            "DOC_STORE_PREFIX": "docs",
+            "TITLE_INDEX_BACKEND": "s3",
+            "TITLE_INDEX_BUCKET": doc_store_bucket.bucket_name,
+            "TITLE_INDEX_PREFIX": "titles",
+            "TITLE_INDEX_MIN_SIMILARITY": "0.6",
+            "TITLE_INDEX_MIN_PREFIX_SHARE": "0.5",
+            "QUERY_CACHE_TABLE": query_cache_table.table_name,
+            "QUERY_CACHE_SIZE": "1024",
+            "QUERY_CACHE_TTL_SECONDS": "3600",
+            "ROUTE_MAX_NAMESPACES": "2",
+            "ROUTE_MARGIN": "0.05",
+            "ANSWER_CACHE_SIZE": "512",
+            "ANSWER_CACHE_TTL_SECONDS": "3600",
+            "ANSWER_CACHE_MIN_SIMILARITY": "0.95",
+            "SEARCH_PIPELINE": "async",
+            "PINECONE_ASYNC": "1",
+            "SPECULATIVE_NAMESPACES": "1",
+            "RETRIEVAL_MODE": "two_phase",
+            "RETRIEVAL_CUT_GAP": "0.05",
+            "CONTEXT_TOKEN_BUDGET": "1500",
+            "METRICS_SINK": "stdout",
+            "METRICS_SAMPLE_RATE": "1.0",
+            "BATCH_MAX_QUERIES": "24",
+            "BATCH_QUERY_CONCURRENCY": "8",
+            "BATCH_GENERATE_CONCURRENCY": "8",
+            "BATCH_TIME_BUDGET_MS": "27000",
+            "BATCH_DEADLINE_MARGIN_MS": "1500",
+        }
         lambda_function = _lambda.Function(self, "RAGFunction",
             runtime=_lambda.Runtime.PYTHON_3_11,
             handler="handler.lambda_handler",
@@ -53,17 +101,29 @@ class ClientStack(Stack):
             code=_lambda.Code.from_asset("./src/lambda/search_client"),
             memory_size=128,
             timeout=Duration.seconds(30),
-            environment={
-                "MODEL_ID": "amazon.nova-micro-v1:0",
-                "REGION": self.region,
-                "PINECONE_SECRET_NAME": pinecone_secret_val.secret_name,
-                "PINECONE_SECRET_ARN": pinecone_secret_val.secret_arn,
-                "EMBED_DIM": "1024",
-                "TOP_K" : "5"
-            }, 
+            environment=environment,
+            layers=[lambda_layer],
+        )
+        # /rag/batch runs up to 8 searches and 8 generations at once, so it gets its own function with
+        # more memory (and CPU). API Gateway stops waiting after 30 s, so BATCH_TIME_BUDGET_MS ends the
+        # batch before that and the timeout stays at 30 s.
+        batch_function = _lambda.Function(self, "RAGBatchFunction",
+            runtime=_lambda.Runtime.PYTHON_3_11,
+            handler="handler.lambda_handler",
+            role=lambda_role,
+            code=_lambda.Code.from_asset("./src/lambda/search_client"),
+            memory_size=512,
+            timeout=Duration.seconds(30),
+            environment=environment,
             layers=[lambda_layer],
         )
-        Tags.of(lambda_function).add("example", "rag")
+        for function in (lambda_function, batch_function):
+            Tags.of(function).add("example", "rag")
+            # Full document text is read from the document store written by the ingest Lambda
+            doc_store_bucket.grant_read(function, "docs/*")
+            # Title index shards, used when no index is packaged with the code (scripts/build_title_index.py)
+            doc_store_bucket.grant_read(function, "titles/*")
+            query_cache_table.grant_read_write_data(function)
 
 
         # Create HTTP API Gateway
@@ -87,6 +147,12 @@ class ClientStack(Stack):
             methods=[HttpMethod.POST],
             integration=lambda_integration,
         )
+        # Many queries per call: {"messages": [...]} -> one result or error per message
+        http_api.add_routes(
+            path="/rag/batch",
+            methods=[HttpMethod.POST],
+            integration=HttpLambdaIntegration("RAGBatchLambdaIntegration", batch_function),
+        )
 
         Tags.of(http_api).add("example", "rag")
 
@@ -10,6 +10,7 @@ from aws_cdk import (
     aws_s3 as s3,
     aws_secretsmanager as secretsmanager,
     aws_s3_deployment as s3_deploy,
+    aws_dynamodb as dynamodb,
 )
 import aws_cdk as cdk
 import os
@@ -46,6 +47,7 @@ class PineconeIndexStack(Stack):
             auto_delete_objects=True,
         )
         Tags.of(data_bucket).add("example", "rag")
+        self.data_bucket = data_bucket
 
         project_root = Path(__file__).resolve().parents[2]
 
@@ -54,6 +56,8 @@ class PineconeIndexStack(Stack):
             "DeployDemoData",
             sources=[s3_deploy.Source.asset(str(project_root / "data"))],
             destination_bucket=data_bucket,
+            # Keep the ingest Lambda's embedding cache, document store and title index when the data files are redeployed
+            exclude=["cache/*", "docs/*", "titles/*"],
         )
 
         # Define IAM role for Lambda function.
@@ -104,6 +108,17 @@ class PineconeIndexStack(Stack):
 
         Tags.of(self.layer).add("example", "rag")
 
+        # Manifest of byte-range partitions for checkpointed ingest
+        manifest_table = dynamodb.Table(
+            self,
+            "IngestManifestTable",
+            partition_key=dynamodb.Attribute(name="job", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="part", type=dynamodb.AttributeType.NUMBER),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=cdk.RemovalPolicy.DESTROY,
+        )
+        Tags.of(manifest_table).add("example", "rag")
+
         # Lambda function to interact with Pinecone
         lambda_function = _lambda.Function(
             self,
@@ -123,6 +138,23 @@ class PineconeIndexStack(Stack):
                 "REVIEWS_DATA_FILE": "reviews.jsonl",
                 "BEDROCK_REGION": self.region,
                 "EMBED_DIM": "1024",
+                "EMBED_CONCURRENCY": "8",
+                "INGEST_BATCH": "100",
+                "PIPELINE_DEPTH": "2",
+                "UPSERT_CONCURRENCY": "4",
+                "EMBED_CACHE_BACKEND": "s3",
+                "EMBED_CACHE_KEY": "cache/embeddings.sqlite",
+                "CHUNK_MAX_TOKENS": "512",
+                "CHUNK_OVERLAP_TOKENS": "64",
+                "DOC_STORE_BACKEND": "s3",
+                "DOC_STORE_PREFIX": "docs",
+                "TITLE_INDEX_BACKEND": "s3",
+                "TITLE_INDEX_PREFIX": "titles",
+                "TITLE_INDEX_NAMESPACES": "movies",
+                "INGEST_MODE": "partitioned",
+                "INGEST_MANIFEST_TABLE": manifest_table.table_name,
+                "INGEST_WORKERS": "4",
+                "PARTITION_BYTES": str(8 * 1024 * 1024),
             },
             layers=[self.layer],
         )
@@ -130,6 +162,19 @@ class PineconeIndexStack(Stack):
 
         self.pinecone_secret.grant_read(lambda_function)
         s3.Bucket.grant_read(data_bucket, lambda_function)
+        data_bucket.grant_put(lambda_function, "cache/*")
+        data_bucket.grant_put(lambda_function, "docs/*")
+        data_bucket.grant_put(lambda_function, "titles/*")
+        data_bucket.grant_delete(lambda_function, "titles/*")  # Shards left by an earlier run
+        manifest_table.grant_read_write_data(lambda_function)
+        # Partitioned ingest starts extra invocations of itself to share and continue the work.
+        # The ARN is built from the name prefix; referencing the function here would be circular.
+        lambda_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["lambda:InvokeFunction"],
+                resources=[f"arn:aws:lambda:{self.region}:{self.account}:function:{self.stack_name}-IngestIntoPineCone*"],
+            )
+        )
 
         # Output the Lambda function name
         CfnOutput(
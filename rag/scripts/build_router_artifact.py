@@ -0,0 +1,49 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import boto3
+
+# Precompute the namespace descriptor embeddings used by the search Lambda's router.
+# The artifact is written next to the Lambda code (search_client/artifacts/) and is
+# keyed by model id and dimension, so a cold start loads it instead of calling Bedrock.
+# Re-run this whenever namespaces.json, the embedding model or EMBED_DIM changes;
+# the Lambda ignores an artifact built from a different registry.
+
+ROOT = Path(__file__).resolve().parents[1]
+SEARCH_CLIENT = ROOT / "src/lambda/search_client"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the namespace descriptor embedding artifact for the search Lambda")
+    parser.add_argument("--registry", default=str(SEARCH_CLIENT / "namespaces.json"))
+    parser.add_argument("--out-dir", default=str(SEARCH_CLIENT / "artifacts"))
+    parser.add_argument("--model-id", default="amazon.titan-embed-text-v2:0")
+    parser.add_argument("--dims", type=int, default=1024)
+    parser.add_argument("--region", default="us-east-1")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(SEARCH_CLIENT))
+    from router import NamespaceRouter, artifact_path, load_registry
+
+    bedrock = boto3.client("bedrock-runtime", region_name=args.region)
+
+    def embed(text):
+        resp = bedrock.invoke_model(
+            modelId=args.model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=json.dumps({"inputText": text, "dimensions": args.dims, "normalize": True}),
+        )
+        return json.loads(resp["body"].read())["embedding"]
+
+    registry = load_registry(args.registry)
+    router = NamespaceRouter.from_registry(registry, embed)
+    path = artifact_path(args.out_dir, args.model_id, args.dims)
+    router.save(path, args.model_id, registry)
+    print(f"Wrote {path}: registry version {router.version}, {len(router.names)} namespaces, {args.dims} dims")
+
+
+if __name__ == "__main__":
+    main()
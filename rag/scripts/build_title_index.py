@@ -0,0 +1,43 @@
+import argparse
+import sys
+from pathlib import Path
+
+import boto3
+
+# Package the title index with the search Lambda. Merges the shards the ingest Lambda
+# wrote (TITLE_INDEX_BACKEND=s3 or local) into one file next to the Lambda code
+# (search_client/artifacts/titles.json.z), so a cold start reads it from disk instead
+# of listing and fetching the shards from S3. Re-run after each ingest.
+
+ROOT = Path(__file__).resolve().parents[1]
+SEARCH_CLIENT = ROOT / "src/lambda/search_client"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the title index file for the search Lambda")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--bucket", help="Data bucket holding the shards written by the ingest Lambda")
+    source.add_argument("--path", help="Local shard directory (TITLE_INDEX_PATH of a local ingest)")
+    parser.add_argument("--prefix", default="titles")
+    parser.add_argument("--out", default=str(SEARCH_CLIENT / "artifacts/titles.json.z"))
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT / "src/lambda/deps_layer"))
+    from rag_common.titles import TitleIndex, encode_entries, load_title_shards
+
+    if args.bucket:
+        entries = load_title_shards(s3=boto3.client("s3"), bucket=args.bucket, prefix=args.prefix)
+    else:
+        entries = load_title_shards(path=args.path)
+    index = TitleIndex(entries)
+    # Shards can overlap (re-ingested or re-planned partitions); write each document once
+    merged = [[ns, doc_id, chunks, title] for docs in index.titles.values() for ns, doc_id, chunks, title in docs]
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_bytes(encode_entries(merged))
+    print(f"Wrote {out}: {len(index)} titles, {len(merged)} documents from {len(entries)} shard entries, "
+          f"{out.stat().st_size} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,7 @@ with open("data/movies.jsonl","w") as f:
                 "repo": "movies",
                 "id": title,
                 "title": title,
-                "text": text[:8000]
+                "text": text  # long plots are chunked at ingest time
             }) + "\n")
 
 print("✅ wrote data/movies.jsonl")
\ No newline at end of file
@@ -25,7 +25,7 @@ with open("data/reviews.jsonl", "w", encoding="utf-8") as f:
             "repo": "reviews",
             "id": i,
             "title": label,
-            "text": text[:8000]
+            "text": text
         }) + "\n")
 
 print("✅ wrote data/reviews.jsonl with mixed sentiment")
@@ -0,0 +1,53 @@
+import argparse
+import json
+import os
+import sys
+from multiprocessing import Pool
+from pathlib import Path
+
+# Run the checkpointed (partitioned) ingest from local processes against the deployed
+# S3 data bucket, Bedrock and Pinecone. Workers share a manifest, so this can be
+# started several times, alongside Lambda invocations, or after a failed run.
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _worker(n):
+    sys.path[:0] = [str(ROOT / "src/lambda/pinecone_ingest"), str(ROOT / "src/lambda/deps_layer")]
+    import handler
+
+    result = handler.lambda_handler({"mode": "partitioned", "continuation": True}, None)
+    return n, json.loads(result["body"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkpointed ingest into Pinecone from local processes")
+    parser.add_argument("--bucket", required=True, help="Data bucket holding the JSONL files")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--manifest-table", help="DynamoDB manifest table (shared with Lambda runs)")
+    parser.add_argument("--manifest-path", default=str(ROOT / "data/.ingest_manifest.sqlite"),
+                        help="Local SQLite manifest used when no table is given")
+    parser.add_argument("--secret-name", default="rag/pinecone/api-key")
+    parser.add_argument("--movies-file", default="movies.jsonl")
+    parser.add_argument("--reviews-file", default="reviews.jsonl")
+    args = parser.parse_args()
+
+    # handler reads its configuration from the environment at import time
+    os.environ.update({
+        "DATA_BUCKET_NAME": args.bucket,
+        "PINECONE_SECRET_NAME": args.secret_name,
+        "MOVIES_DATA_FILE": args.movies_file,
+        "REVIEWS_DATA_FILE": args.reviews_file,
+        "INGEST_MANIFEST_PATH": args.manifest_path,
+    })
+    os.environ.setdefault("EMBED_CACHE_PATH", str(ROOT / "data/.embed_cache.sqlite"))
+    if args.manifest_table:
+        os.environ["INGEST_MANIFEST_TABLE"] = args.manifest_table
+
+    with Pool(args.workers) as pool:
+        for n, body in pool.imap_unordered(_worker, range(args.workers)):
+            print(f"worker {n}: upserted {body['upserted']} vectors, partitions {body['partitions']}")
+
+
+if __name__ == "__main__":
+    main()
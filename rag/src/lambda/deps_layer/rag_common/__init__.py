@@ -0,0 +1,3 @@
+# Code shared by the ingest and search Lambdas. Shipped in the deps layer, so it is
+# importable from both functions as `rag_common`. The chat Lambda in chatstack bundles
+# runtime.py and metrics.py from here into its own layer.
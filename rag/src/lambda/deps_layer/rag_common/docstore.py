@@ -0,0 +1,114 @@
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+from urllib.parse import quote
+
+from botocore.exceptions import ClientError
+
+# Sidecar store for full document text. Pinecone only keeps small filterable metadata;
+# the text lives here, compressed and addressed by (namespace, vector id), and is read
+# on demand for the few matches that make it into the prompt.
+
+
+def encode_doc(doc: dict) -> bytes:
+    return zlib.compress(json.dumps(doc, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_doc(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class LocalDocStore:
+    """Document store in a local SQLite file (local runs, tests and benchmarks)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs (namespace TEXT NOT NULL, id TEXT NOT NULL, body BLOB NOT NULL, "
+            "PRIMARY KEY (namespace, id))"
+        )
+        self._conn.commit()
+
+    def put_many(self, namespace: str, docs: Dict[str, dict]):
+        if not docs:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO docs (namespace, id, body) VALUES (?, ?, ?)",
+                [(namespace or "", doc_id, encode_doc(doc)) for doc_id, doc in docs.items()],
+            )
+            self._conn.commit()
+
+    def get_many(self, namespace: str, ids: Iterable[str]) -> Dict[str, dict]:
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return {}
+        marks = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, body FROM docs WHERE namespace = ? AND id IN ({marks})", [namespace or "", *ids]
+            ).fetchall()
+        return {doc_id: decode_doc(body) for doc_id, body in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class S3DocStore:
+    """Document store with one compressed object per document under `prefix/namespace/`.
+
+    Reads and writes for a batch of ids run in parallel.
+    """
+
+    def __init__(self, s3, bucket: str, prefix: str = "docs", max_workers: int = 8):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="docstore")
+
+    def _key(self, namespace: str, doc_id: str) -> str:
+        return f"{self.prefix}/{quote(namespace or '_default', safe='')}/{quote(doc_id, safe='')}.json.z"
+
+    def put_many(self, namespace: str, docs: Dict[str, dict]):
+        def put(item):
+            doc_id, doc = item
+            self.s3.put_object(Bucket=self.bucket, Key=self._key(namespace, doc_id), Body=encode_doc(doc))
+
+        list(self._pool.map(put, docs.items()))
+
+    def get_many(self, namespace: str, ids: Iterable[str]) -> Dict[str, dict]:
+        def get(doc_id):
+            try:
+                resp = self.s3.get_object(Bucket=self.bucket, Key=self._key(namespace, doc_id))
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                    return doc_id, None
+                raise
+            return doc_id, decode_doc(resp["Body"].read())
+
+        return {doc_id: doc for doc_id, doc in self._pool.map(get, list(dict.fromkeys(ids))) if doc is not None}
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+def open_doc_store(backend: str, path: str = "/tmp/docstore.sqlite", s3=None, bucket: Optional[str] = None,
+                   prefix: str = "docs"):
+    """Build the document store for the configured backend ("s3", "local" or "none")."""
+    if backend == "s3":
+        if not bucket:
+            raise ValueError("The s3 document store needs a bucket")
+        return S3DocStore(s3, bucket, prefix)
+    if backend == "local":
+        return LocalDocStore(path)
+    return None
@@ -0,0 +1,162 @@
+import contextvars
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+# Per-request instrumentation. A trace collects stage timings (spans, in ms), counters
+# such as Nova token usage, and a few properties, and is written as one CloudWatch
+# Embedded Metric Format (EMF) record when the request ends. Lambda ships stdout to
+# CloudWatch Logs, which turns EMF records into metrics, so p50/p99 per stage come
+# without any API call. The file sink writes the same records as JSON lines for local
+# runs and benchmarks.
+#
+# Only a sample of requests is emitted (errors always are), and properties whose names
+# are in `redact` (user text, prompts, answers) are replaced by a hash and a length.
+
+_current = contextvars.ContextVar("metrics_trace", default=None)
+
+
+def redact(value) -> dict:
+    text = value if isinstance(value, str) else json.dumps(value, default=str)
+    return {"sha256": hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], "chars": len(text)}
+
+
+class Trace:
+    """Spans, counters and properties of one request."""
+
+    def __init__(self, recorder: "MetricsRecorder", sampled: bool):
+        self.recorder = recorder
+        self.sampled = sampled
+        self.start = time.perf_counter()
+        self.values = {}
+        self.properties = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(f"{name}_ms", (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, value: float):
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + value
+
+    def set(self, name: str, value):
+        self.properties[name] = redact(value) if name in self.recorder.redact else value
+
+    def usage(self, usage: Optional[dict]):
+        """Record Bedrock token usage (`response['usage']` or a converse_stream metadata event)."""
+        for key, name in (("inputTokens", "input_tokens"), ("outputTokens", "output_tokens")):
+            if usage and usage.get(key) is not None:
+                self.add(name, usage[key])
+
+
+class MetricsRecorder:
+    """Starts traces and writes them as EMF records to stdout, a local file, or nowhere."""
+
+    def __init__(self, namespace: str, service: str, sink: str = "stdout", path: str = "/tmp/metrics.jsonl",
+                 sample_rate: float = 1.0, redact: Iterable[str] = ()):
+        self.namespace = namespace
+        self.service = service
+        self.sink = sink
+        self.path = path
+        self.sample_rate = sample_rate
+        self.redact = set(redact)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def trace(self, **properties):
+        """Trace one request; `current()` returns it inside the block. The record is written on exit."""
+        trace = Trace(self, self.sink != "none" and random.random() < self.sample_rate)
+        for name, value in properties.items():
+            trace.set(name, value)
+        token = _current.set(trace)
+        try:
+            yield trace
+        except Exception as e:
+            trace.set("error", type(e).__name__)
+            raise
+        finally:
+            _current.reset(token)
+            trace.add("total_ms", (time.perf_counter() - trace.start) * 1000)
+            self.emit(trace)
+
+    def record(self, trace: Trace) -> dict:
+        metrics = {name: round(value, 1) if name.endswith("_ms") else value for name, value in trace.values.items()}
+        return {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": self.namespace,
+                    "Dimensions": [["Service"]],
+                    "Metrics": [{"Name": name, "Unit": "Milliseconds" if name.endswith("_ms") else "Count"}
+                                for name in metrics],
+                }],
+            },
+            "Service": self.service,
+            **trace.properties,
+            **metrics,
+        }
+
+    def emit(self, trace: Trace):
+        if self.sink == "none" or not (trace.sampled or "error" in trace.properties):
+            return
+        line = json.dumps(self.record(trace), separators=(",", ":"), default=str)
+        if self.sink == "file":
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        else:
+            print(line, flush=True)
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    """Time a stage of the current request; a no-op outside a trace."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(name):
+        yield
+
+
+def add(name: str, value: float):
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, value)
+
+
+def set_property(name: str, value):
+    trace = _current.get()
+    if trace is not None:
+        trace.set(name, value)
+
+
+def usage(usage: Optional[dict]):
+    trace = _current.get()
+    if trace is not None:
+        trace.usage(usage)
+
+
+def open_recorder(namespace: str, service: str) -> MetricsRecorder:
+    """Recorder configured from METRICS_SINK, METRICS_PATH, METRICS_SAMPLE_RATE and METRICS_REDACT."""
+    return MetricsRecorder(
+        namespace,
+        service,
+        sink=os.getenv("METRICS_SINK", "stdout"),
+        path=os.getenv("METRICS_PATH", "/tmp/metrics.jsonl"),
+        sample_rate=float(os.getenv("METRICS_SAMPLE_RATE", "1.0")),
+        redact=[k.strip() for k in os.getenv("METRICS_REDACT", "query,message,prompt,answer").split(",") if k.strip()],
+    )
@@ -0,0 +1,165 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import boto3
+from botocore.config import Config
+
+# Process-wide AWS and Pinecone clients, cached secrets and the API Gateway event helpers
+# shared by the Lambda handlers. A warm Lambda instance keeps its module state between
+# invocations, so a client created here keeps its connection pool (and its TLS sessions)
+# for the life of the instance, and a secret is read from Secrets Manager once per
+# SECRET_CACHE_TTL_SECONDS instead of on every invocation.
+#
+# Clients get TCP keep-alive, a connection pool sized for the handlers' thread pools and
+# adaptive retries (client-side rate limiting on throttling). Callers pass botocore Config
+# options to override them, e.g. the ingest embedder does its own retries.
+
+CLIENT_MAX_POOL_CONNECTIONS = int(os.getenv("CLIENT_MAX_POOL_CONNECTIONS", "32"))
+CLIENT_MAX_ATTEMPTS = int(os.getenv("CLIENT_MAX_ATTEMPTS", "4"))
+CLIENT_CONNECT_TIMEOUT = float(os.getenv("CLIENT_CONNECT_TIMEOUT", "5"))
+SECRET_CACHE_TTL_SECONDS = float(os.getenv("SECRET_CACHE_TTL_SECONDS", "900"))
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'POST,OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type'
+}
+
+_clients = {}
+_locks = {}
+_lock = threading.Lock()
+_session_lock = threading.Lock()  # Creating clients on boto3's default session is not thread-safe
+
+
+def client_config(**overrides) -> Config:
+    options = {
+        "tcp_keepalive": True,
+        "max_pool_connections": CLIENT_MAX_POOL_CONNECTIONS,
+        "connect_timeout": CLIENT_CONNECT_TIMEOUT,
+        "retries": {"max_attempts": CLIENT_MAX_ATTEMPTS, "mode": "adaptive"},
+    }
+    options.update(overrides)
+    return Config(**options)
+
+
+def _shared(key: tuple, create):
+    # One lock per client, so a slow creation (a Pinecone index resolving its host) blocks no other client
+    found = _clients.get(key)
+    if found is None:
+        with _lock:
+            lock = _locks.setdefault(key, threading.Lock())
+        with lock:
+            found = _clients.get(key)
+            if found is None:
+                found = _clients[key] = create()
+    return found
+
+
+def _boto3(factory, service: str, **kwargs):
+    with _session_lock:
+        return factory(service, **kwargs)
+
+
+def client(service: str, region_name: Optional[str] = None, endpoint_url: Optional[str] = None, **config):
+    """The instance's boto3 client for a service, region and endpoint; `config` overrides client_config()."""
+    key = ("client", service, region_name, endpoint_url, json.dumps(config, sort_keys=True))
+    return _shared(key, lambda: _boto3(boto3.client, service, region_name=region_name, endpoint_url=endpoint_url,
+                                       config=client_config(**config)))
+
+
+def resource(service: str, region_name: Optional[str] = None, **config):
+    """The instance's boto3 resource (e.g. DynamoDB tables), configured like client()."""
+    key = ("resource", service, region_name, json.dumps(config, sort_keys=True))
+    return _shared(key, lambda: _boto3(boto3.resource, service, region_name=region_name,
+                                       config=client_config(**config)))
+
+
+def pinecone_client(api_key: str):
+    """The instance's Pinecone client for an API key (a rotated key gets a new client)."""
+    def create():
+        from pinecone import Pinecone
+        return Pinecone(api_key=api_key)
+    return _shared(("pinecone", api_key), create)
+
+
+def pinecone_index(api_key: str, name: Optional[str] = None, host: Optional[str] = None, **kwargs):
+    """The instance's handle on a Pinecone index. `kwargs` go to `Pinecone.Index` (pool_threads, ...)."""
+    key = ("pinecone-index", api_key, name, host, json.dumps(kwargs, sort_keys=True))
+    if host:
+        return _shared(key, lambda: pinecone_client(api_key).Index(host=host, **kwargs))
+    return _shared(key, lambda: pinecone_client(api_key).Index(name, **kwargs))
+
+
+class SecretCache:
+    """Secrets Manager values kept for `ttl` seconds. A failed refresh keeps serving the last value."""
+
+    def __init__(self, ttl: float = SECRET_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, secret_id: str):
+        resp = client("secretsmanager").get_secret_value(SecretId=secret_id)
+        secret = resp.get("SecretString") or resp["SecretBinary"]
+        if isinstance(secret, (bytes, bytearray)):
+            secret = secret.decode()
+        return json.loads(secret) if secret.startswith("{") else secret
+
+    def get(self, secret_id: str):
+        cached = self._values.get(secret_id)
+        if cached is not None and time.monotonic() < cached[1]:
+            return cached[0]
+        with self._lock:
+            cached = self._values.get(secret_id)
+            if cached is not None and time.monotonic() < cached[1]:
+                return cached[0]
+            try:
+                value = self._fetch(secret_id)
+            except Exception:
+                if cached is None:
+                    raise
+                logger.warning("Secret refresh failed, using the cached value", exc_info=True)
+                value = cached[0]
+            self._values[secret_id] = (value, time.monotonic() + self.ttl)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+secrets = SecretCache()
+
+
+def get_secret(secret_id: str):
+    """A secret's value (JSON secrets are parsed), cached for SECRET_CACHE_TTL_SECONDS."""
+    return secrets.get(secret_id)
+
+
+# Standard response structure for API Gateway
+def response(status: int, message=None):
+    return {'statusCode': status, 'body': json.dumps({'message': message}), 'headers': dict(HEADERS)}
+
+
+def parse_event(event):
+    """The JSON request body of an API Gateway (HTTP or WebSocket) event, or None if it has none or is invalid."""
+    body = event.get('body')
+    if not body:
+        return None
+    if isinstance(body, dict):
+        # Direct invocations (tests, the console) may pass the body already parsed
+        return body
+    try:
+        # json.loads takes the decoded bytes as they are; no intermediate str for base64 bodies
+        return json.loads(base64.b64decode(body) if event.get('isBase64Encoded') else body)
+    except (ValueError, TypeError):
+        logger.error("Invalid JSON in request body")
+        return None
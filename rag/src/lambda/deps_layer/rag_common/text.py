@@ -0,0 +1,51 @@
+import re
+from typing import List, Tuple
+
+# Text helpers shared by the ingest chunker and the search Lambda's context builder, so
+# chunks are cut and prompts are budgeted with the same token estimate.
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+")
+CHUNK_SEPARATOR = "#chunk_"  # Chunk vector ids are `doc_id#chunk_n`
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+def split_long_sentence(sentence: str, max_tokens: int) -> List[str]:
+    """Cut a sentence over `max_tokens` on word boundaries (and very long words on characters)."""
+    max_chars = max_tokens * 4
+    parts = [w[i:i + max_chars] for w in sentence.split() for i in range(0, len(w), max_chars)]
+    pieces, current, chars = [], [], 0
+    for word in parts:
+        if current and chars + 1 + len(word) > max_chars:
+            pieces.append(" ".join(current))
+            current, chars = [], 0
+        chars += len(word) + (1 if current else 0)
+        current.append(word)
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def words(text: str) -> List[str]:
+    """Case-folded word tokens."""
+    return _WORD.findall(text.casefold())
+
+
+def chunk_ids(doc_id: str, chunks: int) -> List[str]:
+    return [f"{doc_id}{CHUNK_SEPARATOR}{n}" for n in range(chunks)]
+
+
+def parse_chunk_id(vector_id: str) -> Tuple[str, int]:
+    """(parent document id, chunk number) of a chunk vector id; (id, 0) for an unchunked id."""
+    parent, sep, n = vector_id.rpartition(CHUNK_SEPARATOR)
+    if sep and n.isdigit():
+        return parent, int(n)
+    return vector_id, 0
@@ -0,0 +1,220 @@
+import bisect
+import json
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import quote
+
+# Title index for the search fast path. Most /rag queries are just a movie title, so the
+# ingest Lambda records every document's title, id and chunk count, and the search Lambda
+# resolves exact, prefix and near-exact (trigram) title matches straight to document ids
+# without embedding the query or querying the vector store.
+#
+# The ingest Lambda writes one shard per partition (or one per run) under `prefix/` and
+# deletes shards an earlier run left behind; the search Lambda merges the shards, or loads
+# a single file packaged with its code.
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_title(text: str) -> str:
+    """Case-fold, strip accents and punctuation, collapse whitespace."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_PUNCTUATION.sub(" ", text.casefold()).split())
+
+
+def trigrams(norm: str) -> set:
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def encode_entries(entries: List[list]) -> bytes:
+    return zlib.compress(json.dumps({"version": 1, "titles": entries}, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_entries(blob: bytes) -> List[list]:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))["titles"]
+
+
+class TitleIndex:
+    """Lookup from normalized title to documents: `[namespace, doc_id, chunks, title]` entries."""
+
+    def __init__(self, entries: Iterable[list], min_prefix: int = 4, min_prefix_share: float = 0.5,
+                 min_similarity: float = 0.6, max_docs: int = 3):
+        self.min_prefix = min_prefix
+        self.min_prefix_share = min_prefix_share
+        self.min_similarity = min_similarity
+        self.max_docs = max_docs
+        self.titles: Dict[str, List[tuple]] = {}
+        for namespace, doc_id, chunks, title in entries:
+            norm = normalize_title(title)
+            if not norm:
+                continue
+            docs = self.titles.setdefault(norm, [])
+            if not any(d[0] == namespace and d[1] == doc_id for d in docs):
+                docs.append((namespace, str(doc_id), int(chunks), title))
+        self.sorted = sorted(self.titles)
+        self._postings = None  # Trigram postings, built on the first fuzzy lookup
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _trigram_postings(self) -> Dict[str, List[int]]:
+        with self._lock:
+            if self._postings is None:
+                postings: Dict[str, List[int]] = {}
+                for n, norm in enumerate(self.sorted):
+                    for t in trigrams(norm):
+                        postings.setdefault(t, []).append(n)
+                self._postings = postings
+        return self._postings
+
+    def _hit(self, norm: str, kind: str, score: float) -> dict:
+        return {"title": norm, "kind": kind, "score": score, "docs": self.titles[norm][:self.max_docs]}
+
+    def lookup(self, query: str) -> Optional[dict]:
+        """Resolve a query to the documents of one title, or None when it is not clearly a title.
+
+        Tries an exact match, then a prefix that only one title starts with and that covers
+        at least `min_prefix_share` of it, then the closest title by trigram Jaccard
+        similarity (at least `min_similarity`). A prefix of several titles is ambiguous and
+        resolves to nothing.
+        """
+        norm = normalize_title(query)
+        if not norm:
+            return None
+        if norm in self.titles:
+            return self._hit(norm, "exact", 1.0)
+
+        if len(norm) >= self.min_prefix:
+            i = bisect.bisect_left(self.sorted, norm)
+            if i < len(self.sorted) and self.sorted[i].startswith(norm):
+                unique = i + 1 == len(self.sorted) or not self.sorted[i + 1].startswith(norm)
+                if not unique:
+                    # Several titles start with the query; a fuzzy match would just pick one of them
+                    return None
+                share = len(norm) / len(self.sorted[i])
+                # A short query such as "data" is a unique prefix by chance, not a title
+                if share >= self.min_prefix_share:
+                    return self._hit(self.sorted[i], "prefix", round(share, 3))
+
+        grams = trigrams(norm)
+        postings = self._trigram_postings()
+        shared: Dict[int, int] = {}
+        for t in grams:
+            for n in postings.get(t, ()):
+                shared[n] = shared.get(n, 0) + 1
+        best, best_score = None, 0.0
+        for n, count in shared.items():
+            candidate = self.sorted[n]
+            # |A| + |B| - shared, with |B| from the padded length (one trigram per character, plus two)
+            score = count / (len(grams) + len(candidate) + 1 - count)
+            if score > best_score:
+                best, best_score = candidate, score
+        if best is not None and best_score >= self.min_similarity:
+            return self._hit(best, "fuzzy", round(best_score, 3))
+        return None
+
+
+class TitleIndexWriter:
+    """Collects titles during ingest and writes them as index shards (S3 or a local directory)."""
+
+    def __init__(self, namespaces: Iterable[str], s3=None, bucket: Optional[str] = None, prefix: str = "titles",
+                 path: Optional[str] = None):
+        self.namespaces = set(namespaces)
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.path = path
+        self._entries: List[list] = []
+        self._lock = threading.Lock()
+
+    def add(self, namespace: str, chunks: List[dict]):
+        """Record the parent documents of a batch of chunks (see pinecone_ingest/chunker.py)."""
+        if namespace not in self.namespaces:
+            return
+        docs: Dict[str, list] = {}
+        for c in chunks:
+            parent = str(c.get("parent_id") or c.get("id"))
+            if parent not in docs:
+                docs[parent] = [namespace, parent, 0, c.get("title") or ""]
+            docs[parent][2] += 1
+        with self._lock:
+            self._entries.extend(d for d in docs.values() if d[3])
+
+    def _shard_name(self, shard: str) -> str:
+        return f"{quote(shard, safe='')}.json.z"
+
+    def clear(self, keep: Iterable[str] = ()) -> int:
+        """Delete the shards under the prefix other than those named in `keep`; returns how many."""
+        keep = {self._shard_name(shard) for shard in keep}
+        if self.s3 is None:
+            if not self.path or not os.path.isdir(self.path):
+                return 0
+            stale = [name for name in os.listdir(self.path) if name.endswith(".json.z") and name not in keep]
+            for name in stale:
+                os.remove(os.path.join(self.path, name))
+            return len(stale)
+
+        stale = []
+        for page in self.s3.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=self.prefix + "/"):
+            stale.extend(o["Key"] for o in page.get("Contents", [])
+                         if o["Key"].endswith(".json.z") and o["Key"].rsplit("/", 1)[-1] not in keep)
+        for i in range(0, len(stale), 1000):  # delete_objects takes at most 1000 keys
+            self.s3.delete_objects(Bucket=self.bucket,
+                                   Delete={"Objects": [{"Key": key} for key in stale[i:i + 1000]], "Quiet": True})
+        return len(stale)
+
+    def flush(self, shard: str) -> int:
+        with self._lock:
+            entries, self._entries = self._entries, []
+        if not entries:
+            return 0
+        blob = encode_entries(entries)
+        name = self._shard_name(shard)
+        if self.s3 is not None:
+            self.s3.put_object(Bucket=self.bucket, Key=f"{self.prefix}/{name}", Body=blob)
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, name), "wb") as f:
+                f.write(blob)
+        return len(entries)
+
+
+def load_title_shards(s3=None, bucket: Optional[str] = None, prefix: str = "titles", path: Optional[str] = None,
+                      max_workers: int = 8) -> List[list]:
+    """Read every shard written by TitleIndexWriter, from S3 or a local directory."""
+    if s3 is None:
+        if not path or not os.path.isdir(path):
+            return []
+        entries = []
+        for name in sorted(os.listdir(path)):
+            if name.endswith(".json.z"):
+                with open(os.path.join(path, name), "rb") as f:
+                    entries.extend(decode_entries(f.read()))
+        return entries
+
+    keys = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix.strip("/") + "/"):
+        keys.extend(o["Key"] for o in page.get("Contents", []) if o["Key"].endswith(".json.z"))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        blobs = pool.map(lambda key: s3.get_object(Bucket=bucket, Key=key)["Body"].read(), keys)
+        return [e for blob in blobs for e in decode_entries(blob)]
+
+
+def open_title_writer(backend: str, namespaces: Iterable[str], path: str = "/tmp/titles", s3=None,
+                      bucket: Optional[str] = None, prefix: str = "titles"):
+    """Build the title index writer for the configured backend ("s3", "local" or "none")."""
+    if backend == "s3":
+        if not bucket:
+            raise ValueError("The s3 title index needs a bucket")
+        return TitleIndexWriter(namespaces, s3=s3, bucket=bucket, prefix=prefix)
+    if backend == "local":
+        return TitleIndexWriter(namespaces, path=path)
+    return None
@@ -0,0 +1,425 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import quote
+
+import numpy as np
+
+# Vector stores used by the ingest and search Lambdas. Both backends expose the part of
+# `pinecone.Index` the Lambdas call, with the same argument names and result shapes:
+#
+#   upsert(vectors=[{"id", "values", "metadata"}], namespace="")
+#   query(vector=, top_k=, namespace="", include_metadata=False, include_values=False) -> .matches
+#   fetch(ids=[...], namespace="") -> .vectors {id: (id, values, metadata)}
+#   delete(ids=[...], namespace="")
+#
+# PineconeVectorStore wraps a Pinecone index. LocalVectorStore keeps each namespace as a
+# memory-mapped float32 or float16 matrix on disk with metadata in SQLite, and searches it
+# in-process, either exactly or through an IVF (inverted file) index of k-means clusters.
+#
+# The search Lambda's asyncio pipeline reads through the async adapters at the end of this
+# file: `query` and `fetch` as coroutines, on Pinecone's aiohttp client or on a thread.
+
+SEARCH_BLOCK_ROWS = 65536  # Rows scored per step of an exact scan, bounds the float32 working copy
+
+
+class PineconeVectorStore:
+    """The Pinecone backend: a thin pass-through to a `pinecone.Index`."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def upsert(self, vectors, namespace: str = "", **kwargs):
+        return self.index.upsert(vectors=vectors, namespace=namespace, **kwargs)
+
+    def query(self, vector, top_k: int, namespace: str = "", include_metadata: bool = False,
+              include_values: bool = False, **kwargs):
+        return self.index.query(vector=vector, top_k=top_k, namespace=namespace, include_metadata=include_metadata,
+                                include_values=include_values, **kwargs)
+
+    def fetch(self, ids, namespace: str = "", **kwargs):
+        return self.index.fetch(ids=list(ids), namespace=namespace, **kwargs)
+
+    def delete(self, ids, namespace: str = "", **kwargs):
+        return self.index.delete(ids=list(ids), namespace=namespace, **kwargs)
+
+    def build_index(self, namespace: Optional[str] = None):
+        pass  # Pinecone maintains its own index
+
+    def close(self):
+        pass
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def kmeans(sample: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on unit rows; returns unit centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=clusters)
+        empty = counts == 0
+        # An empty cluster is reseeded from a random sample row
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _unit_rows(sums)
+    return centroids
+
+
+class _Namespace:
+    """One namespace of a LocalVectorStore: its memory-mapped matrix, row ids and IVF index.
+
+    Deleted vectors leave their row behind with a None id; searches skip those rows.
+    """
+
+    def __init__(self, path: str, dims: int, dtype, count: int, capacity: int, ids: List[Optional[str]],
+                 read_only: bool):
+        self.path = path
+        self.dims = dims
+        self.dtype = dtype
+        self.count = count
+        self.capacity = capacity
+        self.ids = ids
+        self.dead = np.asarray([r for r, i in enumerate(ids) if i is None], dtype=np.int64)
+        self.read_only = read_only
+        self.matrix = self._map()
+        self.ivf = self._load_ivf()
+
+    def _map(self):
+        if self.capacity == 0:
+            return np.zeros((0, self.dims), dtype=self.dtype)
+        return np.memmap(self.path, dtype=self.dtype, mode="r" if self.read_only else "r+",
+                         shape=(self.capacity, self.dims))
+
+    def grow(self, needed: int):
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2, 1024)
+        if isinstance(self.matrix, np.memmap):
+            self.matrix.flush()
+        with open(self.path, "ab") as f:
+            f.truncate(capacity * self.dims * np.dtype(self.dtype).itemsize)
+        self.capacity = capacity
+        self.matrix = self._map()
+
+    def _load_ivf(self):
+        path = self.path + ".ivf.npz"
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return {k: data[k] for k in data.files}
+
+    def scores(self, rows, q: np.ndarray) -> np.ndarray:
+        scores = np.asarray(self.matrix[rows], dtype=np.float32) @ q
+        if self.dead.size:
+            scores[np.isin(rows, self.dead)] = -np.inf
+        return scores
+
+    def delete_rows(self, rows: List[int]):
+        for r in rows:
+            self.ids[r] = None
+        self.dead = np.union1d(self.dead, np.asarray(rows, dtype=np.int64))
+
+    def search_exact(self, q: np.ndarray, k: int, start: int = 0):
+        best_rows, best_scores = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        for lo in range(start, self.count, SEARCH_BLOCK_ROWS):
+            hi = min(lo + SEARCH_BLOCK_ROWS, self.count)
+            scores = np.asarray(self.matrix[lo:hi], dtype=np.float32) @ q
+            if self.dead.size:
+                dead = self.dead[(self.dead >= lo) & (self.dead < hi)]
+                scores[dead - lo] = -np.inf
+            top = _top_k(scores, k)
+            best_rows = np.concatenate([best_rows, top + lo])
+            best_scores = np.concatenate([best_scores, scores[top]])
+        top = _top_k(best_scores, k)
+        return best_rows[top], best_scores[top]
+
+    def search_ivf(self, q: np.ndarray, k: int, nprobe: int):
+        ivf = self.ivf
+        probe = _top_k(ivf["centroids"] @ q, min(nprobe, len(ivf["centroids"])))
+        offsets, order = ivf["offsets"], ivf["order"]
+        rows = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probe])
+        rows.sort()  # Sequential reads from the memory map
+        scores = self.scores(rows, q)
+        # Rows added after the index was built are not in any list yet, so they are scanned exactly
+        built = int(ivf["rows"])
+        if built < self.count:
+            extra_rows, extra_scores = self.search_exact(q, k, start=built)
+            rows, scores = np.concatenate([rows, extra_rows]), np.concatenate([scores, extra_scores])
+        top = _top_k(scores, k)
+        return rows[top], scores[top]
+
+    def build_ivf(self, clusters: int = 0, iterations: int = 10, sample_size: int = 65536, seed: int = 0):
+        n = self.count
+        clusters = clusters or int(np.clip(np.sqrt(n), 1, 4096))
+        clusters = min(clusters, n)
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(n, min(n, max(sample_size, clusters)), replace=False))
+        centroids = kmeans(_unit_rows(np.asarray(self.matrix[sample_rows], dtype=np.float32)), clusters, iterations, seed)
+        assign = np.empty(n, dtype=np.int32)
+        for lo in range(0, n, SEARCH_BLOCK_ROWS):
+            hi = min(lo + SEARCH_BLOCK_ROWS, n)
+            assign[lo:hi] = np.argmax(np.asarray(self.matrix[lo:hi], dtype=np.float32) @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=clusters))]).astype(np.int64)
+        self.ivf = {"centroids": centroids.astype(np.float32), "order": order, "offsets": offsets, "rows": np.int64(n)}
+        with open(self.path + ".ivf.npz", "wb") as f:
+            np.savez(f, **self.ivf)
+
+
+class LocalVectorStore:
+    """In-process vector store on local disk (`path` is a directory).
+
+    Vectors are stored unit-normalized, so scores are cosine similarity like the
+    Pinecone index. `search` is "exact" (full scan) or "ivf": a namespace with an
+    IVF index is searched by probing its `nprobe` closest clusters. build_index()
+    (re)builds the IVF index of namespaces with at least `ivf_min_rows` vectors;
+    vectors added since the last build are still found, by an exact scan of them.
+    """
+
+    def __init__(self, path: str, dims: int = 1024, dtype: str = "float32", search: str = "exact",
+                 nprobe: int = 8, ivf_min_rows: int = 20000, read_only: bool = False):
+        if dtype not in ("float32", "float16"):
+            raise ValueError("dtype must be float32 or float16")
+        self.path = path
+        self.dims = dims
+        self.dtype = np.dtype(dtype)
+        self.search = search
+        self.nprobe = nprobe
+        self.ivf_min_rows = ivf_min_rows
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        self._namespaces: Dict[str, _Namespace] = {}
+        db = os.path.join(path, "store.sqlite")
+        if read_only:
+            # Works from a read-only file system, e.g. a store packaged with the Lambda code
+            self._conn = sqlite3.connect(f"file:{db}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._conn = sqlite3.connect(db, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS namespaces (namespace TEXT PRIMARY KEY, count INTEGER NOT NULL, "
+                               "capacity INTEGER NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (namespace TEXT NOT NULL, id TEXT NOT NULL, "
+                               "row INTEGER NOT NULL, metadata TEXT, PRIMARY KEY (namespace, id))")
+            self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS vectors_row ON vectors (namespace, row)")
+            self._conn.executemany("INSERT OR IGNORE INTO info (key, value) VALUES (?, ?)",
+                                   [("dims", str(dims)), ("dtype", self.dtype.name)])
+            self._conn.commit()
+        info = dict(self._conn.execute("SELECT key, value FROM info").fetchall())
+        if (int(info["dims"]), info["dtype"]) != (dims, self.dtype.name):
+            raise ValueError(f"Store at {path} holds {info['dims']}-dim {info['dtype']} vectors, "
+                             f"not {dims}-dim {self.dtype.name}")
+
+    def _namespace(self, namespace: str, create: bool = False) -> Optional[_Namespace]:
+        namespace = namespace or ""
+        ns = self._namespaces.get(namespace)
+        if ns is not None:
+            return ns
+        row = self._conn.execute("SELECT count, capacity FROM namespaces WHERE namespace = ?", (namespace,)).fetchone()
+        if row is None and not create:
+            return None
+        count, capacity = row or (0, 0)
+        ids = [None] * count
+        for vector_id, r in self._conn.execute("SELECT id, row FROM vectors WHERE namespace = ?", (namespace,)):
+            ids[r] = vector_id
+        path = os.path.join(self.path, f"{quote(namespace or '_default', safe='')}.vec")
+        ns = self._namespaces[namespace] = _Namespace(path, self.dims, self.dtype, count, capacity, ids, self.read_only)
+        return ns
+
+    def upsert(self, vectors, namespace: str = "", **kwargs):
+        if self.read_only:
+            raise RuntimeError("Vector store is read-only")
+        if not vectors:
+            return SimpleNamespace(upserted_count=0)
+        namespace = namespace or ""
+        with self._lock:
+            ns = self._namespace(namespace, create=True)
+            # Last write wins for ids repeated inside one batch
+            batch = {v["id"]: v for v in vectors}
+            ids = list(batch)
+            existing = self._rows(namespace, ids)
+            new_ids = [i for i in ids if i not in existing]
+            rows = dict(existing)
+            rows.update({i: ns.count + n for n, i in enumerate(new_ids)})
+            ns.grow(ns.count + len(new_ids))
+            values = _unit_rows(np.asarray([batch[i]["values"] for i in ids], dtype=np.float32))
+            target = np.asarray([rows[i] for i in ids], dtype=np.int64)
+            ns.matrix[target] = values.astype(self.dtype)
+            ns.ids.extend(new_ids)
+            ns.count += len(new_ids)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (namespace, id, row, metadata) VALUES (?, ?, ?, ?)",
+                [(namespace, i, rows[i], json.dumps(batch[i].get("metadata") or {}, separators=(",", ":")))
+                 for i in ids])
+            self._conn.execute("INSERT OR REPLACE INTO namespaces (namespace, count, capacity) VALUES (?, ?, ?)",
+                               (namespace, ns.count, ns.capacity))
+            self._conn.commit()
+        return SimpleNamespace(upserted_count=len(ids))
+
+    def _select(self, column: str, namespace: str, ids: List[str]) -> list:
+        # Chunked to stay under SQLite's limit on bound parameters
+        rows = []
+        for lo in range(0, len(ids), 500):
+            part = ids[lo:lo + 500]
+            rows.extend(self._conn.execute(
+                f"SELECT id, {column} FROM vectors WHERE namespace = ? AND id IN ({','.join('?' * len(part))})",
+                [namespace or "", *part]).fetchall())
+        return rows
+
+    def _rows(self, namespace: str, ids: List[str]) -> Dict[str, int]:
+        return dict(self._select("row", namespace, ids))
+
+    def _metadata(self, namespace: str, ids: List[str]) -> Dict[str, dict]:
+        return {i: json.loads(md) if md else {} for i, md in self._select("metadata", namespace, ids)}
+
+    def query(self, vector, top_k: int, namespace: str = "", include_metadata: bool = False,
+              include_values: bool = False, **kwargs):
+        q = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        q = q / norm if norm else q
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None or ns.count == 0 or top_k <= 0:
+                return SimpleNamespace(matches=[], namespace=namespace or "")
+            if self.search == "ivf" and ns.ivf is not None:
+                rows, scores = ns.search_ivf(q, top_k, self.nprobe)
+            else:
+                rows, scores = ns.search_exact(q, top_k)
+            # Fewer than top_k live vectors leave deleted rows (scored -inf) at the end
+            keep = np.isfinite(scores)
+            rows, scores = rows[keep], scores[keep]
+            ids = [ns.ids[r] for r in rows]
+            metadata = self._metadata(namespace, ids) if include_metadata else {}
+            values = np.asarray(ns.matrix[rows], dtype=np.float32).tolist() if include_values else [[]] * len(ids)
+        matches = [SimpleNamespace(id=i, score=float(s), metadata=metadata.get(i) if include_metadata else None,
+                                   values=v) for i, s, v in zip(ids, scores, values)]
+        return SimpleNamespace(matches=matches, namespace=namespace or "")
+
+    def fetch(self, ids: Iterable[str], namespace: str = "", **kwargs):
+        ids = list(dict.fromkeys(ids))
+        with self._lock:
+            ns = self._namespace(namespace)
+            found = {}
+            if ns is not None and ids:
+                rows = self._rows(namespace, ids)
+                metadata = self._metadata(namespace, list(rows))
+                for i, r in rows.items():
+                    found[i] = SimpleNamespace(id=i, values=np.asarray(ns.matrix[r], dtype=np.float32).tolist(),
+                                               metadata=metadata.get(i, {}))
+        return SimpleNamespace(vectors=found, namespace=namespace or "")
+
+    def delete(self, ids: Iterable[str], namespace: str = "", **kwargs):
+        if self.read_only:
+            raise RuntimeError("Vector store is read-only")
+        ids = list(dict.fromkeys(ids))
+        namespace = namespace or ""
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None or not ids:
+                return {}
+            rows = self._rows(namespace, ids)
+            if rows:
+                ns.delete_rows(list(rows.values()))
+                self._conn.executemany("DELETE FROM vectors WHERE namespace = ? AND id = ?",
+                                       [(namespace, i) for i in rows])
+                self._conn.commit()
+        return {}
+
+    def build_index(self, namespace: Optional[str] = None, clusters: int = 0):
+        """Build the IVF index of one namespace, or of every namespace large enough to use it."""
+        if self.read_only:
+            raise RuntimeError("Vector store is read-only")
+        with self._lock:
+            names = [namespace or ""] if namespace is not None else \
+                [r[0] for r in self._conn.execute("SELECT namespace FROM namespaces")]
+            for name in names:
+                ns = self._namespace(name)
+                if ns is None or ns.count == 0:
+                    continue
+                # A namespace asked for by name is always indexed; otherwise only the large ones
+                if namespace is not None or ns.count >= self.ivf_min_rows:
+                    ns.build_ivf(clusters)
+
+    def describe_index_stats(self) -> dict:
+        rows = self._conn.execute("SELECT namespace, COUNT(*) FROM vectors GROUP BY namespace").fetchall()
+        return {"dimension": self.dims, "namespaces": {ns: {"vector_count": count} for ns, count in rows},
+                "total_vector_count": sum(count for _, count in rows)}
+
+    def close(self):
+        with self._lock:
+            for ns in self._namespaces.values():
+                if isinstance(ns.matrix, np.memmap) and not self.read_only:
+                    ns.matrix.flush()
+            self._namespaces.clear()
+            self._conn.close()
+
+
+def open_vector_store(backend: str, pinecone_index=None, path: str = "/tmp/vectors", dims: int = 1024,
+                      dtype: str = "float32", search: str = "exact", nprobe: int = 8, read_only: bool = False):
+    """Build the vector store for the configured backend ("pinecone" or "local")."""
+    if backend == "local":
+        return LocalVectorStore(path, dims=dims, dtype=dtype, search=search, nprobe=nprobe, read_only=read_only)
+    if backend == "pinecone":
+        if pinecone_index is None:
+            raise ValueError("The pinecone vector store needs an index")
+        return PineconeVectorStore(pinecone_index)
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+
+class AsyncPineconeVectorStore:
+    """Async reads from a `pinecone.IndexAsyncio`; its aiohttp session is reused across requests.
+
+    `client`, the `PineconeAsyncio` the index came from, is closed along with it.
+    """
+
+    def __init__(self, index, client=None):
+        self.index = index
+        self.client = client
+
+    async def query(self, vector, top_k: int, namespace: str = "", include_metadata: bool = False,
+                    include_values: bool = False, **kwargs):
+        return await self.index.query(vector=vector, top_k=top_k, namespace=namespace,
+                                      include_metadata=include_metadata, include_values=include_values, **kwargs)
+
+    async def fetch(self, ids, namespace: str = "", **kwargs):
+        return await self.index.fetch(ids=list(ids), namespace=namespace, **kwargs)
+
+    async def close(self):
+        await self.index.close()
+        if self.client is not None:
+            await self.client.close()
+
+
+class ThreadedAsyncVectorStore:
+    """Async reads from any blocking store, run on the event loop's default executor."""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def query(self, vector, top_k: int, namespace: str = "", **kwargs):
+        return await asyncio.to_thread(self.store.query, vector=vector, top_k=top_k, namespace=namespace, **kwargs)
+
+    async def fetch(self, ids, namespace: str = "", **kwargs):
+        return await asyncio.to_thread(self.store.fetch, list(ids), namespace=namespace, **kwargs)
+
+    async def close(self):
+        pass
@@ -0,0 +1,302 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+# Checkpointed ingest: each S3 JSONL object is split into byte-range partitions and
+# progress is tracked per partition in a manifest. Workers (Lambda invocations or
+# local processes) claim partitions with a lease, so several can run at once and a
+# partition left behind by a failed or timed-out worker is picked up again once its
+# lease expires. Attempts are counted when a partition is claimed, so one that keeps
+# timing out is given up on at its next claim rather than retried forever.
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"  # Gave up after max attempts; needs a look before re-running
+
+
+def _gave_up(attempts: int) -> str:
+    return f"Gave up after {attempts} attempts; the last one did not finish (timed out or crashed)"
+
+
+def plan_partitions(s3, bucket_name: str, file_name: str, partition_bytes: int) -> dict:
+    """Describe an S3 object as a job of fixed-size byte ranges.
+
+    Ranges do not need to fall on line boundaries: a partition owns every line
+    that starts inside it (see iter_partition_lines).
+    """
+    head = s3.head_object(Bucket=bucket_name, Key=file_name)
+    size = head["ContentLength"]
+    etag = head["ETag"].strip('"')
+    partition_bytes = max(1, partition_bytes)
+    partitions = [
+        {"part": n, "start": start, "end": min(start + partition_bytes, size)}
+        for n, start in enumerate(range(0, size, partition_bytes))
+    ]
+    # The ETag is part of the job id, so a changed file gets a fresh plan
+    return {"job": f"{bucket_name}/{file_name}@{etag}", "bucket": bucket_name, "key": file_name,
+            "etag": etag, "partitions": partitions}
+
+
+def iter_partition_lines(s3, bucket_name: str, file_name: str, start: int, end: int, etag: Optional[str] = None,
+                         chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """Stream the lines that start in [start, end) of an S3 object.
+
+    Reading begins one byte early so a line starting exactly at `start` is kept
+    and a line straddling `start` is left to the previous partition. The last
+    line is read past `end` until its newline.
+    """
+    if start >= end:
+        return
+    range_start = max(0, start - 1)
+    kwargs = {"Bucket": bucket_name, "Key": file_name, "Range": f"bytes={range_start}-"}
+    if etag:
+        kwargs["IfMatch"] = etag
+    body = s3.get_object(**kwargs)["Body"]
+    pos = range_start
+    skip_partial = start > 0
+    pending = b""
+    try:
+        for chunk in body.iter_chunks(chunk_size):
+            pending += chunk
+            lines = pending.split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                line_start = pos
+                pos += len(line) + 1
+                if skip_partial:
+                    skip_partial = False
+                    continue
+                if line_start >= end:
+                    return
+                if line.strip():
+                    yield line
+        if pending and not skip_partial and pos < end and pending.strip():
+            yield pending
+    finally:
+        body.close()
+
+
+class SQLiteManifest:
+    """Partition manifest in a local SQLite file, shared by local worker processes."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS partitions (job TEXT NOT NULL, part INTEGER NOT NULL, bucket TEXT, key TEXT, "
+            "etag TEXT, start INTEGER, end INTEGER, status TEXT NOT NULL, owner TEXT, lease_until REAL, "
+            "attempts INTEGER DEFAULT 0, records INTEGER, vectors INTEGER, error TEXT, PRIMARY KEY (job, part))"
+        )
+
+    def register(self, job: dict) -> str:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO partitions (job, part, bucket, key, etag, start, end, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(job["job"], p["part"], job["bucket"], job["key"], job["etag"], p["start"], p["end"], PENDING)
+                 for p in job["partitions"]],
+            )
+        return job["job"]
+
+    def claim(self, jobs: List[str], owner: str, lease_seconds: int, max_attempts: int = 3) -> Optional[dict]:
+        now = time.time()
+        marks = ",".join("?" * len(jobs))
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock so two processes cannot claim the same row
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute(
+                        f"SELECT job, part, bucket, key, etag, start, end, attempts + 1 FROM partitions WHERE job IN ({marks}) "
+                        "AND (status = ? OR (status = ? AND lease_until < ?)) ORDER BY job, part LIMIT 1",
+                        [*jobs, PENDING, RUNNING, now],
+                    ).fetchone()
+                    if not row or row[7] <= max_attempts:
+                        break
+                    # Every attempt so far was claimed and never finished
+                    self._conn.execute(
+                        "UPDATE partitions SET status = ?, owner = NULL, lease_until = NULL, error = ? WHERE job = ? AND part = ?",
+                        (FAILED, _gave_up(row[7] - 1), row[0], row[1]),
+                    )
+                if row:
+                    self._conn.execute(
+                        "UPDATE partitions SET status = ?, owner = ?, lease_until = ?, attempts = attempts + 1 "
+                        "WHERE job = ? AND part = ?",
+                        (RUNNING, owner, now + lease_seconds, row[0], row[1]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if not row:
+            return None
+        keys = ("job", "part", "bucket", "key", "etag", "start", "end", "attempts")
+        return dict(zip(keys, row), owner=owner)
+
+    def complete(self, partition: dict, records: int, vectors: int):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE partitions SET status = ?, records = ?, vectors = ?, error = NULL WHERE job = ? AND part = ? AND owner = ?",
+                (DONE, records, vectors, partition["job"], partition["part"], partition["owner"]),
+            )
+
+    def release(self, partition: dict, error: str, retry: bool = True):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE partitions SET status = ?, owner = NULL, lease_until = NULL, error = ? "
+                "WHERE job = ? AND part = ? AND owner = ?",
+                (PENDING if retry else FAILED, error[:1000], partition["job"], partition["part"], partition["owner"]),
+            )
+
+    def progress(self, jobs: List[str]) -> dict:
+        marks = ",".join("?" * len(jobs))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT status, COUNT(*) FROM partitions WHERE job IN ({marks}) GROUP BY status", jobs
+            ).fetchall()
+            leases = [r[0] for r in self._conn.execute(
+                f"SELECT lease_until FROM partitions WHERE job IN ({marks}) AND status = ?", [*jobs, RUNNING]
+            ).fetchall()]
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(rows))
+        return _with_leases(counts, leases)
+
+
+def _with_leases(counts: dict, leases: List[float]) -> dict:
+    # "expired": running partitions whose worker is gone and that can be claimed again;
+    # "next_expiry": when the earliest live lease runs out (None when there is none)
+    now = time.time()
+    live = [float(t) for t in leases if t is not None and float(t) >= now]
+    counts["expired"] = len(leases) - len(live)
+    counts["next_expiry"] = min(live) if live else None
+    return counts
+
+
+class DynamoManifest:
+    """Partition manifest in a DynamoDB table (partition key `job`, sort key `part`).
+
+    Claims use conditional updates, so concurrent Lambda invocations never take the same partition.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def register(self, job: dict) -> str:
+        # A marker item (part -1) records that the plan exists, so later invocations skip the writes
+        if "Item" in self.table.get_item(Key={"job": job["job"], "part": -1}, ConsistentRead=True):
+            return job["job"]
+        for p in job["partitions"]:
+            try:
+                self.table.put_item(
+                    Item={"job": job["job"], "part": p["part"], "bucket": job["bucket"], "key": job["key"],
+                          "etag": job["etag"], "start": p["start"], "end": p["end"], "status": PENDING, "attempts": 0},
+                    ConditionExpression=Attr("job").not_exists(),
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+        self.table.put_item(Item={"job": job["job"], "part": -1, "status": "plan", "partitions": len(job["partitions"])})
+        return job["job"]
+
+    def _open_partitions(self, job: str):
+        kwargs = {"KeyConditionExpression": Key("job").eq(job) & Key("part").gte(0),
+                  "FilterExpression": Attr("status").is_in([PENDING, RUNNING]), "ConsistentRead": True}
+        while True:
+            page = self.table.query(**kwargs)
+            yield from page.get("Items", [])
+            if "LastEvaluatedKey" not in page:
+                return
+            kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+    def claim(self, jobs: List[str], owner: str, lease_seconds: int, max_attempts: int = 3) -> Optional[dict]:
+        now = time.time()
+        for job in jobs:
+            for item in self._open_partitions(job):
+                if item["status"] == RUNNING and float(item.get("lease_until", 0)) >= now:
+                    continue
+                if int(item.get("attempts", 0)) >= max_attempts:
+                    self._give_up(job, item, now)
+                    continue
+                try:
+                    self.table.update_item(
+                        Key={"job": job, "part": item["part"]},
+                        UpdateExpression="SET #s = :running, #o = :owner, #l = :until ADD #a :one",
+                        ConditionExpression="#s = :pending OR (#s = :running AND #l < :now)",
+                        ExpressionAttributeNames={"#s": "status", "#o": "owner", "#l": "lease_until", "#a": "attempts"},
+                        ExpressionAttributeValues={":running": RUNNING, ":pending": PENDING, ":owner": owner,
+                                                   ":until": int(now + lease_seconds), ":now": int(now), ":one": 1},
+                    )
+                except ClientError as e:
+                    if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                        continue  # Another worker got there first
+                    raise
+                return {"job": job, "part": int(item["part"]), "bucket": item["bucket"], "key": item["key"],
+                        "etag": item["etag"], "start": int(item["start"]), "end": int(item["end"]), "owner": owner,
+                        "attempts": int(item.get("attempts", 0)) + 1}
+        return None
+
+    def _give_up(self, job: str, item: dict, now: float):
+        # Every attempt so far was claimed and never finished
+        try:
+            self.table.update_item(
+                Key={"job": job, "part": item["part"]},
+                UpdateExpression="SET #s = :failed, #e = :error REMOVE #o, #l",
+                ConditionExpression="#s = :pending OR (#s = :running AND #l < :now)",
+                ExpressionAttributeNames={"#s": "status", "#o": "owner", "#l": "lease_until", "#e": "error"},
+                ExpressionAttributeValues={":failed": FAILED, ":pending": PENDING, ":running": RUNNING,
+                                           ":now": int(now), ":error": _gave_up(int(item.get("attempts", 0)))},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+    def _finish(self, partition: dict, update: str, names: dict, values: dict):
+        try:
+            self.table.update_item(
+                Key={"job": partition["job"], "part": partition["part"]},
+                UpdateExpression=update,
+                ConditionExpression="#o = :owner",
+                ExpressionAttributeNames=dict(names, **{"#s": "status", "#o": "owner", "#e": "error"}),
+                ExpressionAttributeValues=dict(values, **{":owner": partition["owner"]}),
+            )
+        except ClientError as e:
+            # The lease expired and another worker took the partition over
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+    def complete(self, partition: dict, records: int, vectors: int):
+        self._finish(partition, "SET #s = :done, #r = :records, #v = :vectors REMOVE #e",
+                     {"#r": "records", "#v": "vectors"}, {":done": DONE, ":records": records, ":vectors": vectors})
+
+    def release(self, partition: dict, error: str, retry: bool = True):
+        self._finish(partition, "SET #s = :status, #e = :error REMOVE #l",
+                     {"#l": "lease_until"}, {":status": PENDING if retry else FAILED, ":error": error[:1000]})
+
+    def progress(self, jobs: List[str]) -> dict:
+        counts, leases = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}, []
+        for job in jobs:
+            for item in self._all_partitions(job):
+                counts[item["status"]] = counts.get(item["status"], 0) + 1
+                if item["status"] == RUNNING:
+                    leases.append(item.get("lease_until"))
+        return _with_leases(counts, leases)
+
+    def _all_partitions(self, job: str):
+        kwargs = {"KeyConditionExpression": Key("job").eq(job) & Key("part").gte(0), "ConsistentRead": True,
+                  "ProjectionExpression": "#s, #l", "ExpressionAttributeNames": {"#s": "status", "#l": "lease_until"}}
+        while True:
+            page = self.table.query(**kwargs)
+            yield from page.get("Items", [])
+            if "LastEvaluatedKey" not in page:
+                return
+            kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
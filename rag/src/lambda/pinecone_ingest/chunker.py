@@ -0,0 +1,78 @@
+from typing import Dict, List
+
+from rag_common.text import CHUNK_SEPARATOR, estimate_tokens, split_long_sentence, split_sentences
+
+# Splits long documents into sentence-aligned chunks under a token budget so each
+# Titan call stays short and retrieval returns the relevant passage, not the whole plot.
+
+
+def chunk_text(text: str, max_tokens: int = 512, overlap_tokens: int = 64) -> List[str]:
+    """Split text into chunks of whole sentences, each at most max_tokens.
+
+    Consecutive chunks share up to overlap_tokens worth of trailing sentences so
+    context that straddles a boundary is still retrievable.
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    sentences = []
+    for sentence in split_sentences(text):
+        if estimate_tokens(sentence) > max_tokens:
+            sentences.extend(split_long_sentence(sentence, max_tokens))
+        else:
+            sentences.append(sentence)
+
+    chunks, current, current_tokens = [], [], 0
+    for sentence in sentences:
+        tokens = estimate_tokens(sentence) + 1
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(" ".join(current))
+            # Carry trailing sentences into the next chunk as overlap
+            overlap, overlap_size = [], 0
+            for prev in reversed(current):
+                size = estimate_tokens(prev) + 1
+                if overlap_size + size > overlap_tokens or overlap_size + size + tokens > max_tokens:
+                    break
+                overlap.insert(0, prev)
+                overlap_size += size
+            current, current_tokens = overlap, overlap_size
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def chunk_records(records: List[dict], max_tokens: int = 512, overlap_tokens: int = 64) -> List[dict]:
+    """Expand each record into one record per chunk with id `doc_id#chunk_n`.
+
+    Chunk records keep the parent's other fields and add `parent_id`, `chunk` and
+    `chunks` (the document's chunk count) so search can collapse chunk hits back to
+    the source document and a later ingest can find chunks the document no longer has.
+    """
+    out = []
+    for record in records:
+        doc_id = str(record.get("id"))
+        pieces = chunk_text(record.get("text") or "", max_tokens, overlap_tokens)
+        for n, piece in enumerate(pieces):
+            chunk = dict(record)
+            chunk.update({"id": f"{doc_id}{CHUNK_SEPARATOR}{n}", "parent_id": doc_id, "chunk": n,
+                          "chunks": len(pieces), "text": piece})
+            out.append(chunk)
+        if not pieces and (record.get("title") or "").strip():
+            # Title-only records are still embedded as a single chunk
+            chunk = dict(record)
+            chunk.update({"id": f"{doc_id}{CHUNK_SEPARATOR}0", "parent_id": doc_id, "chunk": 0, "chunks": 1})
+            out.append(chunk)
+    return out
+
+
+def chunk_counts(records: List[dict], chunks: List[dict]) -> Dict[str, int]:
+    """Chunks per source document of a batch, 0 for a record that produced none."""
+    counts = {str(record.get("id")): 0 for record in records}
+    for chunk in chunks:
+        counts[chunk["parent_id"]] = chunk["chunks"]
+    return counts
@@ -0,0 +1,182 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+# Persistent cache of Titan embeddings so re-ingest only embeds new or changed text.
+# Entries are keyed by a hash of everything that changes the vector: model, dimension,
+# normalize flag and the exact text sent to Titan.
+
+
+def cache_key(model_id: str, dims: int, normalize: bool, text: str) -> str:
+    h = hashlib.sha256()
+    h.update(f"{model_id}\x1f{dims}\x1f{int(bool(normalize))}\x1f".encode("utf-8"))
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _pack(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class SQLiteEmbeddingCache:
+    """Embedding cache stored in a local SQLite file. Vectors are kept as float32 blobs."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # The pipeline embeds from a background thread, so the connection is shared behind a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Look up keys and mark the hits as used now."""
+        found: Dict[str, List[float]] = {}
+        if not keys:
+            return found
+        now = int(time.time())
+        with self._lock:
+            # Stay under SQLite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", chunk)
+                for key, blob in rows:
+                    found[key] = _unpack(blob)
+                if found:
+                    self._conn.execute(f"UPDATE embeddings SET last_used = ? WHERE key IN ({marks})", [now, *chunk])
+            self._conn.commit()
+            self._dirty = self._dirty or bool(found)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]):
+        if not items:
+            return
+        now = int(time.time())
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(k, _pack(v), now) for k, v in items.items()],
+            )
+            self._conn.commit()
+            self._dirty = True
+
+    def evict(self, max_age_seconds: Optional[int] = None, max_entries: Optional[int] = None) -> int:
+        """Drop entries not used within max_age_seconds, then the least recently used beyond max_entries."""
+        removed = 0
+        with self._lock:
+            if max_age_seconds:
+                cur = self._conn.execute("DELETE FROM embeddings WHERE last_used < ?", (int(time.time()) - max_age_seconds,))
+                removed += cur.rowcount
+            if max_entries:
+                cur = self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (max_entries,),
+                )
+                removed += cur.rowcount
+            self._conn.commit()
+            if removed:
+                self._dirty = True
+                self._conn.execute("VACUUM")
+        return removed
+
+    def summary(self) -> dict:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
+
+    def close(self):
+        with self._lock:
+            # Fold the WAL back into the main file so it can be copied as a single object
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
+
+
+class S3EmbeddingCache(SQLiteEmbeddingCache):
+    """SQLite cache that is downloaded from S3 when opened and uploaded back on close if it changed.
+
+    One GET and one PUT per run instead of a request per embedding.
+    """
+
+    def __init__(self, s3, bucket: str, key: str, local_path: str = "/tmp/embed_cache.sqlite"):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(local_path + suffix):
+                os.remove(local_path + suffix)
+        try:
+            s3.download_file(bucket, key, local_path)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey"):
+                raise
+            print(f"No embedding cache at s3://{bucket}/{key}, starting empty")
+        super().__init__(local_path)
+
+    def close(self):
+        dirty = self._dirty
+        super().close()
+        if dirty:
+            self.s3.upload_file(self.path, self.bucket, self.key)
+
+
+def cached_embed(
+    cache,
+    texts: List[str],
+    embed_fn: Callable[[List[str]], List[List[float]]],
+    model_id: str,
+    dims: int,
+    normalize: bool,
+) -> List[List[float]]:
+    """Return embeddings for texts, calling embed_fn only for texts missing from the cache."""
+    keys = [cache_key(model_id, dims, normalize, t) for t in texts]
+    found = cache.get_many(list(dict.fromkeys(keys)))
+    missing = [i for i, k in enumerate(keys) if k not in found]
+    if missing:
+        # Identical texts in one batch are embedded once
+        unique = list(dict.fromkeys(keys[i] for i in missing))
+        first = {}
+        for i in missing:
+            first.setdefault(keys[i], i)
+        fresh = embed_fn([texts[first[k]] for k in unique])
+        new_items = {k: v for k, v in zip(unique, fresh) if v}
+        cache.put_many(new_items)
+        found.update(new_items)
+    return [found.get(k, []) for k in keys]
+
+
+def open_cache(backend: str, path: str, s3=None, bucket: Optional[str] = None, key: Optional[str] = None):
+    """Build the cache for the configured backend ("sqlite", "s3" or "none")."""
+    if backend == "s3":
+        if not bucket:
+            raise ValueError("The s3 embedding cache needs a bucket")
+        return S3EmbeddingCache(s3, bucket, key, local_path=path)
+    if backend == "sqlite":
+        return SQLiteEmbeddingCache(path)
+    return None
@@ -0,0 +1,176 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from botocore.exceptions import ClientError
+
+# Error codes Bedrock returns when we are sending requests faster than the account quota allows
+THROTTLE_CODES = ("ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException")
+# Transient server side errors worth retrying
+RETRYABLE_CODES = THROTTLE_CODES + ("ServiceUnavailableException", "InternalServerException", "ModelNotReadyException")
+
+
+class EmbedStats:
+    """Thread safe counters and per-call latencies for one embedding run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.throttles = 0
+        self.retries = 0
+        self.failures = 0
+        self.latencies_ms: List[float] = []
+
+    def record_call(self, latency_ms: float):
+        with self._lock:
+            self.calls += 1
+            self.latencies_ms.append(latency_ms)
+
+    def record_retry(self, throttled: bool):
+        with self._lock:
+            self.retries += 1
+            if throttled:
+                self.throttles += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            lat = sorted(self.latencies_ms)
+        return {
+            "calls": self.calls,
+            "throttles": self.throttles,
+            "retries": self.retries,
+            "failures": self.failures,
+            "latency_ms_p50": _percentile(lat, 50),
+            "latency_ms_p95": _percentile(lat, 95),
+            "latency_ms_max": round(lat[-1], 1) if lat else 0.0,
+        }
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return round(sorted_values[idx], 1)
+
+
+class AdaptiveLimiter:
+    """Bounds the number of in-flight requests.
+
+    The limit is halved whenever Bedrock throttles us and grows back by one
+    after a run of successful calls (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, max_in_flight: int, min_in_flight: int = 1, grow_after: int = 10):
+        self.max_in_flight = max(1, max_in_flight)
+        self.min_in_flight = max(1, min(min_in_flight, self.max_in_flight))
+        self.grow_after = grow_after
+        self.limit = self.max_in_flight
+        self._in_flight = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= self.limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_in_flight, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.grow_after and self.limit < self.max_in_flight:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+class TitanEmbedder:
+    """Embeds texts with Titan v2 using a bounded pool of concurrent invoke_model calls.
+
+    Output order always matches input order. Empty texts are not sent to
+    Bedrock and come back as empty vectors.
+    """
+
+    def __init__(
+        self,
+        client,
+        model_id: str,
+        dims: int = 1024,
+        normalize: bool = True,
+        max_in_flight: int = 8,
+        max_retries: int = 6,
+        base_delay: float = 0.25,
+        max_delay: float = 8.0,
+    ):
+        self.client = client
+        self.model_id = model_id
+        self.dims = dims
+        self.normalize = normalize
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = AdaptiveLimiter(max_in_flight)
+        self.stats = EmbedStats()
+        self._pool = ThreadPoolExecutor(max_workers=self.limiter.max_in_flight, thread_name_prefix="titan")
+
+    def reset_stats(self) -> EmbedStats:
+        """Start fresh counters for a new run. The limiter keeps what it learned about the quota."""
+        self.stats = EmbedStats()
+        return self.stats
+
+    def _invoke(self, text: str, dims: int, normalize: bool) -> List[float]:
+        body = {"inputText": text, "dimensions": dims, "normalize": normalize}
+        start = time.perf_counter()
+        response = self.client.invoke_model(
+            modelId=self.model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=json.dumps(body),
+        )
+        payload = json.loads(response["body"].read())
+        self.stats.record_call((time.perf_counter() - start) * 1000.0)
+        embedding = payload.get("embedding", [])
+        if embedding and isinstance(embedding, list) and isinstance(embedding[0], dict):
+            embedding = embedding[0].get("embedding", [])
+        return embedding
+
+    def embed_one(self, text: str, dims: Optional[int] = None, normalize: Optional[bool] = None) -> List[float]:
+        """Embed a single text, retrying throttled and transient failures with jittered backoff."""
+        if not text:
+            return []
+        dims = dims or self.dims
+        normalize = self.normalize if normalize is None else normalize
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            throttled = False
+            try:
+                return self._invoke(text, dims, normalize)
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code", "")
+                throttled = code in THROTTLE_CODES
+                if code not in RETRYABLE_CODES or attempt >= self.max_retries:
+                    self.stats.record_failure()
+                    raise
+            finally:
+                self.limiter.release(throttled=throttled)
+            attempt += 1
+            self.stats.record_retry(throttled)
+            # Full jitter keeps retrying workers from hitting Bedrock in lockstep
+            time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt))))
+
+    def embed(self, texts: List[str], dims: Optional[int] = None, normalize: Optional[bool] = None) -> List[List[float]]:
+        """Embed a list of texts concurrently, keeping the input order."""
+        return list(self._pool.map(lambda t: self.embed_one(t, dims, normalize), texts))
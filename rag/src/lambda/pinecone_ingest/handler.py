@@ -1,32 +1,94 @@
 import os 
 import json
-import boto3
-import math
-from pinecone import Pinecone as pinecone
+import time
+import socket
+from urllib.parse import quote
 from pinecone import ServerlessSpec
 from typing import List
+from embedder import TitanEmbedder
+from pipeline import iter_s3_lines, parse_records, bounded, partition_by_namespace
+from upserter import UpsertBatcher
+from embed_cache import cached_embed, open_cache
+from chunker import chunk_counts, chunk_records
+from rag_common import runtime
+from rag_common.docstore import open_doc_store
+from rag_common.titles import open_title_writer
+from rag_common.vectorstore import open_vector_store
+from checkpoint import plan_partitions, iter_partition_lines, SQLiteManifest, DynamoManifest
 
 
-bedrock = boto3.client("bedrock-runtime", region_name=os.getenv("BEDROCK_REGION", "us-east-1"))
 TITAN_V2_MODEL_ID = "amazon.titan-embed-text-v2:0"
 EMBED_DIM = int(os.getenv("EMBED_DIM", "1024"))
-MAX_BATCH = 2000  # Max texts per batch for embedding. Titan supports 2048 texts per request.
-
-def _get_API_key(PINECONE_SECRET_NAME):
-    sm = boto3.client("secretsmanager")
-    resp = sm.get_secret_value(SecretId=PINECONE_SECRET_NAME)
-    secret = resp.get("SecretString") or resp["SecretBinary"]
-    if isinstance(secret, (bytes, bytearray)):
-        secret = secret.decode()
-    pinecone_api_key = json.loads(secret) if secret.startswith("{") else secret
-    return pinecone_api_key
-
-def _get_records(bucket_name, file_name):
-    s3 = boto3.client("s3")
-    response = s3.get_object(Bucket=bucket_name, Key=file_name)
-    records = response["Body"].read().decode("utf-8").split("\n")
-    records = [json.loads(record) for record in records if record]
-    return records
+MAX_BATCH = 2000  # Max texts handed to the embedder at once. Titan v2 takes one text per invoke_model call.
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "8"))  # Max in-flight invoke_model calls
+INGEST_BATCH = int(os.getenv("INGEST_BATCH", "100"))  # Records embedded and upserted together while streaming
+PIPELINE_DEPTH = int(os.getenv("PIPELINE_DEPTH", "2"))  # Batches buffered between pipeline stages
+UPSERT_CONCURRENCY = int(os.getenv("UPSERT_CONCURRENCY", "4"))  # Parallel upsert requests to Pinecone
+
+# Embedding cache: "s3" (persists across runs), "sqlite" (local file only) or "none"
+EMBED_CACHE_BACKEND = os.getenv("EMBED_CACHE_BACKEND", "sqlite")
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "/tmp/embed_cache.sqlite")
+EMBED_CACHE_KEY = os.getenv("EMBED_CACHE_KEY", "cache/embeddings.sqlite")
+EMBED_CACHE_MAX_AGE_DAYS = int(os.getenv("EMBED_CACHE_MAX_AGE_DAYS", "30"))  # Evict entries unused for this long
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "1000000"))
+embed_cache = None  # Opened per invocation by lambda_handler
+
+# Documents are split into sentence-aligned chunks under this token budget before embedding
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "512"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "64"))
+
+# Only small, filterable fields are stored as Pinecone metadata. Full text goes to the
+# document store ("s3", "local" or "none"; with "none" the text stays in metadata).
+METADATA_FIELDS = tuple(f.strip() for f in os.getenv("METADATA_FIELDS", "title,parent_id,chunk,chunks").split(",") if f.strip())
+METADATA_MAX_CHARS = 256
+DOC_STORE_BACKEND = os.getenv("DOC_STORE_BACKEND", "none")
+DOC_STORE_PATH = os.getenv("DOC_STORE_PATH", "/tmp/docstore.sqlite")
+DOC_STORE_PREFIX = os.getenv("DOC_STORE_PREFIX", "docs")
+doc_store = None  # Opened per invocation by lambda_handler
+
+# Title index for the search Lambda's fast path (see rag_common/titles.py): "s3", "local" or "none".
+# Only namespaces whose record titles are real document titles belong in it (review titles are sentiment labels).
+TITLE_INDEX_BACKEND = os.getenv("TITLE_INDEX_BACKEND", "none")
+TITLE_INDEX_PATH = os.getenv("TITLE_INDEX_PATH", "/tmp/titles")
+TITLE_INDEX_PREFIX = os.getenv("TITLE_INDEX_PREFIX", "titles")
+TITLE_INDEX_NAMESPACES = tuple(n.strip() for n in os.getenv("TITLE_INDEX_NAMESPACES", "movies").split(",") if n.strip())
+title_writer = None  # Opened per invocation by lambda_handler
+
+# Vector store: "pinecone" (the deployed default) or "local", an in-process store on disk
+# (rag_common/vectorstore.py) for local runs, tests and small corpora served from the search Lambda
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", "/tmp/vectors")
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")
+VECTOR_STORE_SEARCH = os.getenv("VECTOR_STORE_SEARCH", "exact")
+
+# Checkpointed ingest ("partitioned" mode): files are split into byte-range partitions tracked
+# in a manifest, so concurrent invocations share the work and a timed-out run can be resumed.
+INGEST_MODE = os.getenv("INGEST_MODE", "single")  # "single" or "partitioned"
+PARTITION_BYTES = int(os.getenv("PARTITION_BYTES", str(8 * 1024 * 1024)))
+# A claimed partition's lease runs until the claiming invocation's timeout plus PARTITION_LEASE_MARGIN_SECONDS,
+# so it expires soon after a killed invocation. PARTITION_LEASE_SECONDS is used outside Lambda (no timeout).
+PARTITION_LEASE_SECONDS = int(os.getenv("PARTITION_LEASE_SECONDS", "300"))
+PARTITION_LEASE_MARGIN_SECONDS = int(os.getenv("PARTITION_LEASE_MARGIN_SECONDS", "5"))
+PARTITION_POLL_SECONDS = float(os.getenv("PARTITION_POLL_SECONDS", "5"))  # While waiting on another worker's lease
+PARTITION_MAX_ATTEMPTS = int(os.getenv("PARTITION_MAX_ATTEMPTS", "3"))
+PARTITION_MIN_REMAINING_MS = int(os.getenv("PARTITION_MIN_REMAINING_MS", "20000"))  # Stop claiming below this
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))  # Concurrent invocations started by the first one
+INGEST_MANIFEST_TABLE = os.getenv("INGEST_MANIFEST_TABLE")  # DynamoDB table; local SQLite file when unset
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "/tmp/ingest_manifest.sqlite")
+
+# Retries are handled by the embedder so it can back off adaptively on throttling
+bedrock = runtime.client(
+    "bedrock-runtime",
+    region_name=os.getenv("BEDROCK_REGION", "us-east-1"),
+    max_pool_connections=EMBED_CONCURRENCY,
+    retries={"max_attempts": 1, "mode": "standard"},
+)
+embedder = TitanEmbedder(bedrock, TITAN_V2_MODEL_ID, dims=EMBED_DIM, normalize=True, max_in_flight=EMBED_CONCURRENCY)
+
+def _iter_records(bucket_name, file_name):
+    # Stream records from the S3 JSONL object one line at a time
+    s3 = runtime.client("s3")
+    return parse_records(iter_s3_lines(s3, bucket_name, file_name))
 
 def build_text(record):
     #Combining title and text into one string for embedding."""
@@ -38,27 +100,35 @@ def build_text(record):
 
 
 def titan_v2_embed(texts, dims=EMBED_DIM, normalize=True) -> List[List[float]]:
-    #Call Amazon Titan v2 model for each text to get embedding vector (list of floats).
+    #Call Amazon Titan v2 model concurrently to get embedding vectors (list of floats) in input order.
+    #Empty texts come back as empty vectors.
     embeddings = []
-    for t in texts:
-        if not t:         # skip empties
-            out.append([])
-            continue
-        body = {"inputText": t, "dimensions": dims, "normalize": normalize}
-        response = bedrock.invoke_model(
-            modelId=TITAN_V2_MODEL_ID,
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps(body),
-        )
-        payload = json.loads(response["body"].read())
-        record = payload.get("embedding", [])
-        if record and isinstance(record, list) and isinstance(record[0], dict):
-            record = record[0].get("embedding", [])
-        embeddings.append(record)
+    for start in range(0, len(texts), MAX_BATCH):
+        embeddings.extend(embedder.embed(texts[start:start + MAX_BATCH], dims=dims, normalize=normalize))
     return embeddings
 
 
+def project_metadata(record):
+    # Keep Pinecone payloads small: allow-listed fields only, strings capped in length
+    metadata = {}
+    for k in METADATA_FIELDS:
+        v = record.get(k)
+        if v is None:
+            continue
+        metadata[k] = v if isinstance(v, (bool, int, float)) else str(v)[:METADATA_MAX_CHARS]
+    if doc_store is None and record.get("text"):
+        metadata["text"] = str(record["text"])
+    return metadata
+
+def _store_documents(namespace, records):
+    # Full text is written to the sidecar document store, keyed by vector id
+    if doc_store is None:
+        return
+    doc_store.put_many(namespace, {
+        str(r.get("id")): {"title": r.get("title"), "text": r.get("text"), "parent_id": r.get("parent_id")}
+        for r in records
+    })
+
 def prepare_records_for_embeddings(records):
     vectorized_records = []
     texts = [build_text(r) for r in records]
@@ -68,17 +138,16 @@ def prepare_records_for_embeddings(records):
         return []
 
     input_texts = [t for _, t in non_empty]
-    print(input_texts)
-    embeddings = titan_v2_embed(input_texts, dims=EMBED_DIM, normalize=True)
-    print(embeddings)
+    if embed_cache is not None:
+        # Only new or changed texts are sent to Titan
+        embeddings = cached_embed(embed_cache, input_texts, titan_v2_embed, TITAN_V2_MODEL_ID, EMBED_DIM, True)
+    else:
+        embeddings = titan_v2_embed(input_texts, dims=EMBED_DIM, normalize=True)
+    print(f"Embedded {len(embeddings)} texts")
     
     for (idx, _), vec in zip(non_empty, embeddings):
         record = records[idx]
-        metadata = {
-            k: str(v)
-            for k, v in record.items()
-            if k not in ("repo")  # skip large fields
-        }
+        metadata = project_metadata(record)
         vectorized_records.append({
             "id": str(record.get("id")),
             "values": vec,
@@ -87,36 +156,246 @@ def prepare_records_for_embeddings(records):
 
     return vectorized_records
 
-def _upsert_records_by_namespace(index, records):
-    _namespace = list({item["repo"] for item in records})   
-    for namespace in _namespace:
-        ns_records = [r for r in records if r["repo"] == namespace]
-        records = prepare_records_for_embeddings(ns_records)
-        index.upsert(namespace=namespace, vectors=records)
+def _ingest_namespace(index, namespace, record_batches):
+    # Worker for a single namespace: embedding overlaps upserting, with at most
+    # PIPELINE_DEPTH batches queued between them.
+    start = time.perf_counter()
+    counts = {"records": 0, "chunks": 0}
+
+    def embedded():
+        for batch in record_batches:
+            counts["records"] += len(batch)
+            chunks = chunk_records(batch, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+            counts["chunks"] += len(chunks)
+            vectors = prepare_records_for_embeddings(chunks)
+            _store_documents(namespace, chunks)
+            if title_writer is not None:
+                title_writer.add(namespace, chunks)
+            yield vectors, chunk_counts(batch, chunks)
+
+    # Vectors are re-packed into requests sized for Pinecone's count and byte limits
+    batcher = UpsertBatcher(index, max_workers=UPSERT_CONCURRENCY)
+    try:
+        for vectors, chunks_per_doc in bounded(embedded(), maxsize=PIPELINE_DEPTH):
+            # Chunks a re-ingested document no longer has would otherwise keep matching searches
+            batcher.delete_stale(namespace, chunks_per_doc)
+            batcher.add(namespace, vectors)
+        upsert_stats = batcher.flush()
+    finally:
+        batcher.close()
+    stats = {"records": counts["records"], "chunks": counts["chunks"], "seconds": round(time.perf_counter() - start, 2), "upsert": upsert_stats}
+    print(f"Namespace '{namespace}' stats:", stats)
+    return stats
+
+def _upsert_records_by_namespace(index, *sources):
+    # Each source (any iterable of records, e.g. a stream from S3) is read once and its
+    # records routed to a per-namespace worker, so namespaces are ingested in parallel.
+    return partition_by_namespace(
+        sources,
+        lambda namespace, batches: _ingest_namespace(index, namespace, batches),
+        namespace_key="repo",
+        batch_size=INGEST_BATCH,
+        maxsize=PIPELINE_DEPTH,
+    )
+
+def _open_embed_cache(bucket_name, shard=None):
+    # Partitioned runs keep one S3 shard per partition. Only the partition's owner writes it,
+    # so concurrent workers never upload over each other's new embeddings.
+    key = EMBED_CACHE_KEY
+    if shard is not None:
+        root, ext = os.path.splitext(EMBED_CACHE_KEY)
+        key = f"{root}/{quote(shard, safe='')}{ext}"
+    try:
+        return open_cache(EMBED_CACHE_BACKEND, EMBED_CACHE_PATH, s3=runtime.client("s3"), bucket=bucket_name, key=key)
+    except Exception as e:
+        # The cache only saves work; ingest still runs without it
+        print("Embedding cache unavailable, embedding everything:", e)
+        return None
+
+def _open_doc_store(bucket_name):
+    return open_doc_store(DOC_STORE_BACKEND, DOC_STORE_PATH, s3=runtime.client("s3"), bucket=bucket_name, prefix=DOC_STORE_PREFIX)
+
+def _open_title_writer(bucket_name):
+    return open_title_writer(TITLE_INDEX_BACKEND, TITLE_INDEX_NAMESPACES, TITLE_INDEX_PATH, s3=runtime.client("s3"),
+                             bucket=bucket_name, prefix=TITLE_INDEX_PREFIX)
+
+def _flush_titles(shard):
+    # One shard per partition (or per run), so re-ingesting a partition replaces its titles
+    if title_writer is not None:
+        print(f"Title index shard '{shard}':", title_writer.flush(shard), "titles")
+
+def _clear_titles(keep):
+    # Shards of files or partitions that are no longer ingested would still resolve their old titles
+    if title_writer is not None:
+        print("Title index shards removed:", title_writer.clear(keep))
+
+def _close_embed_cache():
+    global embed_cache
+    if embed_cache is None:
+        return None
+    evicted = embed_cache.evict(max_age_seconds=EMBED_CACHE_MAX_AGE_DAYS * 86400, max_entries=EMBED_CACHE_MAX_ENTRIES)
+    stats = dict(embed_cache.summary(), evicted=evicted)
+    embed_cache.close()
+    embed_cache = None
+    return stats
+
+def _merge_cache_stats(total, stats):
+    if stats is None:
+        return total
+    total = dict(total or {})
+    for name, value in stats.items():
+        total[name] = total.get(name, 0) + value
+    return total
+
+def _open_manifest():
+    if INGEST_MANIFEST_TABLE:
+        return DynamoManifest(runtime.resource("dynamodb").Table(INGEST_MANIFEST_TABLE))
+    return SQLiteManifest(INGEST_MANIFEST_PATH)
+
+def _remaining_ms(context):
+    return context.get_remaining_time_in_millis() if context else float("inf")
+
+def _lease_seconds(context):
+    # The lease outlasts the invocation that claims it, so only a finished or killed one lets it lapse
+    if not context:
+        return PARTITION_LEASE_SECONDS
+    return int(_remaining_ms(context) / 1000) + PARTITION_LEASE_MARGIN_SECONDS
+
+def _wait_for_lease(manifest, jobs, context):
+    # Nothing to claim, but partitions are still running elsewhere. Their worker may have been
+    # killed, so wait (polling) while a lease could lapse before this invocation has to stop.
+    progress = manifest.progress(jobs)
+    if not progress["running"]:
+        return False
+    until_stop = (_remaining_ms(context) - PARTITION_MIN_REMAINING_MS) / 1000
+    # Leases are compared in whole seconds, so an expired one is claimable a second later at most
+    until_expiry = 0.0 if progress["expired"] else progress["next_expiry"] - time.time()
+    if until_expiry >= until_stop:
+        return False
+    time.sleep(min(PARTITION_POLL_SECONDS, until_expiry + 1))
+    return True
+
+def _invoke_self(context, event, copies):
+    # Start more invocations of this function with the same event to share or continue the work
+    if not context or copies <= 0:
+        return
+    client = runtime.client("lambda")
+    payload = json.dumps(dict(event or {}, mode="partitioned", continuation=True))
+    for _ in range(copies):
+        client.invoke(FunctionName=context.invoked_function_arn, InvocationType="Event", Payload=payload)
+
+def _merge_namespace_stats(total, stats):
+    for namespace, ns in stats.items():
+        t = total.setdefault(namespace, {"records": 0, "chunks": 0, "vectors": 0})
+        t["records"] += ns["records"]
+        t["chunks"] += ns["chunks"]
+        t["vectors"] += ns["upsert"]["vectors"]
+
+def _ingest_partitions(index, event, context, bucket_name, file_names):
+    # Claim partitions one at a time until none are left or the invocation is about to time out
+    global embed_cache
+    s3 = runtime.client("s3")
+    manifest = _open_manifest()
+    plans = [plan_partitions(s3, bucket_name, f, PARTITION_BYTES) for f in file_names]
+    jobs = [manifest.register(plan) for plan in plans]
+    if not (event or {}).get("continuation"):
+        _clear_titles(f"{plan['key']}#{p['part']}" for plan in plans for p in plan["partitions"])
+        _invoke_self(context, event, INGEST_WORKERS - 1)
+
+    owner = getattr(context, "aws_request_id", None) or f"{socket.gethostname()}-{os.getpid()}"
+    totals, processed, failed, cache_stats = {}, 0, 0, None
+    while _remaining_ms(context) > PARTITION_MIN_REMAINING_MS:
+        part = manifest.claim(jobs, owner, _lease_seconds(context), PARTITION_MAX_ATTEMPTS)
+        if part is None:
+            if _wait_for_lease(manifest, jobs, context):
+                continue
+            break
+        name = f"{part['key']}#{part['part']}"
+        lines = iter_partition_lines(s3, part["bucket"], part["key"], part["start"], part["end"], etag=part["etag"])
+        embed_cache = _open_embed_cache(bucket_name, name)
+        try:
+            stats = _upsert_records_by_namespace(index, parse_records(lines))
+        except Exception as e:
+            print(f"Partition {name} failed (attempt {part['attempts']}):", e)
+            manifest.release(part, str(e), retry=part["attempts"] < PARTITION_MAX_ATTEMPTS)
+            failed += 1
+            # Leave the retry to the next invocation rather than spinning on the same partition
+            break
+        finally:
+            # Uploaded before the partition is marked done and before any follow-up invocation starts
+            cache_stats = _merge_cache_stats(cache_stats, _close_embed_cache())
+        _flush_titles(name)
+        manifest.complete(part, sum(ns["records"] for ns in stats.values()), sum(ns["upsert"]["vectors"] for ns in stats.values()))
+        _merge_namespace_stats(totals, stats)
+        processed += 1
+        print(f"Partition {name} done")
+
+    progress = manifest.progress(jobs)
+    print("Partition progress:", progress)
+    # Running partitions are included: if their worker was killed, no one else would be left to reclaim them
+    if progress["pending"] or progress["running"]:
+        _invoke_self(context, event, 1)
+    return totals, {"processed": processed, "failed": failed, "progress": progress}, cache_stats
 
 def lambda_handler(event, context):
+    global embed_cache, doc_store, title_writer
     PINECONE_SECRET_NAME = os.getenv("PINECONE_SECRET_NAME")
     DATA_BUCKET_NAME = os.getenv("DATA_BUCKET_NAME")
     MOVIES_DATA_FILE = os.getenv("MOVIES_DATA_FILE")
     REVIEWS_DATA_FILE = os.getenv("REVIEWS_DATA_FILE")
-    pinecone_api_key = _get_API_key(PINECONE_SECRET_NAME)
-    movie_records = _get_records(DATA_BUCKET_NAME, MOVIES_DATA_FILE)
-    review_records = _get_records(DATA_BUCKET_NAME, REVIEWS_DATA_FILE)
-
-    #Create Index in Pinecone
-    pc = pinecone(api_key=pinecone_api_key)
-    index_name = "rag-index"
-    if not pc.has_index(index_name):
-        pc.create_index(
-            name=index_name,
-            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
-            dimension=1024,
-            metric="cosine",
-        )
-    index = pc.Index(index_name)
-
-    # --- ingest (per-namespace) ---
-    _upsert_records_by_namespace(index, movie_records)
-    _upsert_records_by_namespace(index, review_records)
-
-    return {"statusCode": 200, "body": json.dumps({"message": "Records Uploaded to Pinecone"})}
+    if VECTOR_STORE_BACKEND == "local":
+        index = open_vector_store("local", path=VECTOR_STORE_PATH, dims=EMBED_DIM, dtype=VECTOR_STORE_DTYPE,
+                                  search=VECTOR_STORE_SEARCH)
+    else:
+        pinecone_api_key = runtime.get_secret(PINECONE_SECRET_NAME)
+
+        #Create Index in Pinecone
+        pc = runtime.pinecone_client(pinecone_api_key)
+        index_name = "rag-index"
+        if not pc.has_index(index_name):
+            pc.create_index(
+                name=index_name,
+                spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+                dimension=1024,
+                metric="cosine",
+            )
+        # Size the connection pool so parallel upserts reuse connections instead of opening new ones
+        index = open_vector_store("pinecone", pinecone_index=runtime.pinecone_index(
+            pinecone_api_key, index_name, pool_threads=UPSERT_CONCURRENCY, connection_pool_maxsize=UPSERT_CONCURRENCY))
+
+    # --- ingest (per-namespace), streamed from S3 ---
+    mode = (event or {}).get("mode", INGEST_MODE)
+    # The embedder outlives warm invocations; its stats describe this one only
+    embedder.reset_stats()
+    doc_store = _open_doc_store(DATA_BUCKET_NAME)
+    title_writer = _open_title_writer(DATA_BUCKET_NAME)
+    partitions = cache_stats = None
+    try:
+        if mode == "partitioned":
+            namespace_stats, partitions, cache_stats = _ingest_partitions(index, event, context, DATA_BUCKET_NAME, [MOVIES_DATA_FILE, REVIEWS_DATA_FILE])
+        else:
+            embed_cache = _open_embed_cache(DATA_BUCKET_NAME)
+            namespace_stats = {}
+            _merge_namespace_stats(namespace_stats, _upsert_records_by_namespace(
+                index,
+                _iter_records(DATA_BUCKET_NAME, MOVIES_DATA_FILE),
+                _iter_records(DATA_BUCKET_NAME, REVIEWS_DATA_FILE),
+            ))
+            _flush_titles("all")
+            _clear_titles(["all"])
+        if VECTOR_STORE_SEARCH == "ivf":
+            index.build_index()
+    finally:
+        cache_stats = _merge_cache_stats(cache_stats, _close_embed_cache())
+        if doc_store is not None:
+            doc_store.close()
+            doc_store = None
+        title_writer = None
+        index.close()
+
+    embed_stats = embedder.stats.summary()
+    print("Embedding stats:", embed_stats)
+    print("Embedding cache stats:", cache_stats)
+    upserted = sum(ns["vectors"] for ns in namespace_stats.values())
+
+    return {"statusCode": 200, "body": json.dumps({"message": "Records Uploaded to Pinecone", "upserted": upserted, "namespaces": namespace_stats, "partitions": partitions, "embedding": embed_stats, "embedding_cache": cache_stats})}
@@ -0,0 +1,171 @@
+import json
+import queue
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List
+
+# Generator stages for streaming a JSONL object from S3 into Pinecone.
+# Each stage pulls from the previous one, so only a few batches are ever held in memory.
+
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def iter_s3_lines(s3, bucket_name: str, file_name: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """Stream the lines of an S3 object without reading the whole body into memory."""
+    response = s3.get_object(Bucket=bucket_name, Key=file_name)
+    body = response["Body"]
+    try:
+        for line in body.iter_lines(chunk_size=chunk_size):
+            if line:
+                yield line
+    finally:
+        body.close()
+
+
+def parse_records(lines: Iterable[bytes]) -> Iterator[dict]:
+    """Decode JSONL lines into records, skipping blank and malformed lines."""
+    for n, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            print(f"Skipping malformed JSON on line {n}")
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most `size` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bounded(items: Iterable, maxsize: int = 2) -> Iterator:
+    """Run an upstream stage in a background thread behind a bounded queue.
+
+    The upstream stage blocks once `maxsize` items are waiting, which gives
+    backpressure between stages while still letting them overlap.
+    """
+    q: queue.Queue = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as e:
+            put(_StageError(e))
+            return
+        put(_DONE)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        worker.join(timeout=1)
+
+
+def partition_by_namespace(sources: Iterable[Iterable[dict]], worker: Callable[[str, Iterator[List[dict]]], dict],
+                           namespace_key: str = "repo", batch_size: int = 100, maxsize: int = 2) -> Dict[str, dict]:
+    """Route records to one worker per namespace in a single pass and return each worker's stats.
+
+    Every source (e.g. one S3 file) is read by its own thread. A worker thread is
+    started the first time its namespace is seen and receives that namespace's
+    records in batches through a bounded queue, so namespaces are ingested in
+    parallel and a slow namespace only backs up the readers feeding it.
+    """
+    lock = threading.Lock()
+    queues: Dict[str, queue.Queue] = {}
+    threads: List[threading.Thread] = []
+    results: Dict[str, dict] = {}
+    errors: List[BaseException] = []
+
+    def drain(q: queue.Queue, state: dict) -> Iterator[List[dict]]:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                state["done"] = True
+                return
+            yield item
+
+    def run_worker(namespace: str, q: queue.Queue):
+        state = {"done": False}
+        try:
+            results[namespace] = worker(namespace, drain(q, state))
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            # Keep consuming so readers never block on a failed namespace
+            while not state["done"]:
+                try:
+                    if q.get(timeout=0.1) is _DONE:
+                        state["done"] = True
+                except queue.Empty:
+                    continue
+
+    def queue_for(namespace: str) -> queue.Queue:
+        with lock:
+            q = queues.get(namespace)
+            if q is None:
+                q = queues[namespace] = queue.Queue(maxsize=max(1, maxsize))
+                t = threading.Thread(target=run_worker, args=(namespace, q), daemon=True)
+                threads.append(t)
+                t.start()
+            return q
+
+    def read(source: Iterable[dict]):
+        pending: Dict[str, List[dict]] = {}
+        try:
+            for record in source:
+                namespace = record.get(namespace_key)
+                batch = pending.setdefault(namespace, [])
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    queue_for(namespace).put(pending.pop(namespace))
+            for namespace, batch in pending.items():
+                queue_for(namespace).put(batch)
+        except BaseException as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read, args=(source,), daemon=True) for source in sources]
+    for t in readers:
+        t.start()
+    for t in readers:
+        t.join()
+    with lock:
+        for q in queues.values():
+            q.put(_DONE)
+        workers = list(threads)
+    for t in workers:
+        t.join()
+    if errors:
+        raise errors[0]
+    return results
@@ -0,0 +1,199 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from rag_common.text import CHUNK_SEPARATOR
+
+# Pinecone serverless limits for a single upsert request
+MAX_VECTORS_PER_REQUEST = 1000
+MAX_REQUEST_BYTES = 2 * 1024 * 1024
+MAX_IDS_PER_DELETE = 1000
+FETCH_IDS_PER_REQUEST = 100  # Fetch ids go in the query string
+# Room left for the request envelope (namespace, brackets, headers)
+REQUEST_OVERHEAD_BYTES = 4 * 1024
+
+
+def vector_size(vector: dict) -> int:
+    """Serialized size of one vector as it is sent in the upsert request body."""
+    return len(json.dumps(vector, separators=(",", ":"))) + 1
+
+
+class UpsertStats:
+    """Thread safe counters for one upsert run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.vectors = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed_batches = 0
+        self.failed_vectors = 0
+        self.stale_ids = 0  # Ids sent in stale-chunk deletes (ids that did not exist included)
+        self.started = time.perf_counter()
+
+    def record_batch(self, size: int):
+        with self._lock:
+            self.vectors += size
+            self.batches += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_stale(self, size: int):
+        with self._lock:
+            self.stale_ids += size
+
+    def record_failure(self, size: int):
+        with self._lock:
+            self.failed_batches += 1
+            self.failed_vectors += size
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "vectors": self.vectors,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed_batches": self.failed_batches,
+            "failed_vectors": self.failed_vectors,
+            "stale_ids": self.stale_ids,
+            "seconds": round(elapsed, 2),
+            "vectors_per_sec": round(self.vectors / elapsed, 1) if elapsed > 0 else 0.0,
+        }
+
+
+class UpsertBatcher:
+    """Packs vectors into upsert requests under Pinecone's count and byte limits.
+
+    Full batches are sent in parallel on a thread pool that shares the index's
+    connection pool. A failed batch is retried on its own with backoff; other
+    batches are not affected. Call flush() to send what is left and wait.
+
+    delete_stale() removes what an earlier ingest left of re-ingested documents, the
+    chunks past their new chunk count and their unchunked id, on the same pool.
+    """
+
+    def __init__(
+        self,
+        index,
+        max_vectors: int = MAX_VECTORS_PER_REQUEST,
+        max_bytes: int = MAX_REQUEST_BYTES,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+    ):
+        self.index = index
+        self.max_vectors = min(max_vectors, MAX_VECTORS_PER_REQUEST)
+        self.max_bytes = min(max_bytes, MAX_REQUEST_BYTES) - REQUEST_OVERHEAD_BYTES
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.stats = UpsertStats()
+        self._pending: Dict[str, List[dict]] = {}
+        self._pending_bytes: Dict[str, int] = {}
+        self._futures = []
+        self._errors: List[Exception] = []
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upsert")
+        # Limits queued batches so a fast producer cannot buffer the whole corpus
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+
+    def add(self, namespace: str, vectors: List[dict]):
+        """Queue vectors for a namespace, sending batches as they fill up."""
+        for vector in vectors:
+            size = vector_size(vector)
+            if size > self.max_bytes:
+                raise ValueError(f"Vector {vector.get('id')} is {size} bytes, over the {self.max_bytes} byte request limit")
+            batch = self._pending.setdefault(namespace, [])
+            if batch and (len(batch) >= self.max_vectors or self._pending_bytes[namespace] + size > self.max_bytes):
+                self._submit(namespace)
+                batch = self._pending.setdefault(namespace, [])
+            batch.append(vector)
+            self._pending_bytes[namespace] = self._pending_bytes.get(namespace, 0) + size
+
+    def delete_stale(self, namespace: str, counts: Dict[str, int]):
+        """Delete vectors of these documents that their new chunks (`counts[doc_id]` of them) do not overwrite.
+
+        The old chunk count is read from the `chunks` metadata of each document's stored first
+        chunk. Call it before adding the documents' new vectors, so that chunk is still the old one.
+        """
+        if not counts:
+            return
+        first = {f"{doc_id}{CHUNK_SEPARATOR}0": doc_id for doc_id in counts}
+        ids, found = list(first), {}
+        for lo in range(0, len(ids), FETCH_IDS_PER_REQUEST):
+            part = ids[lo:lo + FETCH_IDS_PER_REQUEST]
+            if not self._retrying(lambda: found.update(self.index.fetch(ids=part, namespace=namespace).vectors),
+                                  f"Fetch of {len(part)} stored chunks from '{namespace}'"):
+                return
+        # A first chunk stored without a count (METADATA_FIELDS leaves `chunks` out) counts as the only one
+        old = {first[i]: int((v.metadata or {}).get("chunks") or 1) for i, v in found.items()}
+        # The unchunked id is from before chunking; deleting an id that does not exist is a no-op
+        stale = list(counts)
+        for doc_id, count in counts.items():
+            stale.extend(f"{doc_id}{CHUNK_SEPARATOR}{n}" for n in range(count, old.get(doc_id, 0)))
+        for lo in range(0, len(stale), MAX_IDS_PER_DELETE):
+            self._slots.acquire()
+            self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(self._pool.submit(self._delete, namespace, stale[lo:lo + MAX_IDS_PER_DELETE]))
+
+    def flush(self) -> dict:
+        """Send all pending batches, wait for them and return the run stats."""
+        for namespace in list(self._pending):
+            self._submit(namespace)
+        for future in self._futures:
+            future.result()
+        self._futures = []
+        if self._errors:
+            errors, self._errors = self._errors, []
+            raise RuntimeError(f"{len(errors)} upsert or delete requests failed after retries: {errors[0]}")
+        return self.stats.summary()
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def _submit(self, namespace: str):
+        batch = self._pending.pop(namespace, None)
+        self._pending_bytes.pop(namespace, None)
+        if not batch:
+            return
+        self._slots.acquire()
+        # _send never raises, so finished futures can be dropped
+        self._futures = [f for f in self._futures if not f.done()]
+        self._futures.append(self._pool.submit(self._send, namespace, batch))
+
+    def _send(self, namespace: str, batch: List[dict]):
+        try:
+            if self._retrying(lambda: self.index.upsert(namespace=namespace, vectors=batch, show_progress=False),
+                              f"Upsert of {len(batch)} vectors to '{namespace}'"):
+                self.stats.record_batch(len(batch))
+            else:
+                self.stats.record_failure(len(batch))
+        finally:
+            self._slots.release()
+
+    def _delete(self, namespace: str, ids: List[str]):
+        try:
+            if self._retrying(lambda: self.index.delete(ids=ids, namespace=namespace),
+                              f"Delete of {len(ids)} stale ids from '{namespace}'"):
+                self.stats.record_stale(len(ids))
+        finally:
+            self._slots.release()
+
+    def _retrying(self, call, what: str) -> bool:
+        # Never raises: the last error is kept for flush()
+        attempt = 0
+        while True:
+            try:
+                call()
+                return True
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    print(f"{what} failed: {e}")
+                    self._errors.append(e)
+                    return False
+                attempt += 1
+                self.stats.record_retry()
+                time.sleep(random.uniform(0, self.base_delay * (2 ** attempt)))
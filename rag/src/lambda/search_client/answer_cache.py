@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+import numpy as np
+
+# Semantic cache of Nova answers. A new question reuses a past answer when its embedding
+# is close enough to the past question's, in the same namespace, and retrieval still
+# puts the same documents in the context. That last check keeps a re-ingested or
+# changed index from serving answers built on documents it no longer returns first.
+
+
+class SemanticAnswerCache:
+    """In-process answer cache with similarity lookup, TTL and LRU size bound."""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600.0, min_similarity: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.min_similarity = min_similarity
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0  # Similar question found, but retrieval now returns different documents
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unit(q_vec) -> np.ndarray:
+        v = np.asarray(q_vec, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else v
+
+    def _closest(self, namespace: str, v: np.ndarray, now: float):
+        """Best live entry in `namespace` by cosine similarity, as (entry id, similarity). Drops expired entries."""
+        for entry_id in [k for k, e in self._entries.items() if e["expires"] < now]:
+            del self._entries[entry_id]
+        ids = [k for k, e in self._entries.items() if e["namespace"] == namespace]
+        if not ids:
+            return None, 0.0
+        sims = np.stack([self._entries[k]["vector"] for k in ids]) @ v
+        best = int(np.argmax(sims))
+        return ids[best], float(sims[best])
+
+    def get(self, namespace: str, q_vec, match_ids: Sequence[str]) -> Optional[str]:
+        if self.max_entries <= 0:
+            return None
+        v = self._unit(q_vec)
+        with self._lock:
+            entry_id, sim = self._closest(namespace, v, time.monotonic())
+            if entry_id is None or sim < self.min_similarity:
+                self.misses += 1
+                return None
+            entry = self._entries[entry_id]
+            if entry["match_ids"] != tuple(match_ids):
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return entry["answer"]
+
+    def put(self, namespace: str, q_vec, match_ids: Sequence[str], answer: str):
+        if self.max_entries <= 0 or not answer:
+            return
+        v = self._unit(q_vec)
+        now = time.monotonic()
+        with self._lock:
+            entry_id, sim = self._closest(namespace, v, now)
+            # A near-identical question replaces its older entry instead of adding another
+            if entry_id is not None and sim >= self.min_similarity:
+                del self._entries[entry_id]
+            self._entries[self._next_id] = {"namespace": namespace, "vector": v, "match_ids": tuple(match_ids),
+                                            "answer": answer, "expires": now + self.ttl}
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def summary(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "stale": self.stale, "entries": len(self._entries)}
@@ -0,0 +1,54 @@
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from query_cache import normalize_query
+
+# Helpers for /rag/batch. Identical queries (after normalize_query) are answered once,
+# and every stage runs its items on a bounded pool and records failures per item, so
+# one bad query does not fail the rest of the batch. With a deadline, items still running
+# when it passes get a timeout error, so the batch answers before API Gateway gives up.
+
+TIMEOUT_ERROR = "TimeoutError: the batch ran out of time before this query was answered"
+
+
+def dedupe_queries(queries: Sequence[str]) -> Tuple[List[str], List[int]]:
+    """Unique queries in first-seen order, and for each input the index of its unique query."""
+    first, unique, positions = {}, [], []
+    for q in queries:
+        key = normalize_query(q)
+        if key not in first:
+            first[key] = len(unique)
+            unique.append(q)
+        positions.append(first[key])
+    return unique, positions
+
+
+def error_text(e: Exception) -> str:
+    return f"{type(e).__name__}: {e}"
+
+
+def map_bounded(pool: ThreadPoolExecutor, fn: Callable, items: list,
+                deadline: Optional[float] = None) -> List[Tuple[object, Optional[str]]]:
+    """Run `fn` over `items` on `pool` and return `(result, error)` per item, in order.
+
+    Each call runs in a copy of the caller's context, so it records into the request's metrics trace.
+    Items not finished by `deadline` (a time.monotonic() value) get TIMEOUT_ERROR; those not yet
+    started are cancelled.
+    """
+    futures = [pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+    results = []
+    for f in futures:
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            results.append((f.result(timeout=timeout), None))
+        except FutureTimeout:
+            if f.done():
+                results.append((None, error_text(f.exception())))
+                continue
+            f.cancel()
+            results.append((None, TIMEOUT_ERROR))
+        except Exception as e:
+            results.append((None, error_text(e)))
+    return results
@@ -0,0 +1,128 @@
+from typing import List, Sequence, Tuple
+
+from rag_common.text import estimate_tokens, split_long_sentence, split_sentences, words
+
+# Token-budgeted context for the Nova prompt. Passages come in rank order (best first)
+# and share an input budget, weighted toward the top match. A passage over its share
+# keeps its most query-relevant sentences, in document order, with gaps marked "...".
+# Sentences already used by an earlier passage are dropped, which also removes the
+# overlap the chunker repeats between consecutive chunks of one document.
+
+# Words that say nothing about relevance
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their this to was were "
+    "what when where which who will with about movie movies film review reviews tell me".split()
+)
+
+
+def _key(sentence: str) -> str:
+    return " ".join(words(sentence))
+
+
+def _relevance(sentence_words: List[str], query_terms: set) -> float:
+    if not query_terms or not sentence_words:
+        return 0.0
+    hits = sum(1 for w in sentence_words if w in query_terms)
+    return hits / len(sentence_words) ** 0.5
+
+
+def _allocate(demands: List[int], budget: int) -> List[int]:
+    """Split `budget` by rank weights 1, 1/2, 1/3, ...; what a passage does not need goes to the others."""
+    shares = [0] * len(demands)
+    open_ = list(range(len(demands)))
+    while open_ and budget > 0:
+        total = sum(1.0 / (i + 1) for i in open_)
+        offers = {i: budget / (i + 1) / total for i in open_}
+        satisfied = [i for i in open_ if demands[i] <= offers[i]]
+        if not satisfied:
+            for i in open_:
+                shares[i] = int(offers[i])
+            break
+        for i in satisfied:
+            shares[i] = demands[i]
+            budget -= demands[i]
+            open_.remove(i)
+    return shares
+
+
+def _fit(sentences: List[str], max_tokens: int) -> List[str]:
+    """Cut sentences longer than the whole share into word windows, so at least the first one fits."""
+    if max_tokens < 2:
+        return sentences
+    fitted = []
+    for sentence in sentences:
+        if estimate_tokens(sentence) + 1 > max_tokens:
+            fitted.extend(split_long_sentence(sentence, max_tokens - 1))
+        else:
+            fitted.append(sentence)
+    return fitted
+
+
+def _trim(sentences: List[str], query_terms: set, max_tokens: int) -> List[Tuple[int, str]]:
+    """Pick sentences under `max_tokens`: query-relevant first, then earlier ones. Returns (position, sentence)."""
+    ranked = sorted(range(len(sentences)), key=lambda i: (-_relevance(words(sentences[i]), query_terms), i))
+    kept, used = [], 0
+    for i in ranked:
+        tokens = estimate_tokens(sentences[i]) + 1
+        if used + tokens > max_tokens:
+            continue
+        kept.append(i)
+        used += tokens
+    return [(i, sentences[i]) for i in sorted(kept)]
+
+
+def assemble_context(passages: Sequence[Tuple[str, Sequence[str]]], query: str, budget_tokens: int):
+    """Build "- title: text" lines from ranked (title, texts) passages within `budget_tokens`.
+
+    Returns the context and its stats: estimated tokens, passages and sentences kept,
+    sentences trimmed for the budget and duplicate sentences dropped.
+    """
+    query_terms = {w for w in words(query) if w not in STOPWORDS}
+    seen = set()
+    unique = []
+    duplicates = 0
+    for title, texts in passages:
+        sentences, repeated = [], 0
+        for text in texts:
+            for sentence in split_sentences(text or ""):
+                key = _key(sentence)
+                if not key:
+                    continue
+                if key in seen:
+                    repeated += 1
+                    continue
+                seen.add(key)
+                sentences.append(sentence)
+        duplicates += repeated
+        # A passage left with nothing new (a duplicate of an earlier one) gives up its share
+        if sentences or not repeated:
+            unique.append((title, sentences))
+
+    headers = [f"- {title}: " for title, _ in unique]
+    demands = [estimate_tokens(h) + sum(estimate_tokens(x) + 1 for x in sentences)
+               for h, (_, sentences) in zip(headers, unique)]
+    shares = _allocate(demands, budget_tokens)
+    lines, used, kept_sentences, trimmed = [], 0, 0, 0
+    for header, (title, sentences), demand, share in zip(headers, unique, demands, shares):
+        if demand <= share:
+            picked = list(enumerate(sentences))
+        else:
+            sentences = _fit(sentences, share - estimate_tokens(header))
+            picked = _trim(sentences, query_terms, share - estimate_tokens(header))
+        if sentences and not picked:
+            trimmed += len(sentences)
+            continue
+        parts, last = [], None
+        for i, sentence in picked:
+            if parts and i != last + 1:
+                parts.append("...")
+            parts.append(sentence)
+            last = i
+        line = header + " ".join(parts)
+        lines.append(line)
+        used += estimate_tokens(line)
+        kept_sentences += len(picked)
+        trimmed += len(sentences) - len(picked)
+    stats = {"tokens": used, "passages": len(lines), "sentences": kept_sentences, "trimmed": trimmed,
+             "duplicates": duplicates}
+    return "\n".join(lines), stats
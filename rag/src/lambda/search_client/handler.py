@@ -1,10 +1,26 @@
+import time
+_IMPORT_START = time.perf_counter()
+import asyncio
+import atexit
 import os 
 import json
-import boto3
 import logging
-import base64
+import functools
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 from typing import Dict, List
-from pinecone import Pinecone as pinecone
+from rag_common import metrics, runtime
+from rag_common.docstore import open_doc_store
+from rag_common.text import chunk_ids, estimate_tokens, parse_chunk_id
+from rag_common.titles import TitleIndex, decode_entries, load_title_shards
+from rag_common.vectorstore import AsyncPineconeVectorStore, ThreadedAsyncVectorStore, open_vector_store
+from answer_cache import SemanticAnswerCache
+from batch import TIMEOUT_ERROR, dedupe_queries, error_text, map_bounded
+from context_builder import assemble_context
+from query_cache import DynamoEmbeddingStore, LRUCache, QueryEmbedder
+from router import NamespaceRouter, artifact_path, load_registry, query_namespaces
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -17,165 +33,419 @@ EMBED_DIM = int(os.getenv("EMBED_DIM", "1024"))
 TOP_K = int(os.getenv("TOP_K", "5"))
 MIN_SCORE = 0.30 # Minimum threshold score
 KEEP_N = 2 # Client Side results
+# Retrieval: "two_phase" queries ids and scores only, cuts the ranking, then reads the text of the
+# surviving documents (document store, or a vector store fetch); "metadata" returns it with every match
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "two_phase")
+# Matches after the first score drop of at least this much are cut (0 disables)
+RETRIEVAL_CUT_GAP = float(os.getenv("RETRIEVAL_CUT_GAP", "0.05"))
 
 PINECONE_SECRET_NAME = os.getenv("PINECONE_SECRET_NAME")
 
+# Vector store: "pinecone", or "local" to search an in-process store built by the ingest Lambda with
+# VECTOR_STORE_BACKEND=local (e.g. packaged with this Lambda's code for a small corpus)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+VECTOR_STORE_PATH = os.getenv("VECTOR_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "vectors"))
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")
+VECTOR_STORE_SEARCH = os.getenv("VECTOR_STORE_SEARCH", "exact")
+VECTOR_STORE_NPROBE = int(os.getenv("VECTOR_STORE_NPROBE", "8"))
+
+# Full document text is read on demand from the sidecar document store written by the ingest Lambda
+DOC_STORE_BACKEND = os.getenv("DOC_STORE_BACKEND", "none")
+
+# Query embedding cache: an in-process LRU per warm instance, plus an optional DynamoDB table shared by all instances
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL_SECONDS = int(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+QUERY_CACHE_TABLE = os.getenv("QUERY_CACHE_TABLE")
+QUERY_CACHE_SHARED_TTL_SECONDS = int(os.getenv("QUERY_CACHE_SHARED_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Semantic answer cache in front of Nova: a question close enough to a past one (cosine >= ANSWER_CACHE_MIN_SIMILARITY)
+# in the same namespace, whose retrieval returns the same documents, gets the past answer. ANSWER_CACHE_SIZE=0 disables it.
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MIN_SIMILARITY = float(os.getenv("ANSWER_CACHE_MIN_SIMILARITY", "0.95"))
+
+# Request pipeline: "async" overlaps independent I/O on an asyncio event loop, "sync" runs the stages in sequence.
+# The async pipeline queries Pinecone through its asyncio client (pinecone[asyncio]) when PINECONE_ASYNC=1,
+# and starts the query on the SPECULATIVE_NAMESPACES namespaces routed most often so far before routing finishes.
+SEARCH_PIPELINE = os.getenv("SEARCH_PIPELINE", "async")
+PINECONE_ASYNC = os.getenv("PINECONE_ASYNC", "1") == "1"
+SPECULATIVE_NAMESPACES = int(os.getenv("SPECULATIVE_NAMESPACES", "1"))
+ASYNC_IO_THREADS = int(os.getenv("ASYNC_IO_THREADS", "8"))  # Threads for blocking calls (boto3, doc store) made from the loop
+
+# Per-request stage timings and Nova token usage, written as CloudWatch EMF records (rag_common/metrics.py).
+# METRICS_SINK is "stdout" (CloudWatch Logs), "file" (METRICS_PATH) or "none"; METRICS_SAMPLE_RATE in [0, 1].
+recorder = metrics.open_recorder(os.getenv("METRICS_NAMESPACE", "GenAIExamples/RAG"), "rag-search")
+
+# /rag/batch limits: queries per call, concurrent Titan/Pinecone calls and concurrent Nova generations.
+# A batch answers within BATCH_TIME_BUDGET_MS (API Gateway's HTTP integrations time out at 30 s) and
+# BATCH_DEADLINE_MARGIN_MS before the Lambda timeout; queries unanswered by then get a timeout error.
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "24"))
+BATCH_QUERY_CONCURRENCY = int(os.getenv("BATCH_QUERY_CONCURRENCY", "8"))
+BATCH_GENERATE_CONCURRENCY = int(os.getenv("BATCH_GENERATE_CONCURRENCY", "8"))
+BATCH_TIME_BUDGET_MS = int(os.getenv("BATCH_TIME_BUDGET_MS", "27000"))
+BATCH_DEADLINE_MARGIN_MS = int(os.getenv("BATCH_DEADLINE_MARGIN_MS", "1500"))
+
+# Input budget for the retrieved context in the Nova prompt (estimated tokens). Passages share it by rank,
+# are trimmed to their most query-relevant sentences and deduplicated. 0 puts every passage in whole.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
 
 # Foundation Model
 NOVA_MODEL = "amazon.nova-micro-v1:0"
-bedrock = boto3.client("bedrock-runtime", region_name=BEDROCK_REGION)
 
-NAMESPACE_DESCRIPTORS = {
-  "movies":  "Contains names of movies and the plot of the movie",
-  "reviews": "Contains user provided reviews for a movie"
-}
+# Namespace descriptors live in a versioned registry file shipped with the Lambda
+NAMESPACE_REGISTRY_PATH = os.getenv("NAMESPACE_REGISTRY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "namespaces.json"))
+# Descriptor embeddings precomputed by scripts/build_router_artifact.py; without a matching artifact they are embedded on first use
+ROUTER_ARTIFACT_DIR = os.getenv("ROUTER_ARTIFACT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts"))
+# A query goes to the best namespace plus any within ROUTE_MARGIN of it, up to ROUTE_MAX_NAMESPACES
+ROUTE_MAX_NAMESPACES = int(os.getenv("ROUTE_MAX_NAMESPACES", "2"))
+ROUTE_MARGIN = float(os.getenv("ROUTE_MARGIN", "0.05"))
+
+# Title fast path: a query that is (nearly) a document title goes straight to that document, without
+# Titan or the vector store. The index is packaged as TITLE_INDEX_FILE (scripts/build_title_index.py), or
+# merged on first use from the shards the ingest Lambda writes (TITLE_INDEX_BACKEND "s3" or "local").
+TITLE_INDEX_FILE = os.getenv("TITLE_INDEX_FILE", os.path.join(ROUTER_ARTIFACT_DIR, "titles.json.z"))
+TITLE_INDEX_BACKEND = os.getenv("TITLE_INDEX_BACKEND", "none")
+TITLE_INDEX_MIN_SIMILARITY = float(os.getenv("TITLE_INDEX_MIN_SIMILARITY", "0.6"))  # Trigram Jaccard for a near-exact title
+TITLE_INDEX_MIN_PREFIX_SHARE = float(os.getenv("TITLE_INDEX_MIN_PREFIX_SHARE", "0.5"))  # Share of the title a prefix must cover
 
-# This section is for the demo to demostrate the namespace to search. This can be stored in a database
-# 
 def titan_embed_one(text: str, dims: int = EMBED_DIM, normalize: bool = True):
     body = {"inputText": text, "dimensions": dims, "normalize": normalize}
-    resp = bedrock.invoke_model(
+    resp = get_bedrock().invoke_model(
         modelId=MODEL_ID,
         contentType="application/json",
         accept="application/json",
         body=json.dumps(body),
     )
     payload = json.loads(resp["body"].read())
-    embs = payload.get("embedding", [])
-    print("Embedding vector:", embs)
-    return embs
-
-def embed_descriptors(descs: Dict[str, str]) -> Dict[str, List[float]]:
-    out: Dict[str, List[float]] = {}
-    for ns, text in descs.items():
-        text = (text or "").strip()
-        if not text:
-            continue
-        out[ns] = titan_embed_one(text, dims=EMBED_DIM, normalize=True)
-    return out
-
-def dot(u: List[float], v: List[float]) -> float:
-    return sum(a*b for a, b in zip(u, v))
-
-# There are 2 namepsace. Determine which one to query
-def pick_namespace_for_query(query_text: str) -> str:
-    """Embed the query and choose the namespace with highest cosine similarity."""
-    q_vec = titan_embed_one(query_text, dims=EMBED_DIM, normalize=True)
-    best_ns, best_score = "", float("-inf")
-    for ns, vec in NAMESPACE_EMBEDS.items():
-        score = dot(q_vec, vec)  # cosine since normalized
-        if score > best_score:
-            best_ns, best_score = ns, score
-    return best_ns
+    return payload.get("embedding", [])
+
+def pick_namespaces_for_query(query_text: str, q_vec: List[float] = None) -> List[str]:
+    """Choose the namespaces to query, best cosine similarity first."""
+    if q_vec is None:
+        q_vec = embed_query(query_text)
+    with metrics.span("route"):
+        return [ns for ns, _ in get_router().route(q_vec, ROUTE_MAX_NAMESPACES, ROUTE_MARGIN)]
+
+def embed_query(query_text: str) -> List[float]:
+    with metrics.span("embed"):
+        return get_query_embedder().embed(query_text)
+
+def pick_namespace_for_query(query_text: str, q_vec: List[float] = None) -> str:
+    """Choose the namespace with highest cosine similarity to the query embedding."""
+    return pick_namespaces_for_query(query_text, q_vec)[0]
 
 # Query the namespace in pinecone
-def pinecone_query_by_namespace(query_text: str, namespace: str, top_k: int = TOP_K):
-    """Embed the query once, then query Pinecone filtered to the chosen namespace."""
-    q_vec = titan_embed_one(query_text, dims=EMBED_DIM, normalize=True)
-    result = index.query(
+def pinecone_query_by_namespace(query_text: str, namespace: str, top_k: int = TOP_K, q_vec: List[float] = None):
+    """Query Pinecone filtered to the chosen namespace, reusing the request's query embedding."""
+    if q_vec is None:
+        q_vec = embed_query(query_text)
+    result = get_index().query(
         vector=q_vec,
         top_k=top_k,
-        include_metadata=True,
+        include_metadata=RETRIEVAL_MODE != "two_phase",
         namespace=namespace,
     )
+    return filter_matches(result)
+
+def filter_matches(result):
+    """Keep confident matches (MIN_SCORE), one per document, best KEEP_N."""
     matches = (result.matches or [])
     matches = [m for m in matches if (m.score or 0) >= MIN_SCORE]
-    matches.sort(key=calculate, reverse=True)
-    return matches[:KEEP_N]
+    matches = collapse_chunks(matches)
+    return cut_at_score_gap(matches[:KEEP_N])
+
+def cut_at_score_gap(matches):
+    """Keep matches (best first) up to the first drop in score of at least RETRIEVAL_CUT_GAP."""
+    if RETRIEVAL_CUT_GAP <= 0:
+        return matches
+    for i in range(1, len(matches)):
+        if (matches[i - 1].score or 0) - (matches[i].score or 0) >= RETRIEVAL_CUT_GAP:
+            metrics.add("matches_cut", len(matches) - i)
+            return matches[:i]
+    return matches
+
+def _chunk_position(m):
+    """(parent document id, chunk number) from the match metadata, or parsed from the vector id."""
+    md = getattr(m, "metadata", None) or {}
+    parent, n = parse_chunk_id(m.id)
+    return md.get("parent_id") or parent, int(md.get("chunk") or n)
 
-def build_context(matches) -> str:
-    """Turn Pinecone matches into a readable context block for Nova."""
-    lines = []
+def collapse_chunks(matches):
+    """Collapse chunk hits (`doc_id#chunk_n`) into one hit per parent document.
+
+    Each document keeps its best chunk score and the ids of its hit chunks in document order.
+    Matches queried without metadata are grouped by their `doc_id#chunk_n` ids.
+    """
+    docs: Dict[str, list] = {}
+    for m in matches:
+        docs.setdefault(_chunk_position(m)[0], []).append(m)
+    collapsed = []
+    for doc_id, hits in docs.items():
+        best = max(hits, key=calculate)
+        metadata = dict(best.metadata or {})
+        hits = sorted(hits, key=lambda m: _chunk_position(m)[1])
+        if len(hits) > 1 and "text" in metadata:
+            metadata["text"] = " ... ".join((m.metadata or {}).get("text", "") for m in hits)
+        collapsed.append(SimpleNamespace(id=doc_id, score=best.score, metadata=metadata, chunk_ids=[m.id for m in hits]))
+    collapsed.sort(key=calculate, reverse=True)
+    return collapsed
+
+def _chunk_ids(m) -> List[str]:
+    return getattr(m, "chunk_ids", None) or [m.id]
+
+def fetch_context_docs(matches, namespace: str = "") -> Dict[tuple, dict]:
+    """Read the matches' chunks (title and text), keyed by (namespace, chunk id).
+
+    Chunks come from the document store when one is configured. Without one, matches that
+    carry no text (two-phase retrieval, title matches) have their chunks' metadata fetched
+    from the vector store by id; matches that already carry it need nothing.
+    """
+    docs: Dict[tuple, dict] = {}
+    doc_store = get_doc_store()
+    if doc_store is None:
+        matches = [m for m in matches if "text" not in (getattr(m, "metadata", None) or {})]
+    if not matches:
+        return docs
+    by_namespace: Dict[str, list] = {}
+    for m in matches:
+        by_namespace.setdefault(getattr(m, "namespace", namespace), []).extend(_chunk_ids(m))
+    with metrics.span("context"):
+        for ns, ids in by_namespace.items():
+            if doc_store is not None:
+                found = doc_store.get_many(ns, ids)
+            else:
+                found = {k: dict(v.metadata or {}) for k, v in get_index().fetch(ids, namespace=ns).vectors.items()}
+            docs.update({(ns, k): v for k, v in found.items()})
+    metrics.add("context_chunks_fetched", len(docs))
+    return docs
+
+def build_context(matches, namespace: str = "", docs: Dict[tuple, dict] = None, query: str = "") -> str:
+    """Turn Pinecone matches into a readable context block for Nova.
+
+    Text comes from the chunks read by fetch_context_docs, or from match metadata.
+    Matches tagged with a namespace by the fan-out query are looked up in their own namespace.
+    `docs` takes chunks already read by fetch_context_docs. The context is held to
+    CONTEXT_TOKEN_BUDGET, keeping the sentences most relevant to `query`.
+    """
+    chunk_ids = {m.id: _chunk_ids(m) for m in matches}
+    if docs is None:
+        docs = fetch_context_docs(matches, namespace)
+    passages = []
     for m in matches:
         md = getattr(m, "metadata", {}) or {}
-        title = md.get("title") or md.get("name") or m.id
-        text = md.get("text") or md.get("chunk") or ""
-        lines.append(f"- {title}: {text}")
-    return "\n".join(lines)
-
-# Cached globally
-print("Cold start: embedding namespace descriptors...")
-NAMESPACE_EMBEDS = embed_descriptors(NAMESPACE_DESCRIPTORS)
-print("Embedded:", {k: len(v) for k, v in NAMESPACE_EMBEDS.items()}) 
-
-
-def _response(status: int, message=None):
-    return {
-        'statusCode': status,
-        'body': json.dumps({'message': message}),
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'POST,OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type'
-        }
-    }
+        ns = getattr(m, "namespace", namespace)
+        chunks = [docs[(ns, cid)] for cid in chunk_ids[m.id] if (ns, cid) in docs]
+        title = (md.get("title") or md.get("name") or next((c["title"] for c in chunks if c.get("title")), None)
+                 or m.id)
+        texts = [c.get("text") or "" for c in chunks]
+        passages.append((title, texts or [md.get("text") or ""]))
+    if CONTEXT_TOKEN_BUDGET <= 0:
+        return "\n".join(f"- {title}: {' ... '.join(texts)}" for title, texts in passages)
+    context_text, stats = assemble_context(passages, query, CONTEXT_TOKEN_BUDGET)
+    metrics.add("context_tokens", stats["tokens"])
+    metrics.add("context_sentences_trimmed", stats["trimmed"])
+    metrics.add("context_sentences_duplicate", stats["duplicates"])
+    return context_text
+
+# Cold start: nothing below touches the network at import time. Secrets, clients and
+# descriptor embeddings are created on first use and kept for the life of the instance.
+# COLD_START records how long the import and each lazy initialization took.
+COLD_START: Dict[str, float] = {}
+
+def _memoized(fn):
+    """Run `fn` once per instance (thread-safe) and record its duration in COLD_START.
+
+    Each getter has its own lock, so independent initializations can run concurrently.
+    `get.ready()` tells whether the value exists yet.
+    """
+    result = []
+    lock = threading.Lock()
+
+    @functools.wraps(fn)
+    def get():
+        if not result:
+            with lock:
+                if not result:
+                    start = time.perf_counter()
+                    result.append(fn())
+                    COLD_START[fn.__name__.lstrip("_").replace("get_", "") + "_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result[0]
+    get.ready = lambda: bool(result)
+    return get
+
+@_memoized
+def get_bedrock():
+    return runtime.client("bedrock-runtime", region_name=BEDROCK_REGION)
+
+@_memoized
+def get_router() -> NamespaceRouter:
+    registry = load_registry(NAMESPACE_REGISTRY_PATH)
+    router = NamespaceRouter.load(artifact_path(ROUTER_ARTIFACT_DIR, MODEL_ID, EMBED_DIM), MODEL_ID, EMBED_DIM, registry)
+    if router is None:
+        print("No descriptor artifact for this registry, model and dimension; embedding namespace descriptors...")
+        router = NamespaceRouter.from_registry(registry, lambda text: titan_embed_one(text, dims=EMBED_DIM, normalize=True))
+    print("Router:", {"version": router.version, "namespaces": len(router.names), "dims": router.matrix.shape[1]})
+    return router
 
-def _parse_event(event):
-    body = event.get('body')
-    if body:
+@_memoized
+def get_query_embedder() -> QueryEmbedder:
+    return QueryEmbedder(
+        lambda text: titan_embed_one(text, dims=EMBED_DIM, normalize=True),
+        MODEL_ID,
+        EMBED_DIM,
+        normalize=True,
+        cache=LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS),
+        shared=DynamoEmbeddingStore(runtime.resource("dynamodb").Table(QUERY_CACHE_TABLE), QUERY_CACHE_SHARED_TTL_SECONDS)
+        if QUERY_CACHE_TABLE else None,
+    )
+
+@_memoized
+def get_answer_cache() -> SemanticAnswerCache:
+    return SemanticAnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_MIN_SIMILARITY)
+
+@_memoized
+def get_title_answers() -> LRUCache:
+    # Title fast-path answers depend only on the matched documents, so they are cached by document id
+    return LRUCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_SECONDS)
+
+@_memoized
+def get_doc_store():
+    return open_doc_store(
+        DOC_STORE_BACKEND,
+        os.getenv("DOC_STORE_PATH", "/tmp/docstore.sqlite"),
+        s3=runtime.client("s3") if DOC_STORE_BACKEND == "s3" else None,
+        bucket=os.getenv("DOC_STORE_BUCKET"),
+        prefix=os.getenv("DOC_STORE_PREFIX", "docs"),
+    )
+
+@_memoized
+def get_title_index():
+    if os.path.isfile(TITLE_INDEX_FILE):
+        with open(TITLE_INDEX_FILE, "rb") as f:
+            entries = decode_entries(f.read())
+    elif TITLE_INDEX_BACKEND == "s3":
+        entries = load_title_shards(s3=runtime.client("s3"), bucket=os.getenv("TITLE_INDEX_BUCKET"),
+                                    prefix=os.getenv("TITLE_INDEX_PREFIX", "titles"))
+    elif TITLE_INDEX_BACKEND == "local":
+        entries = load_title_shards(path=os.getenv("TITLE_INDEX_PATH", "/tmp/titles"))
+    else:
+        return None
+    index = TitleIndex(entries, min_prefix_share=TITLE_INDEX_MIN_PREFIX_SHARE, min_similarity=TITLE_INDEX_MIN_SIMILARITY)
+    print("Title index:", {"titles": len(index)})
+    return index
+
+def match_title(query_text: str):
+    """Resolve a title query to its documents, as matches shaped like collapse_chunks output, or None."""
+    index = get_title_index()
+    with metrics.span("title"):
+        hit = index.lookup(query_text) if index is not None else None
+    if hit is None:
+        return None
+    metrics.set_property("title_match", hit["kind"])
+    matches = [SimpleNamespace(id=doc_id, score=hit["score"], metadata={"title": title}, namespace=ns,
+                               chunk_ids=chunk_ids(doc_id, chunks)) for ns, doc_id, chunks, title in hit["docs"]]
+    print("Title match:", {"kind": hit["kind"], "score": hit["score"], "title": hit["title"], "docs": len(matches)})
+    return matches
+
+# Namespaces picked for one query are searched concurrently
+query_pool = ThreadPoolExecutor(max_workers=max(1, ROUTE_MAX_NAMESPACES), thread_name_prefix="ns-query")
+# /rag/batch: embeddings and searches share one bounded pool, Nova generations another
+batch_query_pool = ThreadPoolExecutor(max_workers=BATCH_QUERY_CONCURRENCY, thread_name_prefix="batch-query")
+batch_generate_pool = ThreadPoolExecutor(max_workers=BATCH_GENERATE_CONCURRENCY, thread_name_prefix="batch-generate")
+
+
+def get_pinecone_api_key():
+    # Cached by rag_common.runtime for SECRET_CACHE_TTL_SECONDS
+    return runtime.get_secret(PINECONE_SECRET_NAME)
+
+@_memoized
+def get_index():
+    if VECTOR_STORE_BACKEND == "local":
+        return open_vector_store("local", path=VECTOR_STORE_PATH, dims=EMBED_DIM, dtype=VECTOR_STORE_DTYPE,
+                                 search=VECTOR_STORE_SEARCH, nprobe=VECTOR_STORE_NPROBE, read_only=True)
+    return open_vector_store("pinecone", pinecone_index=runtime.pinecone_index(get_pinecone_api_key(), 'rag-index'))
+
+@_memoized
+def get_index_host():
+    return os.getenv("PINECONE_INDEX_HOST") or runtime.pinecone_client(get_pinecone_api_key()).describe_index('rag-index').host
+
+def _prepare_async_index():
+    # The blocking part of get_async_index (secret, index host), run on a thread
+    if VECTOR_STORE_BACKEND == "pinecone" and PINECONE_ASYNC:
+        get_index_host()
+    else:
+        get_index()
+
+# Ready once the getter it warms up is, so warm requests start no warmup for it
+_prepare_async_index.ready = lambda: (get_index_host if VECTOR_STORE_BACKEND == "pinecone" and PINECONE_ASYNC
+                                      else get_index).ready()
+
+@_memoized
+def get_async_index():
+    """Vector store reads for the async pipeline. Created on the event loop, so the aiohttp session is reused."""
+    if VECTOR_STORE_BACKEND == "pinecone" and PINECONE_ASYNC:
         try:
-            if event.get('isBase64Encoded'):
-                body = base64.b64decode(body).decode('utf-8')
-            return json.loads(body)
-        except json.JSONDecodeError:
-            logger.error("Invalid JSON in request body")
-            return None
-    return None
-
-
-def _get_API_key(PINECONE_SECRET_NAME):
-    sm = boto3.client("secretsmanager")
-    resp = sm.get_secret_value(SecretId=PINECONE_SECRET_NAME)
-    secret = resp.get("SecretString") or resp["SecretBinary"]
-    if isinstance(secret, (bytes, bytearray)):
-        secret = secret.decode()
-    pinecone_api_key = json.loads(secret) if secret.startswith("{") else secret
-    return pinecone_api_key
-
-# Fetch the api key during startup and get pine cone index
-pinecone_api_key = _get_API_key(PINECONE_SECRET_NAME)
-pc = pinecone(api_key=pinecone_api_key)
-index = pc.Index('rag-index')
+            from pinecone import PineconeAsyncio
+            client = PineconeAsyncio(api_key=get_pinecone_api_key())
+            return AsyncPineconeVectorStore(client.IndexAsyncio(host=get_index_host()), client=client)
+        except ImportError as e:
+            print("Pinecone asyncio client unavailable, querying on threads:", e)
+    return ThreadedAsyncVectorStore(get_index())
+
+COLD_START["import_ms"] = round((time.perf_counter() - _IMPORT_START) * 1000, 1)
+_first_request = True
 
 
 def calculate(m):
     return m.score
 
 def lambda_handler(event, context):
+    global _first_request
+    if _is_batch(event):
+        handle = handle_batch
+    else:
+        handle = handle_request_async if SEARCH_PIPELINE == "async" else handle_request
+    cold, _first_request = _first_request, False
+    with recorder.trace(pipeline="batch" if handle is handle_batch else SEARCH_PIPELINE, cold_start=cold,
+                        request_id=getattr(context, "aws_request_id", None)) as trace:
+        try:
+            response = handle_batch(event, context) if handle is handle_batch else handle(event)
+        finally:
+            if cold:
+                # Import time plus every lazy initialization the first request paid for
+                print("Cold start profile (ms):", json.dumps(COLD_START))
+        trace.set("status", response.get("statusCode"))
+        return response
 
-    best = None
-    context_text = ""
+def _is_batch(event):
+    return (event.get("rawPath") or event.get("path") or "").rstrip("/").endswith("/batch")
 
-    body = _parse_event(event)
+def retrieve(query_text: str, q_vec: List[float], pool: ThreadPoolExecutor = None) -> list:
+    """Route the query and search the chosen namespaces, matches merged by score."""
+    namespaces = pick_namespaces_for_query(query_text, q_vec=q_vec)
+    with metrics.span("query"):
+        return query_namespaces(
+            lambda ns: pinecone_query_by_namespace(namespace=ns, query_text=query_text, top_k=TOP_K, q_vec=q_vec),
+            namespaces,
+            pool=pool or query_pool,
+        )
 
-    query = body.get('message')
-    if not query:
-        return _response(400, "Missing 'query' in request body")
+def select_context(result: list):
+    """Pick the context documents: the best match from each namespace that had one.
 
-    namespace = pick_namespace_for_query(query.strip())
-    result = pinecone_query_by_namespace(namespace=namespace, query_text=query.strip(), top_k=TOP_K)
-    if not result:
-        # Not invoking the model if no confident matches found
-        return _response(200, f"No confident matches for movie {query} found.")
-    else:
-        try:
-            best = max(result, key=calculate)
-            context_text = build_context([best])  
-        except Exception as e:
-            print("calculate() failed, falling back to .score:", e)
-            best = max(result, key=lambda m: (m.score or 0))
-    # sort descending by score and pick the top one
-        print("Best match ID:", best.id)
-        print("Best score:", best.score)
-        print("Metadata:", best.metadata)
+    Returns the namespace of the best match overall, the context matches and their ids.
+    """
+    # Results are merged by score, so the first match is the best one overall
+    per_namespace = {}
+    for m in result:
+        per_namespace.setdefault(m.namespace, m)
+    # A namespace whose best match trails the others by a wide gap adds no useful context
+    matches = cut_at_score_gap(list(per_namespace.values()))
+    return result[0].namespace, matches, [f"{m.namespace}/{m.id}" for m in matches]
 
-    # Defaults
-    max_tokens = 1024
-    temperature = 0.3
-    top_p = 0.9
+def system_prompt(namespace: str) -> str:
     if namespace == "movies":
-        system = f"""You are a good story teller and provide a helpful summary to a movie plot. 
+        return f"""You are a good story teller and provide a helpful summary to a movie plot. 
         You provide you summary to the movie as covering the following details. 1/ Where the story takes place? 
         2/ Who are the main charatcters? 3/ What are the main challenges or conflicts the characters face? 
         4/ WWhat is the ultimate goal or quest the characters are on? 
@@ -183,20 +453,25 @@ def lambda_handler(event, context):
         If you were not provided any data, say you dont have the movie in your database. 
         You are ONLY allowed to use the text inside the CONTEXT block.
         """
-    else:
-        system = f"""You are a helpful assistant and provide a rating to a movie review.
+    return f"""You are a helpful assistant and provide a rating to a movie review.
         Your rating for the movie are based on the feedback provided by the users
         If you were not provided any data, you cann provide a sentiment analysis.
         You are ONLY allowed to use the text inside the CONTEXT block.
         """
 
+def generate_answer(namespace: str, context_text: str) -> str:
+    # Defaults
+    max_tokens = 1024
+    temperature = 0.3
+    top_p = 0.9
+
     prompt = f"Provide a summary for {context_text}"
 
     kwargs = {
         'modelId':NOVA_MODEL,
         'system' : [
             {
-                'text': system
+                'text': system_prompt(namespace)
             }
         ],
         'messages':[
@@ -212,7 +487,326 @@ def lambda_handler(event, context):
         },
     }
 
-    response = bedrock.converse(**kwargs)
-    print("Response from model: ", response)
+    # Estimated prompt size, next to Nova's own input_tokens count, for tuning CONTEXT_TOKEN_BUDGET
+    metrics.add("prompt_tokens", estimate_tokens(kwargs['system'][0]['text']) + estimate_tokens(prompt))
+    with metrics.span("converse"):
+        response = get_bedrock().converse(**kwargs)
+    metrics.usage(response.get('usage'))
+
+    return response['output']['message']['content'][0]['text']
+
+def cached_answer(namespace: str, q_vec, match_ids: List[str]):
+    # Title fast-path answers (no query embedding) are cached by document id
+    if q_vec is None:
+        answer = get_title_answers().get("|".join(match_ids))
+        if answer is not None:
+            print("Title answer cache hit")
+            metrics.set_property("answer_cache", "title")
+        return answer
+    answer = get_answer_cache().get(namespace, q_vec, match_ids)
+    if answer is not None:
+        print("Answer cache hit:", get_answer_cache().summary())
+        metrics.set_property("answer_cache", "semantic")
+    return answer
+
+def store_answer(namespace: str, q_vec, match_ids: List[str], answer: str):
+    if q_vec is None:
+        get_title_answers().put("|".join(match_ids), answer)
+    else:
+        get_answer_cache().put(namespace, q_vec, match_ids, answer)
+
+def handle_request(event):
+
+    with metrics.span("parse"):
+        body = runtime.parse_event(event)
+
+    query = body.get('message')
+    if not query:
+        return runtime.response(400, "Missing 'query' in request body")
+    metrics.set_property("query", query)  # Redacted to a hash and length (METRICS_REDACT)
+
+    # Title fast path: no embedding, routing or vector search when the query names a document
+    q_vec = None
+    matches = match_title(query.strip())
+    if matches:
+        namespace = matches[0].namespace
+        match_ids = [f"{m.namespace}/{m.id}" for m in matches]
+    else:
+        # One embedding per request, shared by routing and the Pinecone query
+        q_vec = embed_query(query.strip())
+        result = retrieve(query.strip(), q_vec)
+        if not result:
+            # Not invoking the model if no confident matches found
+            return runtime.response(200, f"No confident matches for movie {query} found.")
+        namespace, matches, match_ids = select_context(result)
+        print("Best match ID:", result[0].id)
+        print("Best score:", result[0].score)
+        print("Namespaces:", {m.namespace: round(m.score, 4) for m in matches})
+
+    # A cached answer is only reused when retrieval still puts the same documents in the context
+    cached = cached_answer(namespace, q_vec, match_ids)
+    if cached is not None:
+        return runtime.response(200, cached)
+    context_text = build_context(matches, namespace=namespace, query=query.strip())
+
+    answer = generate_answer(namespace, context_text)
+    store_answer(namespace, q_vec, match_ids, answer)
+    return runtime.response(200, answer)
+
+def _batch_deadline(context):
+    budget_ms = BATCH_TIME_BUDGET_MS
+    if context is not None:
+        budget_ms = min(budget_ms, context.get_remaining_time_in_millis() - BATCH_DEADLINE_MARGIN_MS)
+    return time.monotonic() + max(0, budget_ms) / 1000
+
+def handle_batch(event, context=None):
+    """Answer many queries in one call: {"messages": [...]} -> one result per message, in order.
+
+    Identical queries are answered once. Title matches skip embedding; the other queries are
+    embedded in one concurrent pass, every (query, namespace) search runs on a bounded pool and
+    Nova generations run with bounded concurrency. A failed item carries an `error` instead of
+    a `message`; the rest of the batch is unaffected. Queries still unanswered when the time
+    budget runs out get a timeout error, so the answered ones are returned in time.
+    """
+    start = time.perf_counter()
+    deadline = _batch_deadline(context)
+    with metrics.span("parse"):
+        body = runtime.parse_event(event) or {}
+    queries = body.get('messages')
+    if not isinstance(queries, list) or not queries:
+        return runtime.response(400, "Missing 'messages' list in request body")
+    if len(queries) > BATCH_MAX_QUERIES:
+        return runtime.response(400, f"At most {BATCH_MAX_QUERIES} messages per batch")
+
+    unique, positions = dedupe_queries([q.strip() if isinstance(q, str) else "" for q in queries])
+    items = [SimpleNamespace(query=q, q_vec=None, namespace=None, matches=None, match_ids=None, answer=None,
+                             error=None if q else "Empty query") for q in unique]
+
+    def pending():
+        return [it for it in items if it.error is None and it.answer is None]
+
+    # 1. Title fast path
+    for it in pending():
+        try:
+            it.matches = match_title(it.query)
+        except Exception as e:
+            it.error = error_text(e)
+
+    # 2. One concurrent embedding pass over the remaining queries (cached embeddings skip Titan)
+    to_embed = [it for it in pending() if not it.matches]
+    with metrics.span("embed"):
+        embedded = map_bounded(batch_query_pool, get_query_embedder().embed, [it.query for it in to_embed], deadline)
+    for it, (vec, err) in zip(to_embed, embedded):
+        it.q_vec, it.error = vec, err
+
+    # 3. Route each query, then run every (query, namespace) search on the shared bounded pool
+    searches = []
+    for it in pending():
+        if it.matches:
+            continue
+        try:
+            searches.extend((it, ns) for ns in pick_namespaces_for_query(it.query, q_vec=it.q_vec))
+        except Exception as e:
+            it.error = error_text(e)
+    with metrics.span("query"):
+        found = map_bounded(batch_query_pool, lambda s: pinecone_query_by_namespace(
+            namespace=s[1], query_text=s[0].query, top_k=TOP_K, q_vec=s[0].q_vec), searches, deadline)
+    merged = {}
+    for (it, ns), (matches, err) in zip(searches, found):
+        if err is not None:
+            it.error = it.error or err
+            continue
+        for m in matches:
+            m.namespace = ns
+        merged.setdefault(id(it), []).extend(matches)
+    for it in pending():
+        if it.matches:
+            it.namespace = it.matches[0].namespace
+            it.match_ids = [f"{m.namespace}/{m.id}" for m in it.matches]
+            continue
+        result = sorted(merged.get(id(it), []), key=calculate, reverse=True)
+        if not result:
+            it.answer = f"No confident matches for movie {it.query} found."
+            continue
+        it.namespace, it.matches, it.match_ids = select_context(result)
+
+    # 4. Cached answers, then the Nova generations with bounded concurrency
+    for it in pending():
+        it.answer = cached_answer(it.namespace, it.q_vec, it.match_ids)
+
+    def answer(it):
+        text = generate_answer(it.namespace, build_context(it.matches, namespace=it.namespace, query=it.query))
+        store_answer(it.namespace, it.q_vec, it.match_ids, text)
+        return text
+    to_generate = pending()
+    for it, (text, err) in zip(to_generate, map_bounded(batch_generate_pool, answer, to_generate, deadline)):
+        it.answer, it.error = text, err
+
+    results = []
+    for n, (q, pos) in enumerate(zip(queries, positions)):
+        it = items[pos]
+        results.append({"index": n, "query": q, "error": it.error} if it.error else {"index": n, "query": q, "message": it.answer})
+    stats = {"queries": len(queries), "unique": len(unique), "generated": len(to_generate),
+             "errors": sum(1 for r in results if "error" in r),
+             "timeouts": sum(1 for r in results if r.get("error") == TIMEOUT_ERROR)}
+    for name, value in stats.items():
+        metrics.add(f"batch_{name}", value)
+    print("Batch:", dict(stats, seconds=round(time.perf_counter() - start, 2)))
+    return runtime.response(200, results)
+
+# Async pipeline. One event loop lives as long as the instance, so the Pinecone aiohttp
+# session and its connections are reused across requests; blocking calls (boto3, the
+# document store) run on the loop's thread pool, where botocore reuses its own pool.
+_loop = None
+_background = set()  # Warm-up tasks a request did not wait for; they finish on a later request
+_route_counts = Counter()  # Namespaces routed to so far, for speculative queries
+SPECULATION = {"hits": 0, "cancelled": 0}
+
+def _run(coro):
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        _loop.set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_IO_THREADS, thread_name_prefix="async-io"))
+    return _loop.run_until_complete(coro)
+
+def _close_loop():
+    """Close the async vector store's session, finish background tasks and close the loop."""
+    global _loop
+    if _loop is None or _loop.is_closed():
+        return
+    try:
+        if get_async_index.ready():
+            _loop.run_until_complete(get_async_index().close())
+        _loop.run_until_complete(_settle(list(_background)))
+    finally:
+        _loop.close()
+        _loop = None
+
+# The loop and the aiohttp session it owns are closed when the interpreter exits (local runs,
+# benchmarks, or a Lambda runtime shutting down), so no unclosed session or pending task is left behind
+atexit.register(_close_loop)
+
+def _start(fn, *args):
+    task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
+async def _settle(tasks):
+    # Cancel what the request did not wait for, so nothing is left pending on the loop between
+    # invocations. A memoized getter already running on its thread still finishes there.
+    tasks = [t for t in tasks if t is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
-    return _response(200, response['output']['message']['content'][0]['text'])
+async def _query_namespace_async(index, namespace: str, q_vec: List[float]):
+    """Query one namespace, then read its best match's chunks so the context is ready when routing settles."""
+    result = await index.query(vector=q_vec, top_k=TOP_K, include_metadata=RETRIEVAL_MODE != "two_phase",
+                               namespace=namespace)
+    matches = filter_matches(result)
+    for m in matches:
+        m.namespace = namespace
+    docs = await asyncio.to_thread(fetch_context_docs, matches[:1], namespace) if matches else {}
+    return matches, docs
+
+async def answer_async(query_text: str) -> str:
+    """Answer one query with independent I/O overlapped; the wall time follows the critical path.
+
+    Instance setup (router, vector store client, document store) starts alongside the title
+    lookup and the query embedding. Likely namespaces are queried before routing finishes and
+    queries on namespaces routing does not pick are cancelled. Each namespace's best document
+    is read from the document store as soon as that namespace answers.
+    """
+    warmup = [_start(fn) for fn in (get_router, _prepare_async_index, get_doc_store) if not fn.ready()]
+    try:
+        return await _answer_async(query_text, warmup)
+    finally:
+        await _settle(warmup)
+
+async def _answer_async(query_text: str, warmup) -> str:
+    embed = None
+    if not get_title_index.ready():
+        # The title index is still loading: embed alongside it and drop the embedding on a title hit
+        embed = _start(embed_query, query_text)
+    matches = await asyncio.to_thread(match_title, query_text)
+
+    q_vec, docs = None, None
+    if matches:
+        await _settle([embed])
+        namespace = matches[0].namespace
+        match_ids = [f"{m.namespace}/{m.id}" for m in matches]
+    else:
+        q_vec = await (embed or asyncio.to_thread(embed_query, query_text))
+        if not get_async_index.ready():
+            await asyncio.gather(*warmup)
+        index = get_async_index()
+        query_start = time.perf_counter()
+        tasks = {ns: asyncio.ensure_future(_query_namespace_async(index, ns, q_vec))
+                 for ns, _ in _route_counts.most_common(SPECULATIVE_NAMESPACES)}
+        started = list(tasks.values())
+        try:
+            namespaces = await asyncio.to_thread(pick_namespaces_for_query, query_text, q_vec)
+            _route_counts.update(namespaces)
+            losers = [ns for ns in tasks if ns not in namespaces]
+            for ns in losers:
+                tasks.pop(ns).cancel()
+            SPECULATION["cancelled"] += len(losers)
+            SPECULATION["hits"] += len(tasks)
+            metrics.add("speculative_hits", len(tasks))
+            metrics.add("speculative_cancelled", len(losers))
+            for ns in namespaces:
+                if ns not in tasks:
+                    tasks[ns] = asyncio.ensure_future(_query_namespace_async(index, ns, q_vec))
+                    started.append(tasks[ns])
+            found = await asyncio.gather(*(tasks[ns] for ns in namespaces), return_exceptions=True)
+        finally:
+            # Cancelled speculative queries, and all of them if routing failed, are awaited here
+            await _settle(started)
+        # Wall time from the first (possibly speculative) query to the last answer; routing overlaps it
+        metrics.add("query_ms", (time.perf_counter() - query_start) * 1000)
+
+        result, docs, failed = [], {}, {}
+        for ns, outcome in zip(namespaces, found):
+            if isinstance(outcome, BaseException):
+                # One namespace failing leaves the answer to the others
+                failed[ns] = outcome
+                continue
+            ns_matches, ns_docs = outcome
+            result.extend(ns_matches)
+            docs.update(ns_docs)
+        if failed:
+            metrics.add("namespace_errors", len(failed))
+            print("Namespace queries failed:", {ns: repr(e) for ns, e in failed.items()})
+            if len(failed) == len(namespaces):
+                raise next(iter(failed.values()))
+        if not result:
+            # Not invoking the model if no confident matches found
+            return f"No confident matches for movie {query_text} found."
+        result.sort(key=calculate, reverse=True)
+        namespace, matches, match_ids = select_context(result)
+        print("Best match ID:", result[0].id)
+        print("Best score:", result[0].score)
+        print("Namespaces:", {m.namespace: round(m.score, 4) for m in matches}, "speculation:", SPECULATION)
+
+    # A cached answer is only reused when retrieval still puts the same documents in the context
+    cached = cached_answer(namespace, q_vec, match_ids)
+    if cached is not None:
+        return cached
+    if docs is None:
+        docs = await asyncio.to_thread(fetch_context_docs, matches, namespace)
+    context_text = build_context(matches, namespace=namespace, docs=docs, query=query_text)
+
+    answer = await asyncio.to_thread(generate_answer, namespace, context_text)
+    store_answer(namespace, q_vec, match_ids, answer)
+    return answer
+
+def handle_request_async(event):
+    with metrics.span("parse"):
+        body = runtime.parse_event(event)
+
+    query = body.get('message')
+    if not query:
+        return runtime.response(400, "Missing 'query' in request body")
+    metrics.set_property("query", query)  # Redacted to a hash and length (METRICS_REDACT)
+    return runtime.response(200, _run(answer_async(query.strip())))
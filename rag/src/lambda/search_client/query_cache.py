@@ -0,0 +1,140 @@
+import hashlib
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from botocore.exceptions import ClientError
+
+# Query embeddings are computed once per request and cached, so routing and the
+# Pinecone query share one Titan call and popular queries skip Titan entirely.
+# The in-process LRU lives as long as the warm Lambda instance; the optional
+# DynamoDB store is shared by every instance.
+
+
+def normalize_query(text: str) -> str:
+    """Case-fold and collapse whitespace so trivially different queries share an entry."""
+    return " ".join((text or "").split()).casefold()
+
+
+def query_key(model_id: str, dims: int, normalize: bool, text: str) -> str:
+    h = hashlib.sha256()
+    h.update(f"{model_id}\x1f{dims}\x1f{int(bool(normalize))}\x1f".encode("utf-8"))
+    h.update(normalize_query(text).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _pack(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob) -> List[float]:
+    # boto3 hands back DynamoDB binary attributes as Binary, which converts with bytes()
+    values = array("f")
+    values.frombytes(bytes(blob))
+    return values.tolist()
+
+
+class LRUCache:
+    """Thread-safe LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: str, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class DynamoEmbeddingStore:
+    """Query embeddings shared across Lambda instances in a DynamoDB table.
+
+    Items are `{key, vector (float32 bytes), expires_at}`; the table's TTL on
+    `expires_at` removes old entries, and reads ignore ones not yet swept.
+    """
+
+    def __init__(self, table, ttl_seconds: int = 7 * 24 * 3600):
+        self.table = table
+        self.ttl = ttl_seconds
+
+    def get(self, key: str) -> Optional[List[float]]:
+        try:
+            item = self.table.get_item(Key={"key": key}).get("Item")
+        except ClientError as e:
+            # The shared store is an optimization; a failing lookup just means a Titan call
+            print("Query embedding store lookup failed:", e.response["Error"]["Code"])
+            return None
+        if not item or int(item.get("expires_at", 0)) < time.time():
+            return None
+        return _unpack(item["vector"])
+
+    def put(self, key: str, vector: List[float]):
+        try:
+            self.table.put_item(Item={"key": key, "vector": _pack(vector), "expires_at": int(time.time() + self.ttl)})
+        except ClientError as e:
+            print("Query embedding store write failed:", e.response["Error"]["Code"])
+
+
+class QueryEmbedder:
+    """Embeds query text through the in-process cache, then the shared store, then Titan."""
+
+    def __init__(self, embed_fn: Callable[[str], List[float]], model_id: str, dims: int, normalize: bool = True,
+                 cache: Optional[LRUCache] = None, shared: Optional[DynamoEmbeddingStore] = None):
+        self.embed_fn = embed_fn
+        self.model_id = model_id
+        self.dims = dims
+        self.normalize = normalize
+        self.cache = cache if cache is not None else LRUCache()
+        self.shared = shared
+        self.shared_hits = 0
+        self.titan_calls = 0
+
+    def embed(self, text: str) -> List[float]:
+        key = query_key(self.model_id, self.dims, self.normalize, text)
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector
+        if self.shared is not None:
+            vector = self.shared.get(key)
+            if vector:
+                self.shared_hits += 1
+                self.cache.put(key, vector)
+                return vector
+        vector = self.embed_fn(normalize_query(text))
+        self.titan_calls += 1
+        if vector:
+            self.cache.put(key, vector)
+            if self.shared is not None:
+                self.shared.put(key, vector)
+        return vector
+
+    def summary(self) -> dict:
+        return {"hits": self.cache.hits, "misses": self.cache.misses, "shared_hits": self.shared_hits,
+                "titan_calls": self.titan_calls, "entries": len(self.cache)}
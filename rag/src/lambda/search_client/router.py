@@ -0,0 +1,112 @@
+import contextvars
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Namespace routing. Descriptor embeddings are rows of one float32 matrix, so scoring a
+# query against every namespace is a single matrix-vector product. A query is sent to
+# the best namespace plus any others scoring within `margin` of it, up to `max_namespaces`,
+# and the per-namespace results are merged by score.
+#
+# Descriptor embeddings can be precomputed at build time (scripts/build_router_artifact.py)
+# into an .npz artifact per model id and dimension, so a cold start makes no Bedrock calls.
+
+
+def load_registry(path: str) -> dict:
+    """Read the namespace registry: `{"version": ..., "namespaces": [{"name", "description"}, ...]}`."""
+    with open(path, "r", encoding="utf-8") as f:
+        registry = json.load(f)
+    entries = [ns for ns in registry.get("namespaces", []) if ns.get("name") and (ns.get("description") or "").strip()]
+    if not entries:
+        raise ValueError(f"No namespaces with a description in {path}")
+    return {"version": registry.get("version", 0), "namespaces": entries}
+
+
+def registry_digest(registry: dict) -> str:
+    """Hash of the routed content of a registry; an artifact is only used for the registry it was built from."""
+    entries = [[ns["name"], ns["description"].strip()] for ns in registry["namespaces"]]
+    return hashlib.sha256(json.dumps(entries, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def artifact_path(directory: str, model_id: str, dims: int) -> str:
+    return os.path.join(directory, f"descriptors-{re.sub(r'[^A-Za-z0-9._-]', '_', model_id)}-{dims}.npz")
+
+
+class NamespaceRouter:
+    """Scores a query embedding against all namespace descriptors at once."""
+
+    def __init__(self, names: List[str], vectors, version=0):
+        if len(names) != len(vectors):
+            raise ValueError("Each namespace needs exactly one descriptor vector")
+        self.names = list(names)
+        self.version = version
+        matrix = np.asarray(vectors, dtype=np.float32)
+        # Rows are normalized so the product is cosine similarity even for unnormalized input
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms == 0, 1.0, norms)
+
+    @classmethod
+    def from_registry(cls, registry: dict, embed_fn: Callable[[str], List[float]]) -> "NamespaceRouter":
+        entries = registry["namespaces"]
+        return cls([ns["name"] for ns in entries], [embed_fn(ns["description"].strip()) for ns in entries],
+                   registry.get("version", 0))
+
+    def save(self, path: str, model_id: str, registry: dict):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        meta = {"model_id": model_id, "dims": int(self.matrix.shape[1]), "version": self.version,
+                "digest": registry_digest(registry)}
+        with open(path, "wb") as f:
+            np.savez(f, names=np.array(self.names), matrix=self.matrix, meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, path: str, model_id: str, dims: int, registry: dict) -> Optional["NamespaceRouter"]:
+        """Load a precomputed artifact, or return None when it is missing or built for something else."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if (meta.get("model_id"), meta.get("dims"), meta.get("digest")) != (model_id, dims, registry_digest(registry)):
+                print("Descriptor artifact is stale:", {k: meta.get(k) for k in ("model_id", "dims", "version")})
+                return None
+            return cls([str(n) for n in data["names"]], data["matrix"], meta.get("version", 0))
+
+    def scores(self, q_vec) -> Dict[str, float]:
+        sims = self.matrix @ np.asarray(q_vec, dtype=np.float32)
+        return dict(zip(self.names, sims.tolist()))
+
+    def route(self, q_vec, max_namespaces: int = 1, margin: float = 0.0) -> List[Tuple[str, float]]:
+        """Return up to `max_namespaces` (namespace, score) pairs within `margin` of the best, best first."""
+        sims = self.matrix @ np.asarray(q_vec, dtype=np.float32)
+        m = max(1, min(max_namespaces, len(self.names)))
+        top = np.argpartition(-sims, m - 1)[:m] if m < len(self.names) else np.arange(len(self.names))
+        top = top[np.argsort(-sims[top], kind="stable")]
+        best = sims[top[0]]
+        return [(self.names[i], float(sims[i])) for i in top if sims[i] >= best - margin]
+
+
+def query_namespaces(query_fn: Callable[[str], list], namespaces: List[str], limit: Optional[int] = None,
+                     pool: Optional[ThreadPoolExecutor] = None) -> list:
+    """Run `query_fn(namespace)` for every namespace concurrently and merge the matches by score.
+
+    Each match is tagged with the namespace it came from. Each query runs in a copy of the
+    caller's context, so it records into the request's metrics trace.
+    """
+    if len(namespaces) == 1 or pool is None:
+        results = [query_fn(ns) for ns in namespaces]
+    else:
+        futures = [pool.submit(contextvars.copy_context().run, query_fn, ns) for ns in namespaces]
+        results = [f.result() for f in futures]
+    merged = []
+    for ns, matches in zip(namespaces, results):
+        for m in matches:
+            m.namespace = ns
+            merged.append(m)
+    merged.sort(key=lambda m: m.score or 0, reverse=True)
+    return merged[:limit] if limit else merged
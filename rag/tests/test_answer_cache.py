@@ -0,0 +1,45 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "lambda" / "search_client"))
+
+from answer_cache import SemanticAnswerCache  # noqa: E402
+
+MATRIX = [1.0, 0.0, 0.0]
+MATRIX_AGAIN = [0.99, 0.05, 0.0]  # Same question, worded a little differently
+HEAT = [0.0, 1.0, 0.0]
+
+
+def test_similar_question_with_the_same_documents_hits():
+    cache = SemanticAnswerCache(min_similarity=0.95)
+    cache.put("movies", MATRIX, ["movies/1", "movies/2"], "Neo is the one.")
+    assert cache.get("movies", MATRIX_AGAIN, ["movies/1", "movies/2"]) == "Neo is the one."
+    assert cache.get("movies", HEAT, ["movies/1", "movies/2"]) is None  # Not similar enough
+    assert cache.get("reviews", MATRIX, ["movies/1", "movies/2"]) is None  # Other namespace
+    assert cache.summary() == {"hits": 1, "misses": 2, "stale": 0, "entries": 1}
+
+
+def test_changed_retrieval_invalidates_the_answer():
+    cache = SemanticAnswerCache()
+    cache.put("movies", MATRIX, ["movies/1", "movies/2"], "Neo is the one.")
+    # Re-ingest changed what retrieval returns: different documents, or the same ones in another order
+    assert cache.get("movies", MATRIX, ["movies/1", "movies/3"]) is None
+    assert cache.get("movies", MATRIX, ["movies/2", "movies/1"]) is None
+    assert cache.summary()["stale"] == 2
+    # The new answer replaces the stale one rather than sitting next to it
+    cache.put("movies", MATRIX_AGAIN, ["movies/1", "movies/3"], "Trinity helps.")
+    assert cache.get("movies", MATRIX, ["movies/1", "movies/3"]) == "Trinity helps."
+    assert cache.summary()["entries"] == 1
+
+
+def test_entries_expire_and_are_bounded():
+    cache = SemanticAnswerCache(max_entries=2, ttl_seconds=0.05)
+    cache.put("movies", MATRIX, ["movies/1"], "a")
+    cache.put("movies", HEAT, ["movies/2"], "b")
+    cache.put("movies", [0.0, 0.0, 1.0], ["movies/3"], "c")
+    assert cache.get("movies", MATRIX, ["movies/1"]) is None  # Least recently used went first
+    assert cache.get("movies", HEAT, ["movies/2"]) == "b"
+    time.sleep(0.06)
+    assert cache.get("movies", HEAT, ["movies/2"]) is None
+    assert cache.summary()["entries"] == 0
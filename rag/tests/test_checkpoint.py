@@ -0,0 +1,95 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from botocore.exceptions import ClientError
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "benchmarks"), str(ROOT / "src" / "lambda" / "pinecone_ingest")]
+
+from checkpoint import DONE, FAILED, PENDING, RUNNING, SQLiteManifest, iter_partition_lines, plan_partitions  # noqa: E402
+from fakes import FakeS3  # noqa: E402
+
+JOB = {"job": "bucket/data.jsonl@etag", "bucket": "bucket", "key": "data.jsonl", "etag": "etag",
+       "partitions": [{"part": 0, "start": 0, "end": 100}, {"part": 1, "start": 100, "end": 180}]}
+
+
+def _s3(data: bytes):
+    s3 = FakeS3()
+    s3.put_object(Bucket="bucket", Key="data.jsonl", Body=data)
+    return s3
+
+
+def _all_partitions(s3, partition_bytes, chunk_size=7):
+    job = plan_partitions(s3, "bucket", "data.jsonl", partition_bytes)
+    return [list(iter_partition_lines(s3, "bucket", "data.jsonl", p["start"], p["end"], etag=job["etag"],
+                                      chunk_size=chunk_size)) for p in job["partitions"]]
+
+
+def test_every_line_is_owned_by_exactly_one_partition():
+    lines = [f'{{"id": {n}, "text": "{"x" * (n % 13)}"}}'.encode() for n in range(40)]
+    data = b"\n".join(lines) + b"\n"
+    s3 = _s3(data)
+    # Sizes that cut lines mid-way, at a newline and right after one, and one partition for the whole file
+    for partition_bytes in (1, 5, 16, 17, 33, len(data)):
+        parts = _all_partitions(s3, partition_bytes)
+        assert [line for part in parts for line in part] == lines, partition_bytes
+
+
+def test_line_starting_at_the_partition_start_belongs_to_it():
+    s3 = _s3(b"aaaa\nbbbb\ncccc")  # No trailing newline
+    assert _all_partitions(s3, 5) == [[b"aaaa"], [b"bbbb"], [b"cccc"]]
+    assert _all_partitions(s3, 6) == [[b"aaaa", b"bbbb"], [b"cccc"], []]  # bbbb starts at 5, inside [0, 6)
+    # The last line of a partition is read past its end
+    assert list(iter_partition_lines(s3, "bucket", "data.jsonl", 0, 2)) == [b"aaaa"]
+
+
+def test_changed_object_is_not_read_with_a_stale_etag():
+    s3 = _s3(b"aaaa\n")
+    job = plan_partitions(s3, "bucket", "data.jsonl", 100)
+    s3.put_object(Bucket="bucket", Key="data.jsonl", Body=b"bbbb\n")
+    with pytest.raises(ClientError):
+        list(iter_partition_lines(s3, "bucket", "data.jsonl", 0, 5, etag=job["etag"]))
+
+
+def _manifest(tmp_path):
+    manifest = SQLiteManifest(str(tmp_path / "manifest.sqlite"))
+    return manifest, [manifest.register(JOB)]
+
+
+def test_claim_lease_and_release(tmp_path):
+    manifest, jobs = _manifest(tmp_path)
+    first = manifest.claim(jobs, "a", 60)
+    second = manifest.claim(jobs, "b", 60)
+    assert (first["part"], second["part"]) == (0, 1)
+    assert manifest.claim(jobs, "c", 60) is None  # Both leased
+
+    manifest.release(first, "boom")
+    again = manifest.claim(jobs, "c", 60)
+    assert again["part"] == 0 and again["attempts"] == 2
+    manifest.complete(again, 3, 3)
+    manifest.complete(first, 9, 9)  # Stale owner: ignored
+    progress = manifest.progress(jobs)
+    assert (progress[DONE], progress[RUNNING], progress[PENDING]) == (1, 1, 0)
+    assert progress["expired"] == 0 and progress["next_expiry"] > time.time()
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    manifest, jobs = _manifest(tmp_path)
+    manifest.claim(jobs, "killed", -1)
+    assert manifest.progress(jobs)["expired"] == 1
+    taken = manifest.claim(jobs, "b", 60)
+    assert taken["part"] == 0 and taken["owner"] == "b" and taken["attempts"] == 2
+
+
+def test_partition_that_never_finishes_fails_at_claim(tmp_path):
+    manifest, jobs = _manifest(tmp_path)
+    for attempt in range(2):
+        part = manifest.claim(jobs, f"killed-{attempt}", -1, max_attempts=2)
+        assert part["part"] == 0 and part["attempts"] == attempt + 1
+    # Two claims timed out without a release; the third claim gives up on it and moves on
+    part = manifest.claim(jobs, "c", 60, max_attempts=2)
+    assert part["part"] == 1
+    progress = manifest.progress(jobs)
+    assert progress[FAILED] == 1 and progress[RUNNING] == 1
@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+LAMBDA = Path(__file__).resolve().parents[1] / "src" / "lambda"
+sys.path.insert(0, str(LAMBDA / "deps_layer"))
+sys.path.insert(0, str(LAMBDA / "search_client"))
+
+from context_builder import assemble_context  # noqa: E402
+from rag_common.text import estimate_tokens  # noqa: E402
+
+
+def test_passage_of_one_long_sentence_keeps_its_share():
+    long_plot = " ".join(f"word{i}" for i in range(400))  # No sentence punctuation at all
+    context, stats = assemble_context([("The Matrix", [long_plot])], "matrix plot", budget_tokens=100)
+
+    assert context.startswith("- The Matrix: word0 word1")
+    assert stats["passages"] == 1 and stats["sentences"] >= 1
+    assert estimate_tokens(context) <= 100
+
+
+def test_long_sentences_share_the_budget_between_passages():
+    passages = [(f"Movie {n}", [" ".join(f"m{n}w{i}" for i in range(300))]) for n in range(3)]
+    context, stats = assemble_context(passages, "movie", budget_tokens=120)
+
+    assert stats["passages"] == 3
+    assert all(f"- Movie {n}: m{n}w0" in context for n in range(3))
+    assert stats["tokens"] <= 120
+
+
+def test_short_passages_are_kept_whole():
+    context, stats = assemble_context([("Heat", ["A heist. A chase."])], "heist", budget_tokens=100)
+    assert context == "- Heat: A heist. A chase."
+    assert stats["trimmed"] == 0
@@ -0,0 +1,76 @@
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "benchmarks"), str(ROOT / "src" / "lambda" / "pinecone_ingest")]
+
+from embed_cache import S3EmbeddingCache, SQLiteEmbeddingCache, cache_key, cached_embed  # noqa: E402
+from fakes import FakeS3  # noqa: E402
+
+
+class CountingEmbed:
+    def __init__(self):
+        self.sent = []
+
+    def __call__(self, texts):
+        self.sent.extend(texts)
+        return [[float(len(t)), 0.5] for t in texts]
+
+
+def test_key_covers_everything_that_changes_the_vector():
+    base = cache_key("titan-v2", 1024, True, "Heat")
+    assert base == cache_key("titan-v2", 1024, True, "Heat")
+    assert len({base, cache_key("titan-v1", 1024, True, "Heat"), cache_key("titan-v2", 256, True, "Heat"),
+                cache_key("titan-v2", 1024, False, "Heat"), cache_key("titan-v2", 1024, True, "Heat ")}) == 5
+
+
+def test_only_new_text_is_embedded(tmp_path):
+    cache = SQLiteEmbeddingCache(str(tmp_path / "cache.sqlite"))
+    embed = CountingEmbed()
+    first = cached_embed(cache, ["a", "bb", "a"], embed, "titan-v2", 2, True)
+    assert embed.sent == ["a", "bb"]  # Repeats in one batch are embedded once
+    second = cached_embed(cache, ["bb", "ccc", "a"], embed, "titan-v2", 2, True)
+    assert embed.sent == ["a", "bb", "ccc"]
+    assert first == [[1.0, 0.5], [2.0, 0.5], [1.0, 0.5]] and second == [[2.0, 0.5], [3.0, 0.5], [1.0, 0.5]]
+    cached_embed(cache, ["a"], embed, "titan-v2", 4, True)  # Another dimension is another key
+    assert embed.sent[-1] == "a"
+    assert cache.summary() == {"hits": 2, "misses": 4, "entries": 4}
+    cache.close()
+
+
+def test_eviction_by_age_then_least_recently_used(tmp_path):
+    cache = SQLiteEmbeddingCache(str(tmp_path / "cache.sqlite"))
+    cache.put_many({"old": [1.0], "used": [2.0], "new": [3.0], "newest": [4.0]})
+    now = int(time.time())
+    for key, last_used in (("old", now - 10 * 86400), ("used", now - 300), ("new", now - 200), ("newest", now - 100)):
+        cache._conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (last_used, key))
+    cache.get_many(["used"])  # A hit counts as a use
+    assert cache.evict(max_age_seconds=86400, max_entries=2) == 2
+    assert set(cache.get_many(["old", "used", "new", "newest"])) == {"used", "newest"}
+    cache.close()
+
+
+class CountingS3(FakeS3):
+    def __init__(self):
+        super().__init__()
+        self.uploads = 0
+
+    def upload_file(self, Filename, Bucket, Key):
+        self.uploads += 1
+        super().upload_file(Filename, Bucket, Key)
+
+
+def test_s3_cache_round_trip_uploads_only_when_changed(tmp_path):
+    s3 = CountingS3()
+    cache = S3EmbeddingCache(s3, "bucket", "cache/embeddings.sqlite", local_path=str(tmp_path / "a.sqlite"))
+    cache.put_many({"k": [1.0, 2.0]})
+    cache.close()
+    reopened = S3EmbeddingCache(s3, "bucket", "cache/embeddings.sqlite", local_path=str(tmp_path / "b.sqlite"))
+    assert reopened.get_many(["missing"]) == {}
+    reopened.close()
+    assert s3.uploads == 1  # Only misses: nothing changed
+    again = S3EmbeddingCache(s3, "bucket", "cache/embeddings.sqlite", local_path=str(tmp_path / "c.sqlite"))
+    assert again.get_many(["k"]) == {"k": [1.0, 2.0]}
+    again.close()
+    assert s3.uploads == 2  # A hit refreshes last_used, which eviction depends on
@@ -0,0 +1,81 @@
+import json
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from botocore.exceptions import ClientError
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "benchmarks"), str(ROOT / "src" / "lambda" / "pinecone_ingest")]
+
+from embedder import AdaptiveLimiter, TitanEmbedder  # noqa: E402
+from fakes import FakeBedrockRuntime  # noqa: E402
+
+
+class FlakyBedrock(FakeBedrockRuntime):
+    """Throttles the first call for every text whose number is even; `fail` texts always fail."""
+
+    def __init__(self, fail=()):
+        super().__init__(dims=8, embed_latency_ms=1)
+        self.fail = set(fail)
+        self.seen = set()
+        self.seen_lock = threading.Lock()
+
+    def invoke_model(self, modelId, body, contentType=None, accept=None):
+        text = json.loads(body)["inputText"]
+        if text in self.fail:
+            raise ClientError({"Error": {"Code": "ValidationException", "Message": "bad input"}}, "InvokeModel")
+        with self.seen_lock:
+            first = text not in self.seen
+            self.seen.add(text)
+        if first and int(text.split()[-1]) % 2 == 0:
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "slow down"}}, "InvokeModel")
+        return super().invoke_model(modelId, body, contentType, accept)
+
+
+def test_limiter_halves_on_throttle_and_grows_back():
+    limiter = AdaptiveLimiter(8, grow_after=2)
+    for expected in (4, 2, 1, 1):
+        limiter.acquire()
+        limiter.release(throttled=True)
+        assert limiter.limit == expected
+    for _ in range(2 * 7):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 8
+    limiter.acquire()
+    limiter.release()
+    assert limiter.limit == 8  # Never above max_in_flight
+
+
+def test_limiter_blocks_at_the_limit():
+    limiter = AdaptiveLimiter(2)
+    limiter.acquire()
+    limiter.acquire()
+    third = threading.Thread(target=limiter.acquire)
+    third.start()
+    third.join(0.05)
+    assert third.is_alive()
+    limiter.release()
+    third.join(1)
+    assert not third.is_alive()
+
+
+def test_output_order_matches_input_under_retries():
+    bedrock = FlakyBedrock()
+    embedder = TitanEmbedder(bedrock, "titan", dims=8, max_in_flight=4, base_delay=0.001)
+    texts = [f"text {n}" for n in range(40)] + [""]
+    vectors = embedder.embed(texts)
+    assert vectors[:-1] == [bedrock.vector_for(t, 8) for t in texts[:-1]]
+    assert vectors[-1] == []  # Empty texts are not sent
+    stats = embedder.stats.summary()
+    assert stats["throttles"] == 20 and stats["retries"] == 20 and stats["calls"] == 40
+    assert embedder.limiter.limit < 4
+
+
+def test_non_retryable_error_is_raised_once():
+    embedder = TitanEmbedder(FlakyBedrock(fail={"text 1"}), "titan", dims=8, max_in_flight=2, base_delay=0.001)
+    with pytest.raises(ClientError):
+        embedder.embed(["text 1", "text 3"])
+    assert embedder.stats.summary()["failures"] == 1 and embedder.stats.summary()["retries"] == 0
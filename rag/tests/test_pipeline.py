@@ -0,0 +1,124 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "lambda" / "pinecone_ingest"))
+
+from pipeline import bounded, partition_by_namespace  # noqa: E402
+
+
+class Counted:
+    """An endless upstream stage that counts how many items were pulled from it."""
+
+    def __init__(self, fail_at=None):
+        self.pulled = 0
+        self.fail_at = fail_at
+
+    def __iter__(self):
+        while True:
+            if self.pulled == self.fail_at:
+                raise ValueError("upstream failed")
+            self.pulled += 1
+            yield self.pulled
+
+
+def test_bounded_holds_back_the_upstream_stage():
+    upstream = Counted()
+    stage = bounded(upstream, maxsize=2)
+    assert next(stage) == 1
+    time.sleep(0.2)
+    # One item taken, two queued and one waiting to be put
+    assert upstream.pulled <= 4
+    for expected in range(2, 6):
+        assert next(stage) == expected
+    time.sleep(0.2)
+    assert upstream.pulled <= 8
+    stage.close()
+
+
+def test_bounded_stops_the_upstream_stage_when_closed():
+    upstream = Counted()
+    stage = bounded(upstream, maxsize=1)
+    next(stage)
+    stage.close()
+    pulled = upstream.pulled
+    time.sleep(0.3)
+    assert upstream.pulled == pulled
+
+
+def test_bounded_raises_upstream_errors_after_the_items_before_them():
+    items = []
+    with pytest.raises(ValueError, match="upstream failed"):
+        for item in bounded(Counted(fail_at=3), maxsize=2):
+            items.append(item)
+    assert items == [1, 2, 3]
+
+
+def _records(namespace, n, pulled=None):
+    for i in range(n):
+        if pulled is not None:
+            pulled[namespace] = pulled.get(namespace, 0) + 1
+        yield {"repo": namespace, "id": f"{namespace}-{i}"}
+
+
+def _collect(namespace, batches):
+    return [r["id"] for batch in batches for r in batch]
+
+
+def test_partition_routes_every_record_once_in_batches():
+    seen_batches = []
+
+    def worker(namespace, batches):
+        batches = list(batches)
+        seen_batches.extend(len(b) for b in batches)
+        return _collect(namespace, batches)
+
+    mixed = (r for pair in zip(_records("movies", 25), _records("reviews", 25)) for r in pair)
+    results = partition_by_namespace([mixed, _records("reviews", 5)], worker, batch_size=10)
+    assert sorted(results["movies"]) == sorted(f"movies-{i}" for i in range(25))
+    assert len(results["reviews"]) == 30
+    assert max(seen_batches) == 10
+
+
+def test_partition_slow_namespace_backs_up_only_its_readers():
+    release = threading.Event()
+    pulled = {}
+
+    def worker(namespace, batches):
+        if namespace == "slow":
+            release.wait(5)
+        return _collect(namespace, batches)
+
+    result = {}
+    runner = threading.Thread(target=lambda: result.update(partition_by_namespace(
+        [_records("slow", 1000, pulled), _records("fast", 1000, pulled)], worker, batch_size=10, maxsize=1)))
+    runner.start()
+    time.sleep(0.3)
+    # The slow worker holds nothing back from the fast namespace; its own reader stops after a few batches
+    assert pulled["fast"] == 1000
+    assert pulled["slow"] <= 10 * 4
+    release.set()
+    runner.join(5)
+    assert len(result["slow"]) == 1000 and len(result["fast"]) == 1000
+
+
+def test_partition_raises_worker_errors_without_blocking_readers():
+    def worker(namespace, batches):
+        if namespace == "bad":
+            raise RuntimeError("namespace failed")
+        return _collect(namespace, batches)
+
+    with pytest.raises(RuntimeError, match="namespace failed"):
+        partition_by_namespace([_records("bad", 500), _records("good", 500)], worker, batch_size=10, maxsize=1)
+
+
+def test_partition_raises_reader_errors():
+    def broken():
+        yield {"repo": "movies", "id": "1"}
+        raise ValueError("bad line")
+
+    with pytest.raises(ValueError, match="bad line"):
+        partition_by_namespace([broken()], _collect, batch_size=10)
@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "benchmarks"), str(ROOT / "src" / "lambda" / "deps_layer")]
+
+from fakes import FakeS3  # noqa: E402
+from rag_common.titles import TitleIndex, TitleIndexWriter, load_title_shards  # noqa: E402
+
+ENTRIES = [
+    ["movies", "1", 2, "The Matrix"],
+    ["movies", "2", 3, "The Matrix Reloaded"],
+    ["movies", "3", 1, "Heat"],
+    ["movies", "4", 1, "Casablanca"],
+    ["movies", "5", 2, "Introduction to Data Science"],
+]
+
+
+def test_prefix_of_several_titles_is_ambiguous():
+    index = TitleIndex(ENTRIES)
+    assert index.lookup("the matr") is None
+    assert index.lookup("The Matrix")["kind"] == "exact"
+
+
+def test_unique_prefix_and_fuzzy_matches():
+    index = TitleIndex(ENTRIES)
+    hit = index.lookup("the matrix rel")
+    assert hit["kind"] == "prefix" and hit["title"] == "the matrix reloaded"
+    hit = index.lookup("casablancas")
+    assert hit["kind"] == "fuzzy" and hit["docs"][0][1] == "4"
+
+
+def test_short_unique_prefix_is_left_to_vector_search():
+    index = TitleIndex(ENTRIES)
+    assert index.lookup("intr") is None and index.lookup("casa") is None
+    hit = index.lookup("introduction to data")
+    assert hit["kind"] == "prefix" and hit["docs"][0][1] == "5"
+
+
+def _write(writer, shard, title):
+    writer.add("movies", [{"id": title, "title": title}])
+    writer.flush(shard)
+
+
+def test_writer_clears_shards_of_an_earlier_run(tmp_path):
+    s3 = FakeS3()
+    s3.put_object(Bucket="bucket", Key="other/keep.json.z", Body=b"not a shard")
+    for writer, load in ((TitleIndexWriter(["movies"], s3=s3, bucket="bucket"),
+                          lambda: load_title_shards(s3, "bucket")),
+                         (TitleIndexWriter(["movies"], path=str(tmp_path)), lambda: load_title_shards(path=str(tmp_path)))):
+        _write(writer, "movies.jsonl#0", "Heat")
+        _write(writer, "movies.jsonl#1", "Up")
+        # The next run partitions the file differently: only shard #0 exists in it
+        assert writer.clear(keep=["movies.jsonl#0"]) == 1
+        _write(writer, "movies.jsonl#0", "Heat 2")
+        assert [e[3] for e in load()] == ["Heat 2"]
+    assert s3.get_object(Bucket="bucket", Key="other/keep.json.z")["Body"].read() == b"not a shard"
@@ -0,0 +1,109 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT / "benchmarks"), str(ROOT / "src" / "lambda" / "pinecone_ingest"),
+                str(ROOT / "src" / "lambda" / "deps_layer")]
+
+from chunker import chunk_counts, chunk_records  # noqa: E402
+from fakes import FakePineconeIndex  # noqa: E402
+from rag_common.vectorstore import LocalVectorStore  # noqa: E402
+from upserter import MAX_REQUEST_BYTES, UpsertBatcher, vector_size  # noqa: E402
+
+
+class RecordingIndex(FakePineconeIndex):
+    """Keeps the size of every upsert request; the base class rejects requests over Pinecone's limits."""
+
+    def __init__(self, fail_first=0):
+        super().__init__(upsert_latency_ms=0, query_latency_ms=0, store_values=False)
+        self.requests = []
+        self.fail_first = fail_first
+
+    def upsert(self, vectors, namespace=None, **kwargs):
+        if self.fail_first:
+            self.fail_first -= 1
+            raise ConnectionError("reset by peer")
+        result = super().upsert(vectors, namespace, **kwargs)
+        self.requests.append((namespace, len(vectors)))
+        return result
+
+
+def _upsert(index, namespace, vectors, **kwargs):
+    batcher = UpsertBatcher(index, max_workers=2, base_delay=0.0, **kwargs)
+    try:
+        batcher.add(namespace, vectors)
+        return batcher.flush()
+    finally:
+        batcher.close()
+
+
+def test_batches_split_at_1000_vectors():
+    index = RecordingIndex()
+    vectors = [{"id": str(n), "values": [0.5] * 4} for n in range(2500)]
+    stats = _upsert(index, "movies", vectors)
+    assert sorted(size for _, size in index.requests) == [500, 1000, 1000]
+    assert stats["vectors"] == 2500 and index.vector_count() == 2500 and index.rejected == 0
+
+
+def test_batches_split_under_2_mb():
+    index = RecordingIndex()
+    # About 20 KB each, so a 1000-vector batch would be ~20 MB
+    vectors = [{"id": str(n), "values": [0.123456789] * 1024, "metadata": {"text": "x" * 300}} for n in range(300)]
+    size = vector_size(vectors[0])
+    _upsert(index, "movies", vectors)
+    assert index.rejected == 0 and index.vector_count() == 300
+    assert max(n for _, n in index.requests) * size <= MAX_REQUEST_BYTES
+    assert len(index.requests) == -(-300 * size // (MAX_REQUEST_BYTES - 4096))
+
+
+def test_failed_batch_is_retried_and_oversized_vector_rejected():
+    index = RecordingIndex(fail_first=2)
+    stats = _upsert(index, "reviews", [{"id": "1", "values": [1.0]}])
+    assert stats["retries"] == 2 and stats["vectors"] == 1
+    with pytest.raises(ValueError):
+        _upsert(RecordingIndex(), "reviews", [{"id": "big", "values": [0.1] * 600000}])
+
+
+def _vectors(chunks, dims=4):
+    return [{"id": c["id"], "values": [1.0] + [0.0] * (dims - 1),
+             "metadata": {"parent_id": c["parent_id"], "chunk": c["chunk"], "chunks": c["chunks"]}} for c in chunks]
+
+
+def _ingest(index, records):
+    chunks = chunk_records(records, max_tokens=20, overlap_tokens=0)
+    batcher = UpsertBatcher(index, max_workers=2, base_delay=0.0)
+    try:
+        batcher.delete_stale("movies", chunk_counts(records, chunks))
+        batcher.add("movies", _vectors(chunks))
+        return batcher.flush()
+    finally:
+        batcher.close()
+
+
+def _reingest_leaves_no_stale_ids(index, ids):
+    long_text = " ".join(f"Sentence number {n} of the plot goes here." for n in range(8))
+    # An unchunked vector from an ingest before chunking
+    index.upsert(vectors=[{"id": "1", "values": [0.0, 1.0, 0.0, 0.0], "metadata": {}}], namespace="movies")
+    _ingest(index, [{"id": "1", "title": "Heat", "text": long_text}, {"id": "2", "title": "Up", "text": long_text}])
+    first = ids()
+    assert "1" not in first and len(first) > 4
+
+    stats = _ingest(index, [{"id": "1", "title": "Heat", "text": "Short now."}, {"id": "2", "title": "Up", "text": ""}])
+    assert ids() == {"1#chunk_0", "2#chunk_0"}
+    assert stats["stale_ids"] >= len(first) - 2
+
+
+def test_reingest_deletes_stale_chunks_from_pinecone():
+    index = FakePineconeIndex(upsert_latency_ms=0, query_latency_ms=0)
+    _reingest_leaves_no_stale_ids(index, lambda: set(index.namespaces["movies"]))
+
+
+def test_reingest_deletes_stale_chunks_from_local_store(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dims=4)
+    _reingest_leaves_no_stale_ids(store, lambda: {m.id for m in store.query([1.0, 1.0, 0, 0], 100, "movies").matches})
+    assert store.describe_index_stats()["total_vector_count"] == 2
+    store.close()
+    reopened = LocalVectorStore(str(tmp_path), dims=4, read_only=True)
+    assert {m.id for m in reopened.query([1.0, 0, 0, 0], 100, "movies").matches} == {"1#chunk_0", "2#chunk_0"}
@@ -0,0 +1,64 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src" / "lambda" / "deps_layer"))
+
+from rag_common.vectorstore import LocalVectorStore  # noqa: E402
+
+
+def _clustered(n, dims, clusters, seed=0):
+    # Real embeddings are clustered by topic, which is what IVF relies on
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dims))
+    return centers[rng.integers(0, clusters, n)] + 0.35 * rng.normal(size=(n, dims))
+
+
+def _fill(store, vectors, namespace="movies"):
+    for lo in range(0, len(vectors), 500):
+        store.upsert([{"id": str(i), "values": vectors[i].tolist(), "metadata": {"n": i}}
+                      for i in range(lo, min(lo + 500, len(vectors)))], namespace=namespace)
+
+
+def test_exact_search_matches_brute_force(tmp_path):
+    vectors = _clustered(800, 32, 8)
+    store = LocalVectorStore(str(tmp_path), dims=32)
+    _fill(store, vectors)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    q = vectors[3] + 0.1
+    result = store.query(q.tolist(), 10, namespace="movies", include_metadata=True)
+    expected = np.argsort(-(unit @ (q / np.linalg.norm(q))))[:10]
+    assert [m.id for m in result.matches] == [str(i) for i in expected]
+    assert result.matches[0].metadata == {"n": int(expected[0])}
+    store.close()
+
+
+def test_ivf_recall_against_exact_search(tmp_path):
+    vectors = _clustered(4000, 32, 20)
+    exact = LocalVectorStore(str(tmp_path / "exact"), dims=32)
+    ivf = LocalVectorStore(str(tmp_path / "ivf"), dims=32, search="ivf")  # Default nprobe
+    _fill(exact, vectors)
+    _fill(ivf, vectors)
+    ivf.build_index("movies")  # Default cluster count, about sqrt(n)
+    queries = _clustered(50, 32, 20, seed=1)
+    found = total = 0
+    for q in queries:
+        truth = {m.id for m in exact.query(q.tolist(), 10, namespace="movies").matches}
+        got = {m.id for m in ivf.query(q.tolist(), 10, namespace="movies").matches}
+        found += len(truth & got)
+        total += len(truth)
+    assert found / total >= 0.95
+    exact.close()
+    ivf.close()
+
+
+def test_vectors_added_after_the_ivf_build_are_found(tmp_path):
+    vectors = _clustered(1000, 16, 10)
+    store = LocalVectorStore(str(tmp_path), dims=16, search="ivf", nprobe=2)
+    _fill(store, vectors)
+    store.build_index("movies", clusters=16)
+    late = np.ones(16)
+    store.upsert([{"id": "late", "values": late.tolist()}], namespace="movies")
+    assert store.query(late.tolist(), 1, namespace="movies").matches[0].id == "late"
+    store.close()